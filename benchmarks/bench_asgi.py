@@ -0,0 +1,124 @@
+"""
+The mortgage and home value APIs under load: gunicorn with WSGI vs ASGI workers.
+
+    python -m benchmarks.bench_asgi --connections 32 --seconds 15
+
+Seeds ``--scale`` listings into a temporary SQLite database, then starts
+gunicorn from ``gunicorn.conf.py`` once per profile (SERVER_PROFILE=wsgi,
+then asgi) with ``--workers`` workers. ``--connections`` clients send
+requests for ``--seconds``: ``--api-share`` of them are POSTs to
+/mortgage/calculate/ and /home-value/estimate/ that save a row, the
+rest are GETs of /api/listings/. Reported per profile and for the two
+APIs alone: requests per second and p50/p95/p99 latency.
+
+The ASGI profile needs uvicorn (requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import city_names, gunicorn, http_request, percentile, sample_database
+
+PROFILES = ('wsgi', 'asgi')
+
+
+def api_request(rng, index):
+    if rng.random() < 0.5:
+        price = rng.randrange(150_000, 1_200_000, 5_000)
+        return '/mortgage/calculate/', {
+            'property_price': price, 'down_payment': price * rng.choice([0.05, 0.1, 0.2]),
+            'interest_rate': rng.choice([5.5, 6.25, 7.0]), 'loan_term': rng.choice([15, 30]),
+            'contact_name': f'Buyer {index}', 'contact_email': f'buyer{index}@example.com',
+        }
+    return '/home-value/estimate/', {
+        'address': f'{rng.randrange(1, 9999)} Main St', 'city': rng.choice(city_names(50)), 'state': 'TX',
+        'zip_code': '75001', 'bedrooms': rng.randrange(1, 6), 'bathrooms': rng.randrange(1, 4),
+        'square_feet': rng.randrange(700, 4000), 'year_built': rng.randrange(1950, 2024),
+        'contact_name': f'Owner {index}', 'contact_email': f'owner{index}@example.com',
+    }
+
+
+async def client(port, deadline, api_share, seed, results):
+    rng = random.Random(seed)
+    connection = None
+    count = 0
+    while time.monotonic() < deadline:
+        if connection is None:
+            connection = await asyncio.open_connection('127.0.0.1', port)
+        count += 1
+        if rng.random() < api_share:
+            path, data = api_request(rng, f'{seed}-{count}')
+            method, body, kind = 'POST', json.dumps(data).encode(), 'api'
+        else:
+            path = f'/api/listings/?min_price={rng.randrange(100_000, 900_000, 50_000)}&per_page=12'
+            method, body, kind = 'GET', b'', 'listings'
+        started = time.perf_counter()
+        try:
+            status, keep_alive = await http_request(connection, method, path, body)
+        except (ConnectionError, asyncio.IncompleteReadError, IndexError):
+            status, keep_alive = 599, False
+        results.append((kind, (time.perf_counter() - started) * 1000, status))
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def load(port, args):
+    results = []
+    deadline = time.monotonic() + args.seconds
+    await asyncio.gather(*(client(port, deadline, args.api_share, seed, results)
+                           for seed in range(args.connections)))
+    return results
+
+
+def summary(results, seconds):
+    timings = sorted(duration for _, duration, _ in results)
+    if not timings:
+        return '-'
+    errors = sum(status >= 400 for _, _, status in results)
+    return (f'{len(timings) / seconds:>7,.0f} {percentile(timings, 0.5):>7.1f}ms '
+            f'{percentile(timings, 0.95):>7.1f}ms {percentile(timings, 0.99):>7.1f}ms {errors:>6}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='GUNICORN_THREADS and ASGI_THREADS')
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--api-share', type=float, default=0.6)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'realestate_project.settings',
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'bench.sqlite3')}",
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads),
+        'ASGI_THREADS': str(args.threads),
+    })
+    print(f'{args.workers} workers, {args.threads} threads, {args.connections} connections, '
+          f'{args.seconds:.0f}s, {args.api_share:.0%} API requests\n')
+    print(f"{'profile':<8} {'requests':<9} {'req/s':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>6}")
+    try:
+        sample_database(directory, args.scale)
+        for profile in PROFILES:
+            with gunicorn(directory, {'SERVER_PROFILE': profile}) as (port, _):
+                results = asyncio.run(load(port, args))
+            print(f"{profile:<8} {'all':<9} {summary(results, args.seconds)}")
+            print(f"{'':<8} {'api':<9} {summary([r for r in results if r[0] == 'api'], args.seconds)}")
+            print(f"{'':<8} {'listings':<9} {summary([r for r in results if r[0] == 'listings'], args.seconds)}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
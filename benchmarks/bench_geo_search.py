@@ -0,0 +1,75 @@
+"""
+Map searches: grid-cell prefilter plus NumPy box/haversine checks.
+
+    python -m benchmarks.bench_geo_search --sizes 100000 1000000
+
+Listings are scattered around real ZIP centroids. Each query is checked
+against a brute-force pass over every listing's coordinates before it is
+timed, and the query plan of one cell range is printed at the end.
+"""
+import argparse
+
+import numpy as np
+
+from benchmarks.common import benchmark_database, measure, seed_properties, setup_django
+
+BOXES = {
+    'downtown Chicago viewport': (41.85, -87.70, 41.92, -87.60),
+    'Chicago metro viewport': (41.60, -88.20, 42.20, -87.50),
+    'Illinois viewport': (37.0, -91.5, 42.5, -87.0),
+}
+RADII = {
+    '5 miles of Springfield, IL': (39.7817, -89.6501, 5),
+    '25 miles of Manhattan': (40.7831, -73.9712, 25),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    from listings import geo
+    from listings.models import Property
+
+    with benchmark_database():
+        seeded = 0
+        for size in sorted(args.sizes):
+            seeded += seed_properties(size - seeded, start=seeded, index_locations=False)
+            everything = np.array(
+                list(Property.objects.filter(status='for_sale').values_list('id', 'latitude', 'longitude')),
+                dtype=np.float64,
+            )
+            ids, latitudes, longitudes = everything[:, 0].astype(np.int64), everything[:, 1], everything[:, 2]
+            print(f'\n{size} rows ({len(ids)} for sale)')
+            print(f"{'query':<32} {'results':>8} {'p50':>9} {'p95':>9}")
+
+            for label, (south, west, north, east) in BOXES.items():
+                expected = np.sort(ids[
+                    (latitudes >= south) & (latitudes <= north) & (longitudes >= west) & (longitudes <= east)
+                ])[::-1]
+                found = geo.in_box(south, west, north, east)
+                assert np.array_equal(found, expected), f'result mismatch for {label}'
+                p50, p95 = measure(lambda: geo.in_box(south, west, north, east), args.repeat)
+                print(f'{label:<32} {len(found):>8} {p50:>8.2f}ms {p95:>8.2f}ms')
+
+            for label, (latitude, longitude, miles) in RADII.items():
+                distances = geo.haversine_miles(latitude, longitude, latitudes, longitudes)
+                expected = set(ids[distances <= miles].tolist())
+                found, _ = geo.within_radius(latitude, longitude, miles)
+                assert set(found.tolist()) == expected, f'result mismatch for {label}'
+                p50, p95 = measure(lambda: geo.within_radius(latitude, longitude, miles), args.repeat)
+                print(f'{label:<32} {len(found):>8} {p50:>8.2f}ms {p95:>8.2f}ms')
+
+        first, last = geo.cell_ranges(*BOXES['Chicago metro viewport'])[0]
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {geo._candidate_sql(connection.vendor)}', ['for_sale', first, last])
+            print('\nplan of each cell range:', '; '.join(row[-1] for row in cursor.fetchall()))
+
+
+if __name__ == '__main__':
+    main()
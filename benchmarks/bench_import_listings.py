@@ -0,0 +1,79 @@
+"""
+Bulk listing import: rows/s and memory of ``import_listings``.
+
+    python -m benchmarks.bench_import_listings --size 1000000
+
+Writes a synthetic CSV feed of ``--size`` rows, imports it into an empty
+database, imports it again unchanged (every row skipped on its content
+hash) and then once more with one row in ten repriced. Memory is the peak
+resident set size of the process after each pass; it should stay flat as
+``--size`` grows, since only one batch is held at a time.
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import STATES, benchmark_database, city_names, setup_django
+
+
+def write_feed(path, size, reprice_every=0, seed=0):
+    from listings import geo
+    from listings.models import Property
+
+    rng = random.Random(seed)
+    cities = city_names(300, seed)
+    types = [value for value, label in Property.PROPERTY_TYPES]
+    zip_codes = sorted(geo.zip_centroids())
+    with open(path, 'w', newline='') as feed:
+        writer = csv.writer(feed)
+        writer.writerow(['external_id', 'title', 'description', 'address', 'city', 'state', 'zip_code',
+                         'price', 'property_type', 'bedrooms', 'bathrooms', 'square_feet', 'is_featured'])
+        for i in range(size):
+            price = rng.randrange(50_000, 2_500_000, 1000)
+            if reprice_every and i % reprice_every == 0:
+                price += 1000
+            writer.writerow([
+                f'MLS-{i}', f'Listing {i}', 'Synthetic benchmark listing.', f'{rng.randint(1, 9999)} Main Street',
+                rng.choice(cities), rng.choice(STATES), rng.choice(zip_codes), price, rng.choice(types),
+                rng.randint(0, 6), rng.randint(1, 4), rng.randint(400, 6000), rng.random() < 0.05,
+            ])
+
+
+def peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'feed.csv')
+    # An on-disk database, so the resident set measures the importer rather than the data
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+    with benchmark_database():
+        print(f"{'pass':<12} {'rows/s':>10} {'seconds':>9} {'peak RSS':>10}")
+        for name, reprice_every in [('initial', 0), ('unchanged', 0), ('10% changed', 10)]:
+            write_feed(path, args.size, reprice_every)
+            started = time.monotonic()
+            with open(os.devnull, 'w') as devnull:
+                call_command('import_listings', path, batch_size=args.batch_size, skip_neighbors=True,
+                             stdout=devnull)
+            elapsed = time.monotonic() - started
+            print(f'{name:<12} {args.size / elapsed:>10,.0f} {elapsed:>8.1f}s {peak_rss_mib():>7.0f}MiB')
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
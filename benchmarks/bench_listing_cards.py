@@ -0,0 +1,88 @@
+"""
+Listing grids: ``ListingCard`` rows vs. full ``Property`` instances.
+
+    python -m benchmarks.bench_listing_cards --size 100000
+
+Every listing gets a description, features and amenities of realistic
+length first. For each page size, one page is loaded both ways and every
+attribute the grid templates read is touched; latency is the wall time of
+that, memory the tracemalloc peak while building the page. The grid views
+are then timed end to end through the test client.
+"""
+import argparse
+import tracemalloc
+
+from benchmarks.common import benchmark_database, measure, seed_properties, setup_django
+
+PAGE_SIZES = [12, 48, 100]
+TEMPLATE_ATTRIBUTES = (
+    'id', 'title', 'address', 'city', 'state', 'bedrooms', 'bathrooms', 'square_feet',
+    'formatted_price', 'main_image_url', 'is_featured', 'is_new_listing',
+)
+VIEWS = ['/featured/', '/new/', '/buy/', '/search/?property_type=house']
+
+
+def render_rows(rows):
+    """Read what a grid card reads from each row"""
+    for row in rows:
+        for attribute in TEMPLATE_ATTRIBUTES:
+            getattr(row, attribute)
+        row.get_property_type_display()
+    return rows
+
+
+def peak_kib(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from listings.cards import cards
+    from listings.models import Property
+
+    with benchmark_database():
+        seed_properties(args.size, index_locations=False)
+        Property.objects.update(
+            description='Sunny rooms, renovated kitchen and a quiet street close to schools. ' * 30,
+            features='Hardwood floors, central air, walk-in closets, two-car garage, fireplace. ' * 5,
+            amenities='Pool, gym, playground, dog park, clubhouse, tennis courts. ' * 5,
+        )
+        listings = Property.objects.filter(status='for_sale').order_by('-created_at', '-id')
+
+        print(f"{'page':>5} {'model p50':>10} {'card p50':>10} {'model peak':>11} {'card peak':>11}")
+        for per_page in PAGE_SIZES:
+            def model_page():
+                return render_rows(list(listings[:per_page]))
+
+            def card_page():
+                return render_rows(list(cards(listings)[:per_page]))
+
+            assert [row.id for row in model_page()] == [card.id for card in card_page()]
+            model_p50, _ = measure(model_page, args.repeat)
+            card_p50, _ = measure(card_page, args.repeat)
+            print(f'{per_page:>5} {model_p50:>8.2f}ms {card_p50:>8.2f}ms '
+                  f'{peak_kib(model_page):>8.0f}KiB {peak_kib(card_page):>8.0f}KiB')
+
+        client = Client()
+        print(f"\n{'view':<30} {'p50':>9} {'p95':>9}")
+        with override_settings(DEBUG=False):
+            for url in VIEWS:
+                assert client.get(url).status_code == 200
+                p50, p95 = measure(lambda: client.get(url), args.repeat)
+                print(f'{url:<30} {p50:>8.2f}ms {p95:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+JSON listings API vs. the HTML listing pages: payload size and latency.
+
+    python -m benchmarks.bench_listings_api --size 100000
+
+Requests go through the Django test client, so timings include URL
+resolution, the view, template rendering or JSON serialization, and
+middleware, but no network. Caches are warm after the first request.
+"""
+import argparse
+
+from benchmarks.common import benchmark_database, measure, seed_properties, setup_django
+
+FILTER = {'property_type': 'house', 'min_price': '300000', 'bedrooms': '2'}
+CASES = [
+    ('HTML /buy/', '/buy/', {'property_type': 'house'}),
+    ('HTML /search/', '/search/', {'property_type': 'house'}),
+    ('API default fields', '/api/listings/', dict(FILTER, per_page='12')),
+    ('API card fields', '/api/listings/', dict(FILTER, per_page='12', fields='id,title,price,city,state,bedrooms,bathrooms,square_feet,main_image')),
+    ('API id,title,price', '/api/listings/', dict(FILTER, per_page='12', fields='id,title,price')),
+    ('API all fields', '/api/listings/', dict(FILTER, per_page='12', fields=','.join(['id', 'title', 'description', 'features', 'amenities', 'price']))),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+
+    with benchmark_database():
+        seed_properties(args.size)
+        client = Client()
+        print(f"{'request':<22} {'status':>6} {'bytes':>8} {'p50':>9} {'p95':>9}")
+        for label, url, params in CASES:
+            response = client.get(url, params)
+            p50, p95 = measure(lambda: client.get(url, params), args.repeat)
+            print(f'{label:<22} {response.status_code:>6} {len(response.content):>8} {p50:>8.2f}ms {p95:>8.2f}ms')
+
+            if 'ETag' in response:
+                headers = {'HTTP_IF_NONE_MATCH': response['ETag']}
+                revalidated = client.get(url, params, **headers)
+                p50, p95 = measure(lambda: client.get(url, params, **headers), args.repeat)
+                print(f"{'  revalidate (ETag)':<22} {revalidated.status_code:>6} {len(revalidated.content):>8} "
+                      f'{p50:>8.2f}ms {p95:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
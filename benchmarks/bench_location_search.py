@@ -0,0 +1,60 @@
+"""
+Location search: prefix index vs. the original icontains OR-filter.
+
+    python -m benchmarks.bench_location_search --sizes 1000 100000 1000000
+
+For every size the script times the two queries a listing page runs, the
+first page of 12 and the paginator COUNT (which the paginator then caches),
+and checks that both paths return the same rows.
+"""
+import argparse
+
+from benchmarks.common import benchmark_database, measure, seed_properties, setup_django
+
+QUERIES = ['Springfield', 'Oakdale', 'riverport', 'IL', '627', '9021', 'nowhere']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    from listings import pragmas
+    from listings.models import Property
+    from listings.search_index import filter_by_location, location_q
+
+    base = Property.objects.filter(status='for_sale').order_by('-created_at')
+
+    def scan(location):
+        return base.filter(location_q(location))
+
+    def indexed(location):
+        return filter_by_location(base, location)
+
+    with benchmark_database():
+        seeded = 0
+        print(f"{'rows':>9} {'query':<12} {'page scan p50/p95':>19} {'page index p50/p95':>19} "
+              f"{'count scan':>11} {'count index':>11}")
+        for size in sorted(args.sizes):
+            seeded += seed_properties(size - seeded, start=seeded)
+            # As an import would, so SQLite knows how few rows a location matches
+            pragmas.analyze(connection)
+            for location in QUERIES:
+                expected = (scan(location).count(), list(scan(location).values_list('pk', flat=True)[:12]))
+                actual = (indexed(location).count(), list(indexed(location).values_list('pk', flat=True)[:12]))
+                assert expected == actual, f'result mismatch for {location!r}: {expected} != {actual}'
+
+                scan_p50, scan_p95 = measure(lambda: list(scan(location)[:12]), args.repeat)
+                index_p50, index_p95 = measure(lambda: list(indexed(location)[:12]), args.repeat)
+                scan_count = measure(lambda: scan(location).count(), args.repeat)[0]
+                index_count = measure(lambda: indexed(location).count(), args.repeat)[0]
+                print(f'{size:>9} {location:<12} {scan_p50:>7.2f} / {scan_p95:>7.2f}ms {index_p50:>7.2f} / {index_p95:>7.2f}ms '
+                      f'{scan_count:>9.2f}ms {index_count:>9.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+property_filter: in-memory NumPy snapshot vs. the ORM query.
+
+    python -m benchmarks.bench_property_filter --sizes 100000 1000000
+
+Times what the view does for one page: the ORM path runs COUNT(*) plus a
+LIMIT 12 query, the snapshot path evaluates the masks and loads the 12
+rows by primary key. Snapshot load time and memory are reported too.
+"""
+import argparse
+import time
+
+from benchmarks.common import benchmark_database, measure, seed_properties, setup_django
+
+FILTERS = [
+    {},
+    {'property_type': 'house'},
+    {'min_price': '300000', 'max_price': '600000'},
+    {'bedrooms': '4', 'bathrooms': '3'},
+    {'property_type': 'condo', 'min_price': '200000', 'max_price': '900000', 'bedrooms': '2', 'bathrooms': '2'},
+    {'property_type': 'land', 'min_price': '2400000', 'bedrooms': '6'},
+]
+LOOKUPS = {
+    'property_type': 'property_type', 'min_price': 'price__gte', 'max_price': 'price__lte',
+    'bedrooms': 'bedrooms__gte', 'bathrooms': 'bathrooms__gte',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from listings import snapshot
+    from listings.models import Property
+    from listings.search import FILTER_FIELDS, SearchSpec
+
+    def orm_page(params):
+        properties = Property.objects.filter(status='for_sale').filter(
+            **{LOOKUPS[name]: value for name, value in params.items()}
+        ).order_by('-created_at', '-id')
+        return properties.count(), list(properties[:12])
+
+    def snapshot_page(listing, params):
+        result = listing.filter(**snapshot.spec_filters(SearchSpec.from_params(params, FILTER_FIELDS)))
+        page_ids = [int(pk) for pk in result.ids[:12]]
+        rows = Property.objects.order_by().in_bulk(page_ids)
+        return len(result), [rows[pk] for pk in page_ids]
+
+    with benchmark_database():
+        seeded = 0
+        for size in sorted(args.sizes):
+            seeded += seed_properties(size - seeded, start=seeded, index_locations=False)
+            started = time.perf_counter()
+            listing = snapshot.ListingSnapshot.load()
+            load_ms = (time.perf_counter() - started) * 1000
+            memory = sum(column.nbytes for column in listing.columns.values())
+            print(f'\n{size} rows: snapshot of {len(listing)} listings loaded in {load_ms:.0f}ms, '
+                  f'{memory / 1024 / 1024:.1f} MiB')
+            print(f"{'filter':<70} {'orm p50':>9} {'snap p50':>9} {'speedup':>8}")
+
+            for params in FILTERS:
+                orm_count, orm_rows = orm_page(params)
+                snap_count, snap_rows = snapshot_page(listing, params)
+                assert (orm_count, orm_rows) == (snap_count, snap_rows), f'result mismatch for {params}'
+
+                orm_p50, _ = measure(lambda: orm_page(params), args.repeat)
+                snap_p50, _ = measure(lambda: snapshot_page(listing, params), args.repeat)
+                label = ', '.join(f'{name}={value}' for name, value in params.items()) or '(none)'
+                print(f'{label:<70} {orm_p50:>8.2f}ms {snap_p50:>8.2f}ms {orm_p50 / snap_p50:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Mixed read/write traffic from several processes on one SQLite file.
+
+    python -m benchmarks.bench_sqlite_concurrency --processes 4 --seconds 10
+
+Seeds ``--scale`` listings into an on-disk database. Then ``--processes``
+forked workers, like gunicorn's sync workers, send requests through the
+test client for ``--seconds``. One request in ``--write-ratio`` is a
+write: a property inquiry or a home-value estimate. The rest read API
+listing pages and details. The run is done twice:
+
+- default: Django's SQLite defaults (rollback journal, deferred transactions)
+- tuned: ``LISTING_SQLITE_PRAGMAS`` with ``transaction_mode='IMMEDIATE'``
+
+Each run reports requests/s, p95 latency, and the writes that failed
+with "database is locked" (500 responses).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import benchmark_database, setup_django
+
+DEFAULT_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+INQUIRY = {'first_name': 'Ada', 'last_name': 'Byron', 'email': 'ada@example.com', 'phone': '555-0100',
+           'message': 'Please call me about this listing.'}
+
+
+def worker(seconds, write_ratio, ids, seed, results):
+    import logging
+
+    from django.db import connections
+    from django.test import Client
+
+    # Failed writes are counted below; their tracebacks would bury the table
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    connections.close_all()
+    rng = random.Random(seed)
+    client = Client(raise_request_exception=False)
+    reads, writes, failed, timings = 0, 0, 0, []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        if rng.random() < write_ratio:
+            writes += 1
+            if rng.random() < 0.5:
+                response = client.post(f'/contact/property/{rng.choice(ids)}/', INQUIRY)
+            else:
+                response = client.post('/home-value/estimate/', json.dumps({
+                    'address': f'{rng.randint(1, 999)} Main St', 'city': 'Chicago', 'state': 'IL',
+                    'zip_code': '60601', 'square_feet': rng.randint(800, 4000),
+                }), content_type='application/json')
+            failed += response.status_code >= 500
+        else:
+            reads += 1
+            if rng.random() < 0.5:
+                client.get(f'/api/listings/{rng.choice(ids)}/')
+            else:
+                client.get('/api/listings/', {'min_price': rng.randrange(100_000, 900_000, 50_000), 'per_page': 24})
+        timings.append((time.perf_counter() - started) * 1000)
+    connections.close_all()
+    results.put((reads, writes, failed, timings))
+
+
+def run(processes, seconds, write_ratio, ids):
+    from django.db import connections
+
+    connections.close_all()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker, args=(seconds, write_ratio, ids, i, results))
+               for i in range(processes)]
+    for process in workers:
+        process.start()
+    totals = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+    timings = sorted(t for _, _, _, worker_timings in totals for t in worker_timings)
+    return {
+        'requests': len(timings),
+        'writes': sum(writes for _, writes, _, _ in totals),
+        'failed': sum(failed for _, _, failed, _ in totals),
+        'p95': timings[int(len(timings) * 0.95)] if timings else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=5000)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    from listings import pragmas
+    from listings.models import Property
+
+    directory = tempfile.mkdtemp()
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+    options = connection.settings_dict['OPTIONS']
+    tuned = settings.LISTING_SQLITE_PRAGMAS
+    try:
+        with benchmark_database(), override_settings(MEDIA_ROOT=directory, LISTING_IMAGE_WORKERS=0):
+            with open(os.devnull, 'w') as devnull:
+                call_command('create_sample_data', scale=args.scale, skip_neighbors=True, stdout=devnull)
+            ids = list(Property.objects.values_list('pk', flat=True))
+            print(f'{args.processes} processes, {args.seconds:.0f}s each, '
+                  f'{args.write_ratio:.0%} writes, {args.scale} listings\n')
+            print(f"{'configuration':<14} {'req/s':>8} {'p95':>9} {'writes':>7} {'locked':>7}  journal")
+            for name, settings_pragmas, transaction_mode in [('default', DEFAULT_PRAGMAS, None),
+                                                              ('tuned', tuned, 'IMMEDIATE')]:
+                options.pop('transaction_mode', None)
+                if transaction_mode:
+                    options['transaction_mode'] = transaction_mode
+                with override_settings(LISTING_SQLITE_PRAGMAS=settings_pragmas):
+                    connection.close()
+                    journal = pragmas.current(connection, ['journal_mode'])['journal_mode']
+                    result = run(args.processes, args.seconds, args.write_ratio, ids)
+                print(f"{name:<14} {result['requests'] / args.seconds:>8,.0f} {result['p95']:>7.1f}ms "
+                      f"{result['writes']:>7} {result['failed']:>7}  {journal}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Listing pages under gunicorn: worker class x threads, with and without warm-up.
+
+    python -m benchmarks.bench_workers --workers 3 --connections 24 --seconds 10
+
+Seeds ``--scale`` listings into a temporary SQLite database and starts
+gunicorn from ``gunicorn.conf.py`` once per row of the matrix: sync
+workers, gthread workers with each of ``--threads``, and uvicorn (ASGI)
+workers, always ``--workers`` of them. ``--connections`` clients then
+request listing pages (home, buy with filters, search, property detail,
+featured, the listings API) for ``--seconds``. Every row runs twice, with
+GUNICORN_WARMUP=0 and with the warm-up hooks, and reports:
+
+- first: mean latency of the first request each client sends, which lands
+  on freshly forked workers
+- req/s, p50, p95 and p99 over the whole run
+- rss: resident memory of all workers together at the end
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from urllib.parse import quote
+
+from benchmarks.common import gunicorn, http_request, percentile, sample_database
+
+
+def listing_paths(ids, cities):
+    return [
+        lambda rng: '/',
+        lambda rng: f"/buy/?property_type={rng.choice(['house', 'condo', 'apartment'])}&min_price=200000",
+        lambda rng: f'/search/?location={quote(rng.choice(cities))}',
+        lambda rng: f'/property/{rng.choice(ids)}/',
+        lambda rng: '/featured/',
+        lambda rng: f'/api/listings/?min_price={rng.randrange(100_000, 900_000, 50_000)}&per_page=24',
+    ]
+
+
+async def client(port, deadline, paths, seed, results):
+    rng = random.Random(seed)
+    connection = None
+    while time.monotonic() < deadline:
+        if connection is None:
+            connection = await asyncio.open_connection('127.0.0.1', port)
+        started = time.perf_counter()
+        try:
+            status, keep_alive = await http_request(connection, 'GET', rng.choice(paths)(rng))
+        except (ConnectionError, asyncio.IncompleteReadError, IndexError):
+            status, keep_alive = 599, False
+        results.append((seed, (time.perf_counter() - started) * 1000, status))
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def load(port, paths, args):
+    results = []
+    deadline = time.monotonic() + args.seconds
+    await asyncio.gather(*(client(port, deadline, paths, seed, results) for seed in range(args.connections)))
+    return results
+
+
+def workers_rss(server):
+    """Resident memory of the server's child processes, in MiB"""
+    total = 0
+    with open(f'/proc/{server.pid}/task/{server.pid}/children') as f:
+        children = f.read().split()
+    for pid in children:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--threads', type=int, nargs='+', default=[2, 4, 8], help='Thread counts of gthread rows')
+    parser.add_argument('--connections', type=int, default=24)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'realestate_project.settings',
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'bench.sqlite3')}",
+        'WEB_CONCURRENCY': str(args.workers),
+    })
+    matrix = [('sync', {'SERVER_PROFILE': 'wsgi', 'GUNICORN_THREADS': '1'})]
+    matrix += [(f'gthread x{threads}', {'SERVER_PROFILE': 'wsgi', 'GUNICORN_THREADS': str(threads)})
+               for threads in args.threads]
+    matrix += [(f'uvicorn x{threads}', {'SERVER_PROFILE': 'asgi', 'ASGI_THREADS': str(threads)})
+               for threads in args.threads[:1]]
+    print(f'{args.workers} workers, {args.connections} connections, {args.seconds:.0f}s, {args.scale} listings\n')
+    print(f"{'workers':<12} {'warm-up':<8} {'first':>9} {'req/s':>7} {'p50':>9} {'p95':>9} {'p99':>9} "
+          f"{'errors':>6} {'rss':>8}")
+    try:
+        sample_database(directory, args.scale)
+        from listings.models import Property
+
+        ids = list(Property.objects.filter(status='for_sale').values_list('pk', flat=True))
+        cities = sorted(set(Property.objects.values_list('city', flat=True)))
+        paths = listing_paths(ids, cities)
+        for name, env in matrix:
+            for warm in ('0', '1'):
+                with gunicorn(directory, {**env, 'GUNICORN_WARMUP': warm}) as (port, server):
+                    results = asyncio.run(load(port, paths, args))
+                    rss = workers_rss(server)
+                first = {}
+                for seed, duration, _ in results:
+                    first.setdefault(seed, duration)
+                timings = sorted(duration for _, duration, _ in results)
+                errors = sum(status >= 400 for _, _, status in results)
+                print(f"{name:<12} {'on' if warm == '1' else 'off':<8} "
+                      f"{sum(first.values()) / len(first):>7.1f}ms {len(timings) / args.seconds:>7,.0f} "
+                      f"{percentile(timings, 0.5):>7.1f}ms {percentile(timings, 0.95):>7.1f}ms "
+                      f"{percentile(timings, 0.99):>7.1f}ms {errors:>6} {rss:>5.0f}MiB")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
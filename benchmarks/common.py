@@ -0,0 +1,186 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Each benchmark runs against a throwaway test database created the same way
+``manage.py test`` does, so it never touches ``db.sqlite3``. Run them from
+the project root, e.g. ``python -m benchmarks.bench_location_search``.
+"""
+import contextlib
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+import django
+
+SYLLABLES = ['spring', 'field', 'oak', 'dale', 'river', 'port', 'land', 'ville', 'wood',
+             'brook', 'glen', 'mont', 'ford', 'ash', 'bay', 'crest', 'haven', 'lake']
+STATES = ['AL', 'AZ', 'CA', 'CO', 'FL', 'GA', 'IL', 'MA', 'MI', 'NC', 'NY', 'OH', 'OR', 'TX', 'WA']
+
+
+def setup_django(settings_module='realestate_project.settings'):
+    """Configure Django for a standalone benchmark script"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database():
+    """Create a fresh test database for the duration of the block"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    old_name = connection.settings_dict['NAME']
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def city_names(count, seed=0):
+    """Deterministic list of made-up city names"""
+    names = sorted({(a + b).title() for a in SYLLABLES for b in SYLLABLES if a != b})
+    random.Random(seed).shuffle(names)
+    return names[:count]
+
+
+def seed_properties(count, seed=0, batch_size=5000, start=0, index_locations=True):
+    """Insert ``count`` random properties with bulk_create and (optionally) index their locations"""
+    from listings import geo
+    from listings.models import Property
+    from listings.search_index import index_properties
+
+    rng = random.Random(seed + start)
+    cities = city_names(300, seed)
+    types = [value for value, label in Property.PROPERTY_TYPES]
+    zip_codes = sorted(geo.zip_centroids())
+    created = 0
+    while created < count:
+        batch = []
+        for i in range(min(batch_size, count - created)):
+            city = rng.choice(cities)
+            zip_code = rng.choice(zip_codes)
+            # Scatter listings around real ZIP centroids so their density looks like the US
+            latitude, longitude = geo.zip_centroids()[zip_code]
+            latitude += rng.uniform(-0.02, 0.02)
+            longitude += rng.uniform(-0.02, 0.02)
+            batch.append(Property(
+                title=f'Listing {start + created + i}',
+                description='Synthetic benchmark listing.',
+                address=f'{rng.randint(1, 9999)} Main Street',
+                city=city,
+                state=rng.choice(STATES),
+                zip_code=zip_code,
+                latitude=latitude,
+                longitude=longitude,
+                geo_cell=geo.cell_for(latitude, longitude),
+                price=Decimal(rng.randrange(50_000, 2_500_000, 1000)),
+                property_type=rng.choice(types),
+                status=rng.choices(['for_sale', 'sold', 'for_rent'], [8, 1, 1])[0],
+                bedrooms=rng.randint(0, 6),
+                bathrooms=rng.randint(1, 4),
+                square_feet=rng.randint(400, 6000),
+                is_featured=rng.random() < 0.05,
+                is_new_listing=rng.random() < 0.2,
+            ))
+        batch = Property.objects.bulk_create(batch)
+        if index_locations:
+            index_properties(batch)
+        created += len(batch)
+    return created
+
+
+def measure(func, repeat=20):
+    """Run ``func`` repeatedly and return (p50, p95) wall time in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(round(len(timings) * 0.95)) - 1)]
+    return statistics.median(timings), p95
+
+
+def sample_database(directory, scale):
+    """Migrate the database of DATABASE_URL and fill it with create_sample_data; media go to ``directory``"""
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connections
+    from django.test.utils import override_settings
+
+    with open(os.devnull, 'w') as devnull, override_settings(MEDIA_ROOT=directory):
+        call_command('migrate', verbosity=0)
+        call_command('create_sample_data', scale=scale, skip_neighbors=True, stdout=devnull)
+    connections.close_all()
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+@contextlib.contextmanager
+def gunicorn(directory, env, timeout=60):
+    """Run gunicorn from gunicorn.conf.py with ``env`` on a free port; yields (port, server process)
+
+    Returns once every worker has initialized (WEB_CONCURRENCY of them). Logs
+    and the pid file go to ``directory``.
+    """
+    port = free_port()
+    log = os.path.join(directory, f'gunicorn-{port}.log')
+    workers = int({**os.environ, **env}['WEB_CONCURRENCY'])
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+         '--access-logfile', '/dev/null', '--error-logfile', log,
+         '--pid', os.path.join(directory, f'gunicorn-{port}.pid')],
+        env={**os.environ, **env},
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+            # post_worker_init in gunicorn.conf.py logs this once post_fork is done
+            with open(log) if os.path.exists(log) else contextlib.nullcontext([]) as lines:
+                if sum('Worker initialized' in line for line in lines) >= workers:
+                    break
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'gunicorn did not listen on port {port} within {timeout}s')
+            time.sleep(0.2)
+        yield port, server
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def http_request(connection, method, path, body=b''):
+    """One HTTP/1.1 request over an asyncio (reader, writer) pair; returns (status, keep_alive)"""
+    reader, writer = connection
+    head = f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n'
+    if body:
+        head += 'Content-Type: application/json\r\n'
+    writer.write(head.encode() + b'\r\n' + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' not in headers:
+        await reader.read()
+        return status, False
+    await reader.readexactly(int(headers['content-length']))
+    return status, headers.get('connection') != 'close'
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
@@ -0,0 +1,236 @@
+"""
+End-to-end performance budgets for every page and endpoint.
+
+    python -m benchmarks.suite                    # check against benchmarks/baseline.json
+    python -m benchmarks.suite --update-baseline  # after an intended change
+
+Seeds ``--scale`` synthetic listings with ``create_sample_data --scale``
+(fixed seed) and requests every case in ``CASES`` through the test client
+with a cold cache. For each case it records the status, the number of SQL
+queries, p50/p95 latency and the tracemalloc peak of one request.
+
+A case fails when it returns a server error, when its status changes, when
+it runs more queries than the baseline, or when its p95 latency or peak
+memory exceeds the baseline by more than the tolerance. Server errors fail
+``--update-baseline`` too, which then leaves the baseline as it was. Query counts do not depend on the machine, so
+they are the strict budget; latency and memory get generous tolerances.
+The exit status is 1 on any failure, and also when a URL of one of
+``APPS`` has no case.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import benchmark_database, setup_django
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+APPS = ['listings', 'blog', 'mortgage', 'property_value', 'inquiries']
+VIDEO_SIZE = 4 * 1024 * 1024
+INQUIRY = {'first_name': 'Ada', 'last_name': 'Byron', 'email': 'ada@example.com', 'phone': '555-0100',
+           'message': 'Please call me about this listing.'}
+
+# (case, method, path, data, headers); {placeholders} in the path are filled from fixtures()
+CASES = [
+    ('home', 'get', '/', None, {}),
+    ('buy', 'get', '/buy/', {'property_type': 'house', 'min_price': '300000'}, {}),
+    ('sell', 'get', '/sell/', None, {}),
+    ('featured', 'get', '/featured/', None, {}),
+    ('new', 'get', '/new/', None, {}),
+    ('property detail', 'get', '/property/{property}/', None, {}),
+    ('property video range', 'get', '/property/{property}/videos/{video}/', None, {'Range': 'bytes=1048576-2097151'}),
+    ('search keywords', 'get', '/search/', {'q': 'renovated kitchen'}, {}),
+    ('search location', 'get', '/search/', {'location': 'chicago', 'property_type': 'condo'}, {}),
+    ('filter', 'get', '/filter/', {'property_type': 'house', 'min_price': '200000', 'max_price': '600000',
+                                   'bedrooms': '3'}, {}),
+    ('geo radius', 'get', '/search/geo/', {'lat': '41.88', 'lng': '-87.63', 'radius': '10'}, {}),
+    ('by type', 'get', '/type/house/', None, {}),
+    ('by location', 'get', '/location/Chicago/', None, {}),
+    ('api list', 'get', '/api/listings/', {'property_type': 'house', 'per_page': '24'}, {}),
+    ('api detail', 'get', '/api/listings/{property}/', None, {}),
+    ('metrics', 'get', '/metrics/', None, {}),
+    ('blog list', 'get', '/blog/', None, {}),
+    ('blog detail', 'get', '/blog/post/{post}/', None, {}),
+    ('blog category', 'get', '/blog/category/{category}/', None, {}),
+    ('blog author', 'get', '/blog/author/admin/', None, {}),
+    ('mortgage page', 'get', '/mortgage/', None, {}),
+    ('mortgage calculate', 'json', '/mortgage/calculate/', {'property_price': 450000, 'down_payment': 90000,
+                                                           'interest_rate': 6.5, 'loan_term': 30}, {}),
+    ('home value page', 'get', '/home-value/', None, {}),
+    ('home value estimate', 'json', '/home-value/estimate/', {'address': '1 Main St', 'city': 'Chicago', 'state': 'IL',
+                                                              'zip_code': '60601', 'square_feet': 1800}, {}),
+    ('contact page', 'get', '/contact/', None, {}),
+    ('contact submit', 'post', '/contact/', {'name': 'Ada Byron', 'email': 'ada@example.com', 'phone': '555-0100',
+                                             'subject': 'Hello', 'message': 'Looking to buy.'}, {}),
+    ('inquiry submit', 'post', '/contact/submit/', INQUIRY, {}),
+    ('property inquiry page', 'get', '/contact/property/{property}/', None, {}),
+    ('property inquiry submit', 'post', '/contact/property/{property}/', INQUIRY, {}),
+]
+
+
+def fixtures():
+    """Objects the parametrised paths point at, the same for every run of one scale and seed"""
+    from django.core.files.base import ContentFile
+
+    from blog_posts.models import BlogPost
+    from listings.models import Property, PropertyVideo
+
+    listing = Property.objects.filter(status='for_sale', images__isnull=False).order_by('pk').first()
+    video = PropertyVideo.objects.create(property=listing, title='Walkthrough')
+    video.video_file.save('walkthrough.mp4', ContentFile(b'\0' * VIDEO_SIZE))
+    post = BlogPost.objects.filter(status='published').order_by('pk').first()
+    return {'property': listing.pk, 'video': video.pk, 'post': post.slug, 'category': post.category.slug}
+
+
+def run_case(method, path, data, headers, repeat):
+    """(status, queries, p50 ms, p95 ms, peak KiB) of one case"""
+    from django.core.cache import cache
+    from django.db import connection, reset_queries
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    def request():
+        # A fresh client each time, so no session or messages carry over
+        client = Client(raise_request_exception=False, headers=headers)
+        if method == 'json':
+            return client.post(path, json.dumps(data), content_type='application/json')
+        response = getattr(client, method)(path, data)
+        # Drain streamed responses so their reads are timed too
+        if getattr(response, 'streaming', False):
+            for chunk in response.streaming_content:
+                pass
+        return response
+
+    cache.clear()
+    # Every request starts by emptying the query log, which would leave the capture's start index behind
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        status = request().status_code
+
+    timings = []
+    for _ in range(repeat):
+        cache.clear()
+        started = time.perf_counter()
+        request()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    cache.clear()
+    tracemalloc.start()
+    request()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    p95 = timings[min(len(timings) - 1, int(round(len(timings) * 0.95)) - 1)]
+    return status, len(queries), statistics.median(timings), p95, peak / 1024
+
+
+def uncovered(paths):
+    """URL names of APPS that no case requests"""
+    from django.urls import get_resolver, resolve
+
+    covered = {resolve(path.split('?')[0]).view_name for path in paths}
+    names = set()
+    for pattern in get_resolver().url_patterns:
+        namespace = getattr(pattern, 'namespace', None)
+        if namespace in APPS:
+            names.update(f'{namespace}:{child.name}' for child in pattern.url_patterns if child.name)
+    return sorted(names - covered)
+
+
+def check(result, budget, latency_tolerance, memory_tolerance):
+    """Reasons ``result`` is over ``budget``, if any"""
+    problems = []
+    if result['status'] != budget['status']:
+        problems.append(f"status {result['status']} (was {budget['status']})")
+    if result['queries'] > budget['queries']:
+        problems.append(f"{result['queries']} queries (budget {budget['queries']})")
+    # The absolute slack keeps millisecond views from failing on timer noise
+    if result['p95_ms'] > max(budget['p95_ms'] * latency_tolerance, budget['p95_ms'] + 10):
+        problems.append(f"p95 {result['p95_ms']:.1f}ms (baseline {budget['p95_ms']:.1f}ms)")
+    if result['peak_kib'] > max(budget['peak_kib'] * memory_tolerance, budget['peak_kib'] + 256):
+        problems.append(f"peak {result['peak_kib']:.0f}KiB (baseline {budget['peak_kib']:.0f}KiB)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, help='Listings to seed (default: the baseline\'s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--latency-tolerance', type=float, default=2.0, help='Allowed p95 growth factor')
+    parser.add_argument('--memory-tolerance', type=float, default=1.5, help='Allowed peak memory growth factor')
+    args = parser.parse_args()
+
+    baseline = {'scale': 20000, 'seed': args.seed, 'cases': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    scale = args.scale or baseline['scale']
+    comparable = (scale, args.seed) == (baseline['scale'], baseline['seed'])
+    if not comparable and not args.update_baseline:
+        print(f"The baseline was recorded with --scale {baseline['scale']} --seed {baseline['seed']}; "
+              'only query counts are compared')
+
+    setup_django()
+    # Pages that fail are reported by their status; their tracebacks would bury the table
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    media_root = tempfile.mkdtemp()
+    results = {}
+    failures = 0
+    try:
+        with benchmark_database(), override_settings(MEDIA_ROOT=media_root, LISTING_IMAGE_WORKERS=0):
+            started = time.monotonic()
+            call_command('create_sample_data', scale=scale, seed=args.seed, stdout=open(os.devnull, 'w'))
+            print(f'Seeded {scale} listings in {time.monotonic() - started:.0f}s\n')
+            values = fixtures()
+
+            missing = uncovered(path.format(**values) for name, method, path, data, headers in CASES)
+            if missing:
+                print(f"No case for {', '.join(missing)}")
+                failures += 1
+
+            print(f"{'case':<26} {'status':>6} {'queries':>8} {'p50':>9} {'p95':>9} {'peak':>9}")
+            for name, method, path, data, headers in CASES:
+                status, queries, p50, p95, peak = run_case(method, path.format(**values), data, headers, args.repeat)
+                results[name] = {'status': status, 'queries': queries, 'p50_ms': round(p50, 2),
+                                 'p95_ms': round(p95, 2), 'peak_kib': round(peak)}
+                budget = baseline['cases'].get(name)
+                problems = []
+                if budget is None:
+                    problems = [] if args.update_baseline else ['not in the baseline']
+                elif comparable:
+                    problems = check(results[name], budget, args.latency_tolerance, args.memory_tolerance)
+                elif queries > budget['queries']:
+                    problems = [f"{queries} queries (budget {budget['queries']})"]
+                # A broken page is never a budget, so it fails even while updating the baseline
+                if status >= 500:
+                    problems.insert(0, f'server error {status}')
+                failures += status >= 500 if args.update_baseline else bool(problems)
+                print(f'{name:<26} {status:>6} {queries:>8} {p50:>7.1f}ms {p95:>7.1f}ms {peak:>6.0f}KiB'
+                      + (f"  OVER: {'; '.join(problems)}" if problems else ''))
+    finally:
+        shutil.rmtree(media_root)
+
+    if failures:
+        print(f'\n{failures} over budget' + (', baseline not written' if args.update_baseline else ''))
+        sys.exit(1)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'scale': scale, 'seed': args.seed, 'cases': results}, f, indent=2)
+            f.write('\n')
+        print(f'\nWrote {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -47,6 +47,9 @@ class BlogPost(models.Model):
     
     class Meta:
         ordering = ['-published_at', '-created_at']
+        indexes = [
+            models.Index(fields=['status', '-published_at', '-id'], name='blog_status_published_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -1,3 +1,59 @@
+import base64
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import BlogPost, Category
+
+
+def crafted_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+class BlogListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer')
+        category = Category.objects.create(name='Market', slug='market')
+        for i in range(12):
+            BlogPost.objects.create(
+                title=f'Post {i}', slug=f'post-{i}', author=author, category=category, content='Text.',
+                status='published', published_at=timezone.now() - timezone.timedelta(days=i),
+            )
+
+    def test_crafted_cursors_fall_back_to_the_first_page(self):
+        first_page = self.client.get(reverse('blog:blog_list'))
+        for payload in (['after', 5, 1], ['after', [1], 1], ['before', {}, 1],
+                        ['after', '2024-01-01T00:00:00', 1], ['after', '2024-01-01T00:00:00+00:00', '1'],
+                        ['after', '2024-01-01T00:00:00+00:00', True], ['sideways', '2024-01-01T00:00:00+00:00', 1]):
+            with self.subTest(payload=payload):
+                response = self.client.get(reverse('blog:blog_list'), {'cursor': crafted_cursor(payload)})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([post.pk for post in response.context['posts']],
+                                 [post.pk for post in first_page.context['posts']])
+
+    def test_list_queries_do_not_grow_with_the_posts(self):
+        newest = BlogPost.objects.latest('published_at')
+        BlogPost.objects.exclude(pk=newest.pk).update(status='draft')
+        with CaptureQueriesContext(connection) as one_post:
+            self.client.get(reverse('blog:blog_list'))
 
-# Create your tests here.
+        # A full page, with posts by other authors in other categories
+        BlogPost.objects.update(status='published')
+        for i in range(3):
+            author = User.objects.create_user(f'guest{i}')
+            category = Category.objects.create(name=f'Topic {i}', slug=f'topic-{i}')
+            BlogPost.objects.create(
+                title=f'Guest post {i}', slug=f'guest-post-{i}', author=author, category=category, content='Text.',
+                status='published', published_at=timezone.now() + timezone.timedelta(minutes=i),
+            )
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(reverse('blog:blog_list'))
+        self.assertEqual(len(response.context['posts']), 9)
+        self.assertEqual(len(full_page), len(one_post), [query['sql'] for query in full_page])
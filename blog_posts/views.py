@@ -1,16 +1,16 @@
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
 from django.contrib.auth.models import User
+from listings.pagination import paginate
 from .models import BlogPost, Category
 
+POST_ORDERING = ('-published_at', '-id')
+
 def blog_list(request):
     """Blog listing page"""
-    posts = BlogPost.objects.filter(status='published').order_by('-published_at')
+    posts = BlogPost.objects.filter(status='published').select_related('author', 'category').order_by('-published_at')
     
     # Pagination
-    paginator = Paginator(posts, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts, 9, ordering=POST_ORDERING)
     
     # Get categories for sidebar
     categories = Category.objects.all()
@@ -47,12 +47,10 @@ def blog_by_category(request, slug):
     posts = BlogPost.objects.filter(
         category=category,
         status='published'
-    ).order_by('-published_at')
+    ).select_related('author').order_by('-published_at')
     
     # Pagination
-    paginator = Paginator(posts, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts, 9, ordering=POST_ORDERING)
     
     # Get categories for sidebar
     categories = Category.objects.all()
@@ -70,12 +68,10 @@ def blog_by_author(request, username):
     posts = BlogPost.objects.filter(
         author=author,
         status='published'
-    ).order_by('-published_at')
+    ).select_related('category').order_by('-published_at')
     
     # Pagination
-    paginator = Paginator(posts, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts, 9, ordering=POST_ORDERING)
     
     context = {
         'posts': page_obj,
@@ -61,7 +61,6 @@ def start_gunicorn():
         subprocess.run([
             "gunicorn",
             "--config", "gunicorn.conf.py",
-            "realestate_project.wsgi:application"
         ])
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
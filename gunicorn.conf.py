@@ -1,28 +1,37 @@
 """
 Gunicorn configuration file for RealtyPro Real Estate Project
 """
-import multiprocessing
 import os
 
+from realestate_project import concurrency
+
 # Server socket
-bind = "0.0.0.0:8000"
+# Hosts such as Render pass the port to listen on in PORT
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
 backlog = 2048
 
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# Worker processes; the database pool of each worker is sized from the same numbers.
+# The count adapts to CPUs and the memory limit, and threads make up for workers
+# that did not fit (see realestate_project/concurrency.py for the variables).
+# SERVER_PROFILE=asgi serves realestate_project.asgi from uvicorn workers instead
+# (an application given on the command line takes precedence over wsgi_app)
+wsgi_app = concurrency.application()
+workers = concurrency.workers()
+threads = concurrency.threads()
+worker_class = concurrency.worker_class()
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
-timeout = 30
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
 keepalive = 2
 
 # Restart workers after this many requests, to help prevent memory leaks
 preload_app = True
 
-# Logging
-accesslog = "logs/gunicorn_access.log"
-errorlog = "logs/gunicorn_error.log"
+# Logging; "-" logs to stdout/stderr, which hosts such as Render collect
+os.makedirs("logs", exist_ok=True)
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "logs/gunicorn_access.log")
+errorlog = os.environ.get("GUNICORN_ERROR_LOG", "logs/gunicorn_error.log")
 loglevel = "info"
 access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
 
@@ -41,9 +50,14 @@ tmp_upload_dir = None
 # certfile = "path/to/certfile"
 
 # Server hooks
+def format_timings(timings):
+    return ", ".join(f"{step} {seconds * 1000:.0f}ms" for step, seconds in timings.items())
+
 def on_starting(server):
-    """Log when server starts"""
+    """Log when server starts and drop the request metrics of the previous run"""
     server.log.info("Starting RealtyPro Gunicorn server")
+    from listings import metrics
+    metrics.clear_directory()
 
 def on_reload(server):
     """Log when server reloads"""
@@ -58,12 +72,25 @@ def pre_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
 
 def post_fork(server, worker):
-    """Log after forking worker"""
-    server.log.info("Worker spawned (pid: %s)", worker.pid)
+    """Warm the new worker's quick caches before it accepts requests (GUNICORN_WARMUP=0 skips it)"""
+    if os.environ.get("GUNICORN_WARMUP") == "0":
+        return
+    from realestate_project import warmup
+    timings = warmup.warm(warmup.FOREGROUND)
+    server.log.info("Worker %s warmed: %s", worker.pid, format_timings(timings))
 
 def post_worker_init(worker):
-    """Log after worker initialization"""
+    """Log after worker initialization and load the listing snapshot in the background
+
+    The load grows with the listings and could outlast the timeout if the
+    worker waited for it before serving.
+    """
     worker.log.info("Worker initialized (pid: %s)", worker.pid)
+    if os.environ.get("GUNICORN_WARMUP") == "0":
+        return
+    from realestate_project import warmup
+    warmup.warm_in_background(done=lambda timings: worker.log.info(
+        "Worker %s warmed in the background: %s", worker.pid, format_timings(timings)))
 
 def worker_abort(worker):
     """Log when worker aborts"""
@@ -74,13 +101,22 @@ def pre_exec(server):
     server.log.info("Forked child, re-executing.")
 
 def when_ready(server):
-    """Log when server is ready"""
+    """Warm the caches all workers can share, then log that the server is ready"""
+    if server.cfg.preload_app and os.environ.get("GUNICORN_WARMUP") != "0":
+        from realestate_project import warmup
+        timings = warmup.warm(warmup.SHARED)
+        server.log.info("Master warmed: %s", format_timings(timings))
     server.log.info("Server is ready. Spawning workers")
 
 def worker_exit(server, worker):
     """Log when worker exits"""
     server.log.info("Worker exited (pid: %s)", worker.pid)
 
+def child_exit(server, worker):
+    """Keep the request metrics of an exited worker in the server totals"""
+    from listings import metrics
+    metrics.retire(worker.pid)
+
 def on_exit(server):
     """Log when server exits"""
     server.log.info("Server exiting")
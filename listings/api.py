@@ -0,0 +1,138 @@
+"""
+Read-only JSON API over the listing searches.
+
+``/api/listings/`` takes the filters of ``property_search`` and
+``property_filter`` (see ``search.ALL_FIELDS``), a ``fields=`` projection
+that is applied with ``.only()``, and pages with the same cursors as the
+HTML views. Responses carry a strong ETag built from the page's ids and
+``updated_at`` values, so a client revalidating an unchanged page gets a
+304 without the rows being serialized again.
+"""
+import hashlib
+
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .models import Property
+from .search import ALL_FIELDS, SearchSpec
+
+FIELDS = (
+    'id', 'title', 'description', 'address', 'city', 'state', 'zip_code', 'price', 'property_type',
+    'status', 'bedrooms', 'bathrooms', 'square_feet', 'lot_size', 'year_built', 'features', 'amenities',
+    'main_image', 'is_featured', 'is_new_listing', 'latitude', 'longitude', 'created_at', 'updated_at',
+)
+# Everything but the long text columns
+DEFAULT_FIELDS = tuple(field for field in FIELDS if field not in ('description', 'features', 'amenities'))
+# Always loaded: the cursor key and what the ETag is built from
+REQUIRED_FIELDS = ('id', 'created_at', 'updated_at')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_fields(value):
+    """Requested fields in request order, or DEFAULT_FIELDS; raises ValueError for unknown names"""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if not fields:
+        raise ValueError('fields must name at least one field')
+    return fields
+
+
+def parse_page_size(value):
+    per_page = int(value) if value else DEFAULT_PAGE_SIZE
+    if not 1 <= per_page <= MAX_PAGE_SIZE:
+        raise ValueError(f'per_page must be between 1 and {MAX_PAGE_SIZE}')
+    return per_page
+
+
+def serialize(property_obj, fields):
+    data = {}
+    for field in fields:
+        value = getattr(property_obj, field)
+        if field == 'main_image':
+            value = value.url if value else None
+        data[field] = value
+    snippet = getattr(property_obj, 'search_snippet', '')
+    if snippet:
+        data['snippet'] = str(snippet)
+    return data
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params.pop('page', None)
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def _error(message, status=400):
+    return JsonResponse({
+        'success': False,
+        'error': message
+    }, status=status)
+
+
+def _conditional(request, etag, build):
+    """304 if the client already has ``etag``, else a JSON response of ``build()``"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build())
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def listing_list(request):
+    """Search results as JSON"""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        per_page = parse_page_size(request.GET.get('per_page'))
+    except ValueError as e:
+        return _error(str(e))
+
+    spec = SearchSpec.from_params(request.GET, ALL_FIELDS)
+    page = spec.paginate(request, per_page, fields=tuple(dict.fromkeys(REQUIRED_FIELDS + fields)))
+    properties = list(page)
+    next_cursor, previous_cursor = page.next_cursor, page.previous_cursor
+
+    # The page only changes if its rows, or any row's updated_at, change
+    etag = make_etag(
+        fields, spec.key, [(obj.pk, obj.updated_at) for obj in properties],
+        max((obj.updated_at for obj in properties), default=None), next_cursor, previous_cursor,
+    )
+    return _conditional(request, etag, lambda: {
+        'success': True,
+        'results': [serialize(obj, fields) for obj in properties],
+        'next': _page_url(request, next_cursor),
+        'previous': _page_url(request, previous_cursor),
+    })
+
+
+def listing_detail(request, property_id):
+    """One listing as JSON"""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return _error(str(e))
+
+    try:
+        property_obj = Property.objects.only(*REQUIRED_FIELDS, *fields).get(pk=property_id)
+    except Property.DoesNotExist:
+        return _error('Listing not found', status=404)
+
+    etag = make_etag(fields, property_obj.pk, property_obj.updated_at)
+    return _conditional(request, etag, lambda: {
+        'success': True,
+        'result': serialize(property_obj, fields),
+    })
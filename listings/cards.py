@@ -0,0 +1,128 @@
+"""
+Listing cards: the read path for the listing grids.
+
+A card holds only what the grid templates show, built from a
+``values_list()`` row, so grid pages never read the long ``description``,
+``features`` and ``amenities`` columns or build ``Property`` instances.
+Cards keep the attribute names the templates already use
+(``formatted_price``, ``main_image_url``, ``get_property_type_display``),
+plus ``created_at``/``id`` for cursor pagination.
+"""
+from django.db.models import QuerySet
+
+from .models import Property, listing_image_url
+
+CARD_FIELDS = (
+    'id', 'title', 'price', 'address', 'city', 'state', 'bedrooms', 'bathrooms', 'square_feet',
+    'property_type', 'is_featured', 'is_new_listing', 'main_image', 'created_at', 'updated_at',
+)
+TYPE_LABELS = dict(Property.PROPERTY_TYPES)
+
+
+class ListingCard:
+    __slots__ = (
+        'id', 'title', 'price', 'address', 'city', 'state', 'bedrooms', 'bathrooms', 'square_feet',
+        'property_type', 'is_featured', 'is_new_listing', 'main_image', 'main_image_url', 'created_at',
+        'updated_at', 'formatted_price', 'property_type_display', 'search_snippet',
+    )
+
+    def __init__(self, id, title, price, address, city, state, bedrooms, bathrooms, square_feet,
+                 property_type, is_featured, is_new_listing, main_image, created_at, updated_at):
+        self.id = id
+        self.title = title
+        self.price = price
+        self.address = address
+        self.city = city
+        self.state = state
+        self.bedrooms = bedrooms
+        self.bathrooms = bathrooms
+        self.square_feet = square_feet
+        self.property_type = property_type
+        self.is_featured = is_featured
+        self.is_new_listing = is_new_listing
+        self.main_image = main_image
+        self.main_image_url = listing_image_url(main_image, id)
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.formatted_price = f"${price:,.2f}"
+        self.property_type_display = TYPE_LABELS.get(property_type, property_type)
+        self.search_snippet = ''
+
+    def __repr__(self):
+        return f'<ListingCard {self.id}: {self.title}>'
+
+    def __eq__(self, other):
+        return isinstance(other, ListingCard) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_property_type_display(self):
+        return self.property_type_display
+
+
+class CardQuerySet:
+    """A ``values_list(*CARD_FIELDS)`` queryset whose rows come out as ``ListingCard``s
+
+    Queryset methods pass through, and those returning a queryset (filter,
+    order_by, reverse, slices) return another ``CardQuerySet``, so paginators
+    can use it like the queryset it wraps.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def __getattr__(self, name):
+        attribute = getattr(self.queryset, name)
+        if not callable(attribute):
+            return attribute
+
+        def method(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            return CardQuerySet(result) if isinstance(result, QuerySet) else result
+        return method
+
+    def __iter__(self):
+        return (ListingCard(*row) for row in self.queryset)
+
+    def iterator(self, chunk_size=None):
+        return (ListingCard(*row) for row in self.queryset.iterator(chunk_size=chunk_size))
+
+    def __len__(self):
+        return len(self.queryset)
+
+    def __bool__(self):
+        return bool(self.queryset)
+
+    def __getitem__(self, index):
+        result = self.queryset[index]
+        if isinstance(result, QuerySet):
+            return CardQuerySet(result)
+        # An evaluated queryset slices its cached rows into a list
+        if isinstance(index, slice):
+            return [ListingCard(*row) for row in result]
+        return ListingCard(*result)
+
+    def __repr__(self):
+        return f'<CardQuerySet {self.queryset.query}>'
+
+
+def cards(queryset):
+    """``queryset`` reading cards instead of model instances; it can still be filtered, ordered and sliced"""
+    return CardQuerySet(queryset.values_list(*CARD_FIELDS))
+
+
+def load_cards(ids, queryset=None):
+    """Cards for ``ids`` with one ``pk__in`` query, keeping the order of ``ids``
+
+    With ``queryset``, ids whose rows it no longer matches are left out.
+    """
+    ids = [int(pk) for pk in ids]
+    queryset = Property.objects.all() if queryset is None else queryset
+    rows = queryset.filter(pk__in=ids).order_by().values_list(*CARD_FIELDS)
+    by_id = {row[0]: ListingCard(*row) for row in rows}
+    return [by_id[pk] for pk in ids if pk in by_id]
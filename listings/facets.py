@@ -0,0 +1,96 @@
+"""
+Facet counts for the property type and price range choices of the search forms.
+
+All counts come from one aggregate query with a conditional ``COUNT`` per
+facet value. Each facet respects every active filter except its own, so
+the type counts answer "how many results if I picked this type" given the
+chosen location and price range, and vice versa. Results are cached per
+normalized filter combination under the listings version, so any change
+to a property invalidates them.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .fulltext import get_backend
+from .models import Property
+from .replicas import primary
+from .search_index import filter_by_location
+from .versioning import versioned_key
+
+FACET_TIMEOUT = 600
+
+# (value, label, min price, max price) for the price range choices; bounds are inclusive
+PRICE_RANGES = [
+    ('0-200000', 'Under $200K', None, 200000),
+    ('200000-400000', '$200K - $400K', 200000, 400000),
+    ('400000-600000', '$400K - $600K', 400000, 600000),
+    ('600000-800000', '$600K - $800K', 600000, 800000),
+    ('800000-1000000', '$800K - $1M', 800000, 1000000),
+    ('1000000+', '$1M+', 1000000, None),
+]
+
+
+def price_range_q(price_range):
+    """Q for a price range choice; an unknown choice does not filter, like the original views"""
+    for value, label, low, high in PRICE_RANGES:
+        if value == price_range:
+            q = Q()
+            if low is not None:
+                q &= Q(price__gte=low)
+            if high is not None:
+                q &= Q(price__lte=high)
+            return q
+    return Q()
+
+
+def _count(q):
+    return Count('pk', filter=q) if q else Count('pk')
+
+
+def compute_facets(property_type=None, location=None, price_range=None, query=None):
+    properties = Property.objects.filter(status='for_sale')
+    if query:
+        # Every text match, not only the best ones, so the counts are exact
+        properties = get_backend().filter(properties, query)
+    if location:
+        properties = filter_by_location(properties, location)
+
+    type_q = Q(property_type=property_type) if property_type else Q()
+    price_q = price_range_q(price_range) if price_range else Q()
+
+    aggregates = {'total': _count(type_q & price_q)}
+    for index, (value, label) in enumerate(Property.PROPERTY_TYPES):
+        aggregates[f'type_{index}'] = _count(Q(property_type=value) & price_q)
+    for index, (value, label, low, high) in enumerate(PRICE_RANGES):
+        aggregates[f'price_{index}'] = _count(price_range_q(value) & type_q)
+    counts = properties.order_by().aggregate(**aggregates)
+
+    return {
+        'total': counts['total'],
+        'property_types': [
+            (value, label, counts[f'type_{index}'])
+            for index, (value, label) in enumerate(Property.PROPERTY_TYPES)
+        ],
+        'price_ranges': [
+            (value, label, counts[f'price_{index}'])
+            for index, (value, label, low, high) in enumerate(PRICE_RANGES)
+        ],
+    }
+
+
+def get_facets(property_type=None, location=None, price_range=None, query=None):
+    """Cached facet counts for a filter combination"""
+    # Location matching ignores ASCII case, so such locations share an entry
+    location = location or ''
+    if location.isascii():
+        location = location.lower()
+    normalized = '\x1f'.join([property_type or '', location, price_range or '', query or ''])
+    key = versioned_key('facets', hashlib.md5(normalized.encode()).hexdigest())
+    facets = cache.get(key)
+    if facets is None:
+        with primary():
+            facets = compute_facets(property_type, location, price_range, query)
+        cache.set(key, facets, FACET_TIMEOUT)
+    return facets
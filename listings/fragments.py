@@ -0,0 +1,68 @@
+"""
+Rendered listing-card fragments, cached per listing version.
+
+A card's markup depends only on its listing, so it is cached under the
+listing's id and ``updated_at`` (plus the template and its options). Any
+save moves ``updated_at``, so an edited listing is rendered again under a
+new key and its old fragments simply expire. A page of cards is fetched
+with one ``get_many`` and the misses are stored with one ``set_many``.
+
+Updates that bypass ``save()`` (``QuerySet.update``) do not touch
+``updated_at``; bump ``FRAGMENT_VERSION`` when the card templates change.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+FRAGMENT_VERSION = 1
+CARD_TEMPLATE = 'listings/includes/property_card.html'
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def stats():
+    """Hits and misses of this process since start or the last ``reset_stats()``"""
+    with _lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _lock:
+        _stats.update(hits=0, misses=0)
+
+
+def _count(hits, misses):
+    with _lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+
+
+def fragment_key(template_name, obj, options):
+    # The search snippet depends on the query, not the listing
+    snippet = getattr(obj, 'search_snippet', '')
+    parts = [template_name, obj.pk, obj.updated_at.timestamp(), sorted(options.items()), str(snippet)]
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'listing-card:{FRAGMENT_VERSION}:{obj.pk}:{digest}'
+
+
+def render_cards(objects, template_name=CARD_TEMPLATE, **options):
+    """Card markup for each of ``objects``, in order; ``options`` are passed to the template"""
+    objects = list(objects)
+    keys = [fragment_key(template_name, obj, options) for obj in objects]
+    fragments = cache.get_many(keys)
+
+    missing = {}
+    for key, obj in zip(keys, objects):
+        if key not in fragments and key not in missing:
+            missing[key] = render_to_string(template_name, {'property': obj, **options})
+    if missing:
+        cache.set_many(missing, settings.LISTING_FRAGMENT_TIMEOUT)
+    _count(len(objects) - len(missing), len(missing))
+
+    fragments.update(missing)
+    return [mark_safe(fragments[key]) for key in keys]
@@ -0,0 +1,200 @@
+"""
+Full-text search over listing title, description, features and amenities.
+
+The backend is chosen with ``LISTINGS_FULLTEXT_BACKEND`` (a dotted path);
+when it is unset, SQLite databases use ``SQLiteFTS5Backend`` and anything
+else falls back to ``ContainsBackend``. Backends are kept in sync with
+``Property`` through signals, and ``manage.py rebuild_search_index``
+rebuilds them in bulk.
+
+Searches take an optional ``queryset`` of properties to stay within, so
+the other filters of a search narrow the matches before ``limit`` keeps
+the best ones, and ``filter()`` restricts a queryset to every match for
+exact counts.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, FullResultSet
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import Property
+
+TEXT_FIELDS = ('title', 'description', 'features', 'amenities')
+MAX_RESULTS = 1200
+
+# Snippet markers that cannot occur in listing text; swapped for <mark> after escaping
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def search_terms(query):
+    """Split free text into words, dropping anything a backend could read as syntax"""
+    return re.findall(r'\w+', query or '')
+
+
+class SearchHit:
+    __slots__ = ('id', 'rank', 'snippet')
+
+    def __init__(self, id, rank=0.0, snippet=''):
+        self.id = id
+        self.rank = rank
+        self.snippet = snippet
+
+
+class BaseFullTextBackend:
+    """Interface for full-text backends; ``search`` returns hits best first"""
+
+    def index(self, properties):
+        raise NotImplementedError
+
+    def remove(self, ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query, limit=MAX_RESULTS, queryset=None):
+        """The best ``limit`` matches among ``queryset`` (default: all properties)"""
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """``queryset`` narrowed to every match of ``query``, unranked"""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000):
+        """Re-index every property, streaming them in batches"""
+        self.clear()
+        batch = []
+        total = 0
+        for property_obj in Property.objects.only(*TEXT_FIELDS).order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(property_obj)
+            if len(batch) >= batch_size:
+                self.index(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.index(batch)
+            total += len(batch)
+        return total
+
+
+class ContainsBackend(BaseFullTextBackend):
+    """Portable fallback: every word must appear in one of the text fields; no ranking or snippets"""
+
+    def index(self, properties):
+        pass
+
+    def remove(self, ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, query, limit=MAX_RESULTS, queryset=None):
+        if not search_terms(query):
+            return []
+        properties = self.filter(Property.objects.all() if queryset is None else queryset, query)
+        return [SearchHit(pk) for pk in properties.values_list('pk', flat=True)[:limit]]
+
+    def filter(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            q = Q()
+            for field in TEXT_FIELDS:
+                q |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(q)
+        return queryset
+
+
+class SQLiteFTS5Backend(BaseFullTextBackend):
+    """SQLite FTS5 table (created by migration 0005) with BM25 ranking and snippets"""
+    table = 'listings_property_fts'
+    # BM25 column weights, in TEXT_FIELDS order
+    weights = (10.0, 1.0, 3.0, 3.0)
+
+    def index(self, properties):
+        rows = [
+            (property_obj.pk,) + tuple(getattr(property_obj, field) or '' for field in TEXT_FIELDS)
+            for property_obj in properties
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM "{self.table}" WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO "{self.table}" (rowid, {", ".join(TEXT_FIELDS)}) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM "{self.table}" WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{self.table}"')
+
+    @staticmethod
+    def match(query):
+        # Quoting every word makes it a plain token (implicit AND) rather than FTS syntax
+        return ' '.join(f'"{term}"' for term in search_terms(query))
+
+    def search(self, query, limit=MAX_RESULTS, queryset=None):
+        if not search_terms(query):
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        table = Property._meta.db_table
+        # The text index is read from the database the queryset reads, so both agree
+        database = connections[queryset.db if queryset is not None else DEFAULT_DB_ALIAS]
+        where, params = '', []
+        if queryset is not None:
+            # The queryset's conditions on listings_property go into the same
+            # statement, so LIMIT keeps the best matches that pass them
+            try:
+                where, params = queryset.query.get_compiler(connection=database).compile(queryset.query.where)
+            except EmptyResultSet:
+                return []
+            except FullResultSet:
+                pass
+        sql = (
+            f'SELECT "{self.table}".rowid, bm25("{self.table}", {weights}) AS rank, '
+            f'snippet("{self.table}", -1, %s, %s, %s, 16) FROM "{self.table}" '
+            + (f'JOIN "{table}" ON "{table}"."id" = "{self.table}".rowid ' if where else '')
+            + f'WHERE "{self.table}" MATCH %s ' + (f'AND {where} ' if where else '')
+            + 'ORDER BY rank LIMIT %s'
+        )
+        with database.cursor() as cursor:
+            cursor.execute(sql, [MARK_START, MARK_END, '…', self.match(query)] + list(params) + [limit])
+            return [SearchHit(pk, rank, render_snippet(snippet)) for pk, rank, snippet in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        if not search_terms(query):
+            return queryset.none()
+        matches = RawSQL(f'SELECT rowid FROM "{self.table}" WHERE "{self.table}" MATCH %s', [self.match(query)])
+        return queryset.filter(pk__in=matches)
+
+
+def render_snippet(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'LISTINGS_FULLTEXT_BACKEND', None)
+        if path is None:
+            backend_class = SQLiteFTS5Backend if connection.vendor == 'sqlite' else ContainsBackend
+        else:
+            backend_class = import_string(path)
+        _backend = backend_class()
+    return _backend
@@ -0,0 +1,166 @@
+"""
+Coordinates and map searches for listings.
+
+Listings get a latitude and longitude from the centroid of their ZIP code
+(the bundled ``data/zip_centroids.csv.gz``, see ``data/NOTICE``) unless
+they already have one, so no external geocoding service is needed.
+
+Each listing also stores ``geo_cell``, the row-major index of the
+``CELL_DEGREES`` grid cell it falls in. A bounding box covers a band of
+consecutive cell numbers per grid row, so searches first select the
+candidates with one ``BETWEEN`` range per row on the covering
+``listing_geo_cell_idx`` index, then check the exact box or haversine
+distance on the candidates' coordinates with NumPy.
+"""
+import csv
+import functools
+import gzip
+import math
+import os
+
+import numpy as np
+from django.db import connection
+
+from .models import Property
+
+CELL_DEGREES = 0.05
+GRID_ROWS = round(180 / CELL_DEGREES)
+GRID_COLUMNS = round(360 / CELL_DEGREES)
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = EARTH_RADIUS_MILES * math.pi / 180
+ZIP_CENTROIDS = os.path.join(os.path.dirname(__file__), 'data', 'zip_centroids.csv.gz')
+
+MAX_RESULTS = 500
+# Cell ranges (UNION ALL arms, SQLite allows 500) queried at most; taller boxes merge neighbouring rows
+MAX_RANGES = 200
+MAX_RADIUS_MILES = 100
+
+
+@functools.lru_cache(maxsize=None)
+def zip_centroids():
+    """{five digit ZIP code: (latitude, longitude)}"""
+    with gzip.open(ZIP_CENTROIDS, 'rt', newline='') as f:
+        return {row['zip_code']: (float(row['latitude']), float(row['longitude'])) for row in csv.DictReader(f)}
+
+
+def geocode(zip_code):
+    """Centroid of a ZIP code (ZIP+4 and padding are ignored), or None"""
+    digits = (zip_code or '').strip()[:5]
+    return zip_centroids().get(digits)
+
+
+def _row(latitude):
+    return min(max(int((latitude + 90) // CELL_DEGREES), 0), GRID_ROWS - 1)
+
+
+def _column(longitude):
+    return min(max(int((longitude + 180) // CELL_DEGREES), 0), GRID_COLUMNS - 1)
+
+
+def cell_for(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return _row(latitude) * GRID_COLUMNS + _column(longitude)
+
+
+def assign_coordinates(property_obj, force=False, previous_zip_code=None):
+    """Fill in missing coordinates from the ZIP code and keep ``geo_cell`` in step; True if anything changed
+
+    ``previous_zip_code`` is the ZIP code stored before this save. Coordinates
+    that are its centroid came from it, so they follow a new ZIP code.
+    """
+    before = (property_obj.latitude, property_obj.longitude, property_obj.geo_cell)
+    if (previous_zip_code is not None and previous_zip_code != property_obj.zip_code
+            and geocode(previous_zip_code) == (property_obj.latitude, property_obj.longitude)):
+        property_obj.latitude = property_obj.longitude = None
+    if force or property_obj.latitude is None or property_obj.longitude is None:
+        centroid = geocode(property_obj.zip_code)
+        if centroid is not None:
+            property_obj.latitude, property_obj.longitude = centroid
+    property_obj.geo_cell = cell_for(property_obj.latitude, property_obj.longitude)
+    return (property_obj.latitude, property_obj.longitude, property_obj.geo_cell) != before
+
+
+def cell_ranges(south, west, north, east, limit=MAX_RANGES):
+    """Inclusive (first, last) cell number ranges covering a box; ``west > east`` crosses the antimeridian.
+
+    Past ``limit`` ranges, runs of neighbouring rows are merged into one
+    range, which also covers the cells between them outside the box.
+    """
+    if west > east:
+        return (cell_ranges(south, west, north, 180, limit // 2) +
+                cell_ranges(south, -180, north, east, limit - limit // 2))
+    first_column, last_column = _column(west), _column(east)
+    rows = range(_row(south), _row(north) + 1)
+    step = -(-len(rows) // max(limit, 1))
+    return [
+        (row * GRID_COLUMNS + first_column, (min(row + step, rows.stop) - 1) * GRID_COLUMNS + last_column)
+        for row in rows[::step]
+    ]
+
+
+def bounding_box(latitude, longitude, miles):
+    """(south, west, north, east) enclosing a circle"""
+    degrees = miles / MILES_PER_DEGREE
+    south, north = max(latitude - degrees, -90), min(latitude + degrees, 90)
+    cos_latitude = min(math.cos(math.radians(south)), math.cos(math.radians(north)))
+    if cos_latitude <= 0 or degrees / cos_latitude >= 180:
+        return south, -180, north, 180
+    spread = degrees / cos_latitude
+    west, east = longitude - spread, longitude + spread
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return south, west, north, east
+
+
+def haversine_miles(latitude, longitude, latitudes, longitudes):
+    """Great-circle distances from one point to arrays of points"""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+@functools.lru_cache(maxsize=None)
+def _candidate_sql(vendor):
+    """SQL of one cell range query, with (status, first cell, last cell) parameters"""
+    arm = Property.objects.filter(status='for_sale').filter(geo_cell__range=(-1, -2)).order_by()
+    sql, params = arm.values_list('id', 'latitude', 'longitude').query.sql_with_params()
+    assert tuple(params) == ('for_sale', -1, -2)
+    return sql
+
+
+def _candidates(south, west, north, east):
+    """ids, latitudes and longitudes of the for-sale listings in the cells covering a box"""
+    # One UNION ALL arm per range, since SQLite would answer an OR of ranges from
+    # the status prefix alone; the arm is compiled once and repeated, which for
+    # tall boxes is several times faster than compiling a queryset per range
+    ranges = cell_ranges(south, west, north, east)
+    sql = ' UNION ALL '.join([_candidate_sql(connection.vendor)] * len(ranges))
+    params = [value for first, last in ranges for value in ('for_sale', first, last)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        data = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+    return data[:, 0].astype(np.int64), data[:, 1], data[:, 2]
+
+
+def in_box(south, west, north, east):
+    """Ids of the for-sale listings inside a box, newest first"""
+    ids, latitudes, longitudes = _candidates(south, west, north, east)
+    inside = (latitudes >= south) & (latitudes <= north)
+    if west > east:
+        inside &= (longitudes >= west) | (longitudes <= east)
+    else:
+        inside &= (longitudes >= west) & (longitudes <= east)
+    return np.sort(ids[inside])[::-1]
+
+
+def within_radius(latitude, longitude, miles):
+    """(ids, distances in miles) of the for-sale listings within a radius, nearest first"""
+    ids, latitudes, longitudes = _candidates(*bounding_box(latitude, longitude, miles))
+    distances = haversine_miles(latitude, longitude, latitudes, longitudes)
+    inside = distances <= miles
+    order = np.argsort(distances[inside], kind='stable')
+    return ids[inside][order], distances[inside][order]
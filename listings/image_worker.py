@@ -0,0 +1,68 @@
+"""
+The part of the image pipeline that runs in worker processes.
+
+Kept apart from ``images`` because a spawned worker imports this module
+before Django is set up, so it must not import any models. Workers only
+read and write storage and return what they made.
+"""
+import base64
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps
+
+WIDTHS = (400, 800, 1200, 1600)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+PLACEHOLDER_WIDTH = 16
+DERIVATIVE_ROOT = 'derivatives'
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def _placeholder(image):
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    tiny = image.resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR).filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render_derivatives(name):
+    """Write the derivatives of the stored image ``name`` and describe them"""
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        # Let the JPEG decoder scale down by up to 8x while reading; the
+        # result is still at least as large as the widest derivative
+        image.draft('RGB', (WIDTHS[-1], WIDTHS[-1]))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+
+    stem = posixpath.join(DERIVATIVE_ROOT, posixpath.splitext(name)[0])
+    widths = sorted({width for width in WIDTHS if width < image.width} | {min(image.width, WIDTHS[-1])})
+    variants = []
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for extension, image_format, options in FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            path = f'{stem}/{width}w.{extension}'
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants.append([width, extension, default_storage.save(path, ContentFile(buffer.getvalue()))])
+
+    return {
+        'source': name,
+        'width': image.width,
+        'height': image.height,
+        'variants': variants,
+        'placeholder': _placeholder(image),
+    }
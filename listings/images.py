@@ -0,0 +1,116 @@
+"""
+Responsive derivatives of uploaded property and blog images.
+
+After an upload is committed, a process pool decodes the original once and
+writes WebP and JPEG copies at each of ``image_worker.WIDTHS`` no wider
+than the original, plus a tiny blurred JPEG kept inline as a data URI
+placeholder. The result is recorded as a ``ProcessedImage`` keyed by the original's storage name;
+until then templates keep serving the original. ``srcset()`` and the
+``responsive_image`` template tag read that record through the cache.
+
+Workers (``image_worker``) only touch storage; the database row is
+written by the process that scheduled the job, so no connection is
+shared across processes.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+
+from .image_worker import init_worker, render_derivatives
+from .models import ProcessedImage, Property
+
+logger = logging.getLogger(__name__)
+
+# Seconds a lookup stays cached; images not processed yet are looked up again sooner
+PROCESSED_TIMEOUT = 60 * 60 * 24
+MISSING_TIMEOUT = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def make_executor(workers):
+    # Spawned rather than forked, so workers never inherit the server's
+    # threads or database connections
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker,
+    )
+
+
+def get_executor():
+    """This process's pool for upload jobs, started on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = make_executor(settings.LISTING_IMAGE_WORKERS)
+        return _executor
+
+
+def record(result):
+    """Store a worker's result and start using the derivatives"""
+    processed, _ = ProcessedImage.objects.update_or_create(
+        source=result['source'],
+        defaults={key: value for key, value in result.items() if key != 'source'},
+    )
+    cache.set(_cache_key(processed.source), processed, PROCESSED_TIMEOUT)
+    # Cached listing cards are keyed by updated_at, so move it for the
+    # listings showing this image to have them rendered with the new srcset
+    Property.objects.filter(main_image=processed.source).update(updated_at=timezone.now())
+    return processed
+
+
+def _recorded(future):
+    try:
+        record(future.result())
+    except Exception:
+        logger.exception('Could not process image')
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def schedule(name):
+    """Process the stored image ``name`` off the request path, unless that was done already"""
+    if not name or ProcessedImage.objects.filter(source=name).exists():
+        return
+    if not settings.LISTING_IMAGE_WORKERS:
+        record(render_derivatives(name))
+        return
+    get_executor().submit(render_derivatives, name).add_done_callback(_recorded)
+
+
+def _cache_key(name):
+    return f'processed-image:{name}'
+
+
+def get_processed(name):
+    """The ``ProcessedImage`` of a stored image name, or None while it has not been processed"""
+    if not name:
+        return None
+    key = _cache_key(name)
+    processed = cache.get(key)
+    if processed is None:
+        processed = ProcessedImage.objects.filter(source=name).first() or ''
+        cache.set(key, processed, PROCESSED_TIMEOUT if processed else MISSING_TIMEOUT)
+    return processed or None
+
+
+def srcset(processed, extension):
+    """``srcset`` attribute value listing the ``extension`` derivatives of a ``ProcessedImage``"""
+    return ', '.join(
+        f'{default_storage.url(path)} {width}w'
+        for width, variant_extension, path in processed.variants if variant_extension == extension
+    )
+
+
+def largest(processed, extension):
+    return default_storage.url(max(
+        (width, path) for width, variant_extension, path in processed.variants if variant_extension == extension
+    )[1])
@@ -0,0 +1,167 @@
+"""
+Bulk listing import from CSV or JSON Lines feeds.
+
+Rows are streamed from the file, cleaned with the model fields' own
+validation and upserted in batches on ``Property.external_id`` with
+``bulk_create(update_conflicts=True)``. A row whose imported values hash to
+the ``content_hash`` already stored is skipped, so re-importing a full
+feed only writes what changed.
+
+Each batch is written in one transaction together with its search index
+rows, and ``read_rows`` reports the byte offset just past every row, which
+is what the ``import_listings`` command checkpoints to resume from.
+"""
+import csv
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from . import fulltext, geo, neighbors, page_cache, pragmas, search_index, snapshot, versioning
+from .models import Property
+
+IMPORT_FIELDS = [
+    'title', 'description', 'address', 'city', 'state', 'zip_code', 'latitude', 'longitude', 'price',
+    'property_type', 'status', 'bedrooms', 'bathrooms', 'square_feet', 'lot_size', 'year_built', 'features',
+    'amenities', 'is_featured', 'is_new_listing',
+]
+REQUIRED_FIELDS = ['external_id', 'title', 'address', 'city', 'state', 'zip_code', 'price', 'property_type']
+# Written on every upsert besides the imported fields; created_at is kept
+UPDATE_FIELDS = IMPORT_FIELDS + ['geo_cell', 'content_hash', 'updated_at']
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+TRUE_VALUES = {'true', 't', 'yes', 'y', '1'}
+FALSE_VALUES = {'false', 'f', 'no', 'n', '0', ''}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _lines(file, position):
+    """Decoded lines of a binary file, keeping ``position[0]`` at the end of the last line read"""
+    for line in iter(file.readline, b''):
+        position[0] += len(line)
+        yield line.decode('utf-8-sig' if position[0] == len(line) else 'utf-8')
+
+
+def read_rows(path, file_format, offset=0):
+    """Yield ``(row, offset after the row)`` from ``offset`` on; the CSV header is always read first"""
+    with open(path, 'rb') as file:
+        position = [0]
+        if file_format == 'csv':
+            header = next(csv.reader(_lines(file, position)), None)
+            if header is None:
+                return
+            header = [name.strip() for name in header]
+            if offset > position[0]:
+                file.seek(offset)
+                position[0] = offset
+            for values in csv.reader(_lines(file, position)):
+                if values:
+                    yield dict(zip(header, values)), position[0]
+        else:
+            file.seek(offset)
+            position[0] = offset
+            for line in _lines(file, position):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        row = RowError(f'Invalid JSON: {e}')
+                    yield row, position[0]
+
+
+def _field_value(field, value):
+    if isinstance(value, str):
+        value = value.strip()
+        if field.get_internal_type() == 'BooleanField':
+            if value.lower() not in TRUE_VALUES | FALSE_VALUES:
+                raise ValidationError(f'"{value}" is not true or false')
+            return value.lower() in TRUE_VALUES
+        if value == '' and field.null:
+            return None
+    return field.clean(value, None)
+
+
+def clean_row(row):
+    """The imported values of a feed row, cleaned by the model fields; raises RowError"""
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError('Row is not an object')
+    missing = [name for name in REQUIRED_FIELDS if row.get(name) in (None, '')]
+    if missing:
+        raise RowError(f"Missing {', '.join(missing)}")
+
+    values = {'external_id': str(row['external_id']).strip()}
+    errors = []
+    for name in IMPORT_FIELDS:
+        field = Property._meta.get_field(name)
+        try:
+            values[name] = _field_value(field, row[name]) if name in row else field.get_default()
+        except ValidationError as e:
+            errors.append(f"{name}: {' '.join(e.messages)}")
+    if errors:
+        raise RowError('; '.join(errors))
+    return values
+
+
+def content_hash(values):
+    return hashlib.md5(repr([values[name] for name in IMPORT_FIELDS]).encode()).hexdigest()
+
+
+def upsert(rows):
+    """Insert or update cleaned rows, skipping unchanged ones; returns (created, updated properties, unchanged)"""
+    # The last row wins when a feed repeats an id within the batch
+    rows = {values['external_id']: values for values in rows}
+    stored = dict(
+        Property.objects.filter(external_id__in=list(rows)).values_list('external_id', 'content_hash')
+    )
+
+    properties = []
+    created = 0
+    for external_id, values in rows.items():
+        digest = content_hash(values)
+        if stored.get(external_id) == digest:
+            continue
+        created += external_id not in stored
+        property_obj = Property(content_hash=digest, **values)
+        geo.assign_coordinates(property_obj)
+        properties.append(property_obj)
+
+    if properties:
+        with transaction.atomic():
+            properties = Property.objects.bulk_create(
+                properties, update_conflicts=True, unique_fields=['external_id'], update_fields=UPDATE_FIELDS,
+            )
+            search_index.index_properties(properties)
+            fulltext.get_backend().index(properties)
+    return created, properties, len(rows) - len(properties)
+
+
+def refresh_derived_data(changed_ids=None, similar_listings=True):
+    """Do what the save signals would have done for listings written in bulk.
+
+    ``changed_ids=None`` stands for too many (or unknown) listings: their
+    detail pages are left to expire, the planner statistics are refreshed
+    and the similar listings of every property are recomputed from
+    scratch. The listing version, the page
+    cache keys and the snapshot generation live in the shared
+    ``listing-versions`` cache, so the web workers see the import too.
+    """
+    versioning.bump_version()
+    snapshot.invalidate()
+    keys = {'listings:featured', 'listings:new'}
+    keys.update(f'listings:type:{value}' for value, label in Property.PROPERTY_TYPES)
+    if changed_ids is not None:
+        keys.update(f'property:{pk}' for pk in changed_ids)
+    page_cache.purge(*keys)
+    if changed_ids is None:
+        pragmas.analyze(connection)
+
+    if similar_listings:
+        if changed_ids is None:
+            neighbors.compute_all()
+        else:
+            neighbors.update_neighbors(sorted(changed_ids))
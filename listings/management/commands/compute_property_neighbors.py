@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings import neighbors
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed similar listings shown on property detail pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Neighbor rows inserted per query')
+        parser.add_argument('--pending', action='store_true',
+                            help='Only update for the listings saved or deleted since the last run')
+        parser.add_argument('--every', type=float, help='With --pending, keep updating, this many seconds apart')
+
+    def handle(self, *args, **options):
+        if not options['pending']:
+            started = time.monotonic()
+            total = neighbors.compute_all(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Stored {total} neighbor rows in {time.monotonic() - started:.1f}s'
+            ))
+            return
+
+        while True:
+            started = time.monotonic()
+            total = 0
+            while True:
+                processed = neighbors.process_pending()
+                total += processed
+                if processed < neighbors.PENDING_BATCH:
+                    break
+            if total:
+                self.stdout.write(f'Updated neighbors for {total} changed listings in {time.monotonic() - started:.1f}s')
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,100 @@
+import contextlib
+import time
+
+from django.apps import apps
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, reset_queries, transaction
+from django.db.migrations.recorder import MigrationRecorder
+
+from realestate_project import databases
+
+SOURCE = 'copy_source'
+
+
+@contextlib.contextmanager
+def original_timestamps(models):
+    """Keep auto_now and auto_now_add fields from overwriting the copied values"""
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('Copy every row of another database into the default one after migrating it, keeping primary keys; '
+            'moves an existing SQLite site to PostgreSQL (set DATABASE_URL to the new database first)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_url', help='Database to copy from, e.g. sqlite:///db.sqlite3')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows read and inserted per batch')
+
+    def handle(self, *args, **options):
+        source_settings = databases.from_url(options['source_url'])
+        target = connections[DEFAULT_DB_ALIAS]
+        if (source_settings['ENGINE'], str(source_settings['NAME'])) == (target.settings_dict['ENGINE'],
+                                                                         str(target.settings_dict['NAME'])):
+            raise CommandError('The source is the default database itself')
+        connections.settings[SOURCE] = connections.configure_settings(
+            {DEFAULT_DB_ALIAS: {}, SOURCE: source_settings}
+        )[SOURCE]
+        try:
+            self.copy(options['batch_size'])
+        finally:
+            connections[SOURCE].close()
+            del connections[SOURCE]
+            del connections.settings[SOURCE]
+
+    def copy(self, batch_size):
+        call_command('migrate', database=DEFAULT_DB_ALIAS, interactive=False, verbosity=0)
+        source_migrations = set(MigrationRecorder(connections[SOURCE]).applied_migrations())
+        missing = set(MigrationRecorder(connections[DEFAULT_DB_ALIAS]).applied_migrations()) - source_migrations
+        if missing:
+            raise CommandError(f'The source has not applied {len(missing)} migrations, e.g. {sorted(missing)[0]}; '
+                               'migrate it first')
+
+        models = [model for model in apps.get_models(include_auto_created=True)
+                  if model._meta.managed and not model._meta.proxy]
+        # migrate has just created these; every other table must be empty
+        generated = {ContentType, Permission}
+        for model in models:
+            if model not in generated and model._base_manager.using(DEFAULT_DB_ALIAS).exists():
+                raise CommandError(f'{model._meta.label} already has rows in the default database')
+
+        started = time.monotonic()
+        # Foreign keys are checked at commit, so the tables can be copied in any order
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), original_timestamps(models):
+            ContentType.objects.using(DEFAULT_DB_ALIAS).all().delete()
+            for model in models:
+                copied = 0
+                rows = model._base_manager.using(SOURCE).order_by('pk').iterator(chunk_size=batch_size)
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) == batch_size:
+                        copied += len(model._base_manager.using(DEFAULT_DB_ALIAS).bulk_create(batch))
+                        batch = []
+                        reset_queries()
+                if batch:
+                    copied += len(model._base_manager.using(DEFAULT_DB_ALIAS).bulk_create(batch))
+                self.stdout.write(f'{model._meta.label}: {copied} rows')
+
+            # New rows must not reuse the copied primary keys
+            with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                for statement in connections[DEFAULT_DB_ALIAS].ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(statement)
+        ContentType.objects.clear_cache()
+        self.stdout.write(f'Copied {len(models)} tables in {time.monotonic() - started:.1f}s')
+
+        # The SQLite full-text index is a virtual table rather than a model
+        call_command('rebuild_search_index', skip_location=True, stdout=self.stdout)
@@ -1,13 +1,23 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from django.db import reset_queries
+from listings import importer, synthetic
 from listings.models import Property
 from blog_posts.models import Category, BlogPost
 from django.utils import timezone
 import random
+import time
 
 class Command(BaseCommand):
     help = 'Create sample data for the real estate website'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=0,
+                            help='Generate this many synthetic listings (with related rows) instead of the samples')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic data')
+        parser.add_argument('--skip-neighbors', action='store_true',
+                            help='Leave the similar listings alone (run compute_property_neighbors later)')
+
     def handle(self, *args, **options):
         self.stdout.write('Creating sample data...')
         
@@ -28,6 +38,10 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(f'Created category: {name}')
         
+        if options['scale']:
+            self.generate(options['scale'], options['seed'], categories, options['skip_neighbors'])
+            return
+        
         # Create sample properties
         property_data = [
             {
@@ -44,7 +58,6 @@ class Command(BaseCommand):
                 'square_feet': 3200,
                 'is_featured': True,
                 'is_new_listing': True,
-                'main_image_url': 'https://images.unsplash.com/photo-1560518883-ce09059eeffa?w=400&h=300&fit=crop',
             },
             {
                 'title': 'Cozy Family Home with Large Yard',
@@ -368,3 +381,35 @@ Complete major renovations at least six months before listing to ensure everythi
         )
         self.stdout.write('You can now view the website with sample properties and blog posts.')
         self.stdout.write('Admin login: admin/admin123')
+    
+    def generate(self, scale, seed, categories, skip_neighbors):
+        """Write ``scale`` synthetic listings in blocks, continuing after those written before"""
+        author = User.objects.get(username='admin')
+        synthetic.ensure_photos(seed)
+        start = synthetic.written(seed)
+        if start >= scale:
+            self.stdout.write(f'{start} synthetic listings with seed {seed} exist already')
+            return
+        if start:
+            self.stdout.write(f'Continuing after {start} synthetic listings')
+        
+        started = time.monotonic()
+        for block in range(start // synthetic.BLOCK_SIZE, (scale - 1) // synthetic.BLOCK_SIZE + 1):
+            stop = min((block + 1) * synthetic.BLOCK_SIZE, scale)
+            synthetic.generate_block(seed, block, start, stop, author, categories)
+            reset_queries()
+            self.stdout.write(
+                f'{stop} listings, {(stop - start) / (time.monotonic() - started):,.0f} listings/s', ending='\r'
+            )
+        elapsed = time.monotonic() - started
+        
+        self.stdout.write(
+            f'\nGenerated {scale - start} listings in {elapsed:.1f}s ({(scale - start) / elapsed:,.0f} listings/s)'
+        )
+        
+        self.stdout.write('Updating caches and similar listings...')
+        started = time.monotonic()
+        importer.refresh_derived_data(similar_listings=not skip_neighbors)
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated caches and similar listings in {time.monotonic() - started:.1f}s'
+        ))
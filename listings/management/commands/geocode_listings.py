@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from listings import geo
+from listings.models import Property
+
+
+class Command(BaseCommand):
+    help = 'Fill in listing coordinates from the bundled ZIP code centroids and update their grid cells'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-geocode listings that already have coordinates')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Listings updated per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        properties = Property.objects.only('zip_code', 'latitude', 'longitude', 'geo_cell').order_by('pk')
+        
+        updated = missing = 0
+        batch = []
+        for property_obj in properties.iterator(chunk_size=batch_size):
+            if geo.assign_coordinates(property_obj, force=options['all']):
+                batch.append(property_obj)
+            if property_obj.latitude is None:
+                missing += 1
+            if len(batch) >= batch_size:
+                Property.objects.bulk_update(batch, ['latitude', 'longitude', 'geo_cell'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Property.objects.bulk_update(batch, ['latitude', 'longitude', 'geo_cell'])
+            updated += len(batch)
+        
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} listings'))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{missing} listings have a ZIP code with no known centroid'))
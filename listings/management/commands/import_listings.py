@@ -0,0 +1,117 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+
+from listings import importer
+
+# Above this many changed listings the similar listings are recomputed from
+# scratch instead of incrementally, and detail pages are left to expire
+NEIGHBOR_REBUILD_THRESHOLD = 5000
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = ('Stream listings from a CSV or JSON Lines feed and upsert them on external_id, skipping unchanged rows; '
+            'an interrupted import resumes from its checkpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSON Lines file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format; guessed from the extension')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows validated and upserted per batch')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: PATH.checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--skip-neighbors', action='store_true',
+                            help='Leave the similar listings alone (run compute_property_neighbors later)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or importer.FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise CommandError('Cannot tell the file format from the extension; pass --format')
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+
+        stat = os.stat(path)
+        source = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+        state = {'offset': 0, 'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'invalid': 0}
+        if os.path.exists(checkpoint_path) and not options['restart']:
+            with open(checkpoint_path) as checkpoint:
+                saved = json.load(checkpoint)
+            if saved['source'] != source:
+                raise CommandError(f'{checkpoint_path} belongs to a different version of the file; pass --restart')
+            state = saved['state']
+            self.stdout.write(f"Resuming after row {state['rows']}")
+
+        self.changed_ids = set()
+        # Listings changed before a crash are not known by id any more
+        self.ids_complete = not (state['created'] or state['updated'])
+        self.reported_errors = 0
+        started = time.monotonic()
+        rows_at_start = state['rows']
+        batch = []
+        for row, offset in importer.read_rows(path, file_format, state['offset']):
+            state['rows'] += 1
+            try:
+                batch.append(importer.clean_row(row))
+            except importer.RowError as e:
+                state['invalid'] += 1
+                self.report_error(state['rows'], e)
+            if len(batch) >= options['batch_size']:
+                self.write_batch(batch, state, offset, source, checkpoint_path, started, rows_at_start)
+                batch = []
+        if batch or state['rows'] > rows_at_start:
+            self.write_batch(batch, state, os.path.getsize(path), source, checkpoint_path, started, rows_at_start)
+
+        self.update_derived_data(options['skip_neighbors'])
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.monotonic() - started
+        rate = (state['rows'] - rows_at_start) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['rows']} rows in {elapsed:.1f}s ({rate:,.0f} rows/s): {state['created']} created, "
+            f"{state['updated']} updated, {state['unchanged']} unchanged, {state['invalid']} invalid"
+        ))
+
+    def report_error(self, row_number, error):
+        self.reported_errors += 1
+        if self.reported_errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'Row {row_number}: {error}')
+        elif self.reported_errors == MAX_REPORTED_ERRORS + 1:
+            self.stderr.write('Further invalid rows are counted but not shown')
+
+    def write_batch(self, batch, state, offset, source, checkpoint_path, started, rows_at_start):
+        created, properties, unchanged = importer.upsert(batch)
+        state['created'] += created
+        state['updated'] += len(properties) - created
+        state['unchanged'] += unchanged
+        state['offset'] = offset
+        if len(self.changed_ids) <= NEIGHBOR_REBUILD_THRESHOLD:
+            self.changed_ids.update(property_obj.pk for property_obj in properties)
+
+        # Written only after the batch committed, so a crash repeats at most
+        # this batch, and repeating it is harmless
+        temporary = f'{checkpoint_path}.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump({'source': source, 'state': state}, checkpoint)
+        os.replace(temporary, checkpoint_path)
+        # With DEBUG on, the query log would otherwise keep thousands of bulk INSERTs
+        reset_queries()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{state['rows']} rows, {(state['rows'] - rows_at_start) / elapsed:,.0f} rows/s", ending='\r'
+        )
+
+    def update_derived_data(self, skip_neighbors):
+        if not self.changed_ids and self.ids_complete:
+            return
+        many = len(self.changed_ids) > NEIGHBOR_REBUILD_THRESHOLD or not self.ids_complete
+        started = time.monotonic()
+        importer.refresh_derived_data(None if many else self.changed_ids, similar_listings=not skip_neighbors)
+        if not skip_neighbors:
+            self.stdout.write(f'\nUpdated similar listings in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from blog_posts.models import BlogPost
+from listings import images
+from listings.models import ProcessedImage, Property, PropertyImage
+
+IMAGE_FIELDS = [
+    (Property, 'main_image'),
+    (PropertyImage, 'image'),
+    (BlogPost, 'featured_image'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Generate responsive derivatives for uploaded images in parallel; '
+            'images already processed are skipped, so an interrupted run can be resumed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+        parser.add_argument('--force', action='store_true', help='Process images that already have derivatives')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in IMAGE_FIELDS:
+            names.update(model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                         .values_list(field, flat=True))
+        if not options['force']:
+            names -= set(ProcessedImage.objects.values_list('source', flat=True))
+
+        processed = failed = 0
+        executor = images.make_executor(options['workers'])
+        futures = {executor.submit(images.render_derivatives, name): name for name in sorted(names)}
+        for future in as_completed(futures):
+            try:
+                # Each image is recorded as soon as it is done, which is what a rerun resumes from
+                images.record(future.result())
+                processed += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'{futures[future]}: {e}')
+            if (processed + failed) % 100 == 0:
+                self.stdout.write(f'{processed + failed}/{len(futures)} images')
+        executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} images'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} images could not be processed; rerun to retry them'))
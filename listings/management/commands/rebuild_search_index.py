@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from listings import fulltext, pragmas, search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text and location search indexes from the property table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Properties indexed per batch')
+        parser.add_argument('--skip-fulltext', action='store_true', help='Leave the full-text index alone')
+        parser.add_argument('--skip-location', action='store_true', help='Leave the location index alone')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        
+        # Each index is rebuilt in one transaction, so searches never see it half empty
+        if not options['skip_fulltext']:
+            backend = fulltext.get_backend()
+            started = time.monotonic()
+            with transaction.atomic():
+                total = backend.rebuild(batch_size)
+            self.stdout.write(
+                f'Indexed {total} properties with {type(backend).__name__} in {time.monotonic() - started:.1f}s'
+            )
+        
+        if not options['skip_location']:
+            started = time.monotonic()
+            with transaction.atomic():
+                total = search_index.rebuild_index(batch_size)
+            self.stdout.write(f'Indexed {total} location tokens in {time.monotonic() - started:.1f}s')
+            pragmas.analyze(connection)
+        
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt'))
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from listings import replicas
+
+
+class Command(BaseCommand):
+    help = 'Replace the SQLite snapshot read replicas with fresh copies of the primary and report replica lag'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help='Keep refreshing, this many seconds apart')
+        parser.add_argument('--status', action='store_true', help='Only report how far each replica is behind')
+
+    def handle(self, *args, **options):
+        if not settings.LISTING_READ_REPLICAS:
+            raise CommandError('No read replicas configured in LISTING_READ_REPLICAS')
+        snapshots = [alias for alias in settings.LISTING_READ_REPLICAS
+                     if connections[alias].settings_dict.get('SNAPSHOT_OF')]
+        if not options['status']:
+            if not snapshots:
+                raise CommandError('None of the replicas is a SQLite snapshot (SNAPSHOT_OF); they replicate themselves')
+            while True:
+                for alias in snapshots:
+                    started = time.monotonic()
+                    replicas.refresh(alias)
+                    self.stdout.write(f'Refreshed {alias} in {time.monotonic() - started:.1f}s')
+                if not options['every']:
+                    break
+                time.sleep(options['every'])
+
+        for alias, lag in replicas.lags().items():
+            state = 'unknown' if lag is None else f'{lag:.1f}s behind'
+            if lag is None or lag > settings.LISTING_REPLICA_MAX_LAG:
+                state += ' (not used)'
+            self.stdout.write(f'{alias}: {state}')
@@ -0,0 +1,63 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from listings import slow_queries
+
+SQL_WIDTH = 300
+
+
+class Command(BaseCommand):
+    help = 'Report the worst statements of the slow-query log, grouped by their normalized form'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Slow-query log (default: LISTING_SLOW_QUERY_LOG); rotated copies are read too')
+        parser.add_argument('--top', type=int, default=10, help='Statements to report')
+        parser.add_argument('--sort', choices=['total', 'max', 'count'], default='total',
+                            help='Rank by total time, slowest single run or number of runs')
+        parser.add_argument('--view', help='Only statements run by this URL name')
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.LISTING_SLOW_QUERY_LOG
+        if not path:
+            raise CommandError('No slow-query log configured; set LISTING_SLOW_QUERY_LOG or pass --log')
+        paths = slow_queries.log_files(path)
+        if not paths:
+            raise CommandError(f'{path} does not exist')
+
+        groups = {}
+        for record in slow_queries.read_records(paths):
+            if options['view'] and record.get('view') != options['view']:
+                continue
+            group = groups.setdefault(record['fingerprint'], {
+                'count': 0, 'total': 0.0, 'max': 0.0, 'views': Counter(), 'normalized': record['normalized'],
+            })
+            group['count'] += 1
+            group['total'] += record['duration_ms']
+            group['views'][record.get('view') or '<no request>'] += 1
+            if record['duration_ms'] >= group['max']:
+                group['max'] = record['duration_ms']
+                group['slowest'] = record
+            # The log is read oldest first, so this ends up as the latest plan
+            if record.get('plan'):
+                group['plan'] = record['plan']
+
+        if not groups:
+            self.stdout.write('No slow statements logged')
+            return
+        ranked = sorted(groups.items(), key=lambda item: item[1][options['sort']], reverse=True)
+        for rank, (key, group) in enumerate(ranked[:options['top']], 1):
+            slowest = group['slowest']
+            views = ', '.join(f'{view} ({count})' for view, count in group['views'].most_common(3))
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{rank} {key}: {group['count']} runs, {group['total']:.1f}ms total, "
+                f"{group['total'] / group['count']:.1f}ms mean, {group['max']:.1f}ms max"))
+            self.stdout.write(f'  views: {views}')
+            self.stdout.write(f"  statement: {group['normalized'][:SQL_WIDTH]}")
+            self.stdout.write(f"  slowest params: {slowest.get('params')}")
+            if slowest.get('stack'):
+                self.stdout.write(f"  called from: {slowest['stack'][-1]}")
+            for line in group.get('plan', []):
+                self.stdout.write(f'  plan: {line}')
+        self.stdout.write(f'{len(groups)} distinct statements in {len(paths)} file(s)')
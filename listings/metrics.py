@@ -0,0 +1,376 @@
+"""
+Per-request performance metrics in Prometheus text format.
+
+``MetricsMiddleware`` times each request and labels it with the resolved
+URL name. It counts and times SQL statements through
+``connection.execute_wrapper``, times template rendering and measures
+the response size. The numbers go into histograms held by the process.
+The counters and gauges of its PostgreSQL connection pools, if any, are
+read when the totals are written.
+
+Gunicorn runs several worker processes, and each of them only sees its
+own requests. With ``LISTING_METRICS_DIR`` set, every process writes its
+totals to ``<dir>/worker-<pid>.json`` at most every
+``FLUSH_INTERVAL`` seconds. The ``metrics`` view adds up all the files
+present, so any worker can answer a scrape for the whole server. When
+gunicorn replaces a worker, ``retire(pid)`` folds that worker's file
+into ``retired.json``, which keeps the counters from going backwards.
+"""
+import atexit
+import bisect
+import contextvars
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+from . import fragments, page_cache
+
+PREFIX = 'realtypro_'
+FLUSH_INTERVAL = 5
+RETIRED = 'retired.json'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Time spent handling the request', DURATION_BUCKETS),
+    'db_queries_per_request': ('SQL statements run by the request', COUNT_BUCKETS),
+    'db_query_duration_seconds': ('Time the request spent in SQL statements', DURATION_BUCKETS),
+    'template_render_seconds': ('Time the request spent rendering templates', DURATION_BUCKETS),
+    'http_response_size_bytes': ('Size of the response body', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests by view, method and status',
+    'page_cache_requests_total': 'Full-page cache lookups by outcome',
+    'fragment_cache_requests_total': 'Listing card cache lookups by outcome',
+    'db_pool_requests_total': 'Connections requested from the worker pools',
+    'db_pool_queued_requests_total': 'Connection requests that had to wait for a free connection',
+    'db_pool_wait_seconds_total': 'Time requests spent waiting for a pooled connection',
+    'db_pool_timeouts_total': 'Connection requests that timed out waiting',
+}
+GAUGES = {
+    'db_pool_connections': 'Connections open in the worker pools',
+    'db_pool_idle_connections': 'Pooled connections waiting to be used',
+    'db_pool_max_connections': 'Connections the worker pools may open',
+    'db_pool_waiting_requests': 'Requests waiting for a pooled connection right now',
+    'db_replica_lag_seconds': 'Seconds each read replica is behind the primary',
+}
+# psycopg_pool get_stats() keys; counters only appear once they are non-zero
+POOL_COUNTERS = {
+    'db_pool_requests_total': ('requests_num', 1),
+    'db_pool_queued_requests_total': ('requests_queued', 1),
+    'db_pool_wait_seconds_total': ('requests_wait_ms', 0.001),
+    'db_pool_timeouts_total': ('requests_errors', 1),
+}
+POOL_GAUGES = {
+    'db_pool_connections': 'pool_size',
+    'db_pool_idle_connections': 'pool_available',
+    'db_pool_max_connections': 'pool_max',
+    'db_pool_waiting_requests': 'requests_waiting',
+}
+
+_lock = threading.Lock()
+# {(name, labels): [bucket counts..., +Inf count], sum} and {(name, labels): value}
+_histograms = {}
+_counters = {}
+_last_flush = 0.0
+_current = contextvars.ContextVar('metrics_request', default=None)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def observe(name, labels, value):
+    buckets = HISTOGRAMS[name][1]
+    with _lock:
+        histogram = _histograms.setdefault((name, labels), [[0] * (len(buckets) + 1), 0])
+        histogram[0][bisect.bisect_left(buckets, value)] += 1
+        histogram[1] += value
+
+
+def increment(name, labels, amount=1):
+    with _lock:
+        _counters[(name, labels)] = _counters.get((name, labels), 0) + amount
+
+
+def _pools():
+    """{alias: pool} of the PostgreSQL connection pools this process has opened"""
+    pools = {}
+    for alias in connections:
+        # Django creates a pool on first use and keeps it on the backend class; asking for
+        # ``connection.pool`` would create one
+        pool = getattr(connections[alias], '_connection_pools', {}).get(alias)
+        if pool is not None:
+            pools[alias] = pool
+    return pools
+
+
+def _snapshot():
+    """This process's metrics as plain data, with the cache and pool counters read now"""
+    with _lock:
+        histograms = [[name, list(labels), list(counts), total]
+                      for (name, labels), (counts, total) in _histograms.items()]
+        counters = [[name, list(labels), value] for (name, labels), value in _counters.items()]
+    for name, stats in (('page_cache_requests_total', page_cache.stats()),
+                        ('fragment_cache_requests_total', fragments.stats())):
+        counters.extend([name, [['outcome', outcome]], count] for outcome, count in stats.items())
+    gauges = []
+    for alias, pool in _pools().items():
+        stats = pool.get_stats()
+        labels = [['database', alias]]
+        counters.extend([name, labels, stats.get(key, 0) * scale] for name, (key, scale) in POOL_COUNTERS.items())
+        gauges.extend([name, labels, stats.get(key, 0)] for name, key in POOL_GAUGES.items())
+    return {'histograms': histograms, 'counters': counters, 'gauges': gauges}
+
+
+def _merge(snapshots):
+    """Sum of the snapshots; gauges add up too, since each worker reports its own pool"""
+    histograms, counters, gauges = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot.get('gauges', []):
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+    return {
+        'histograms': [[name, labels, counts, total] for (name, labels), (counts, total) in histograms.items()],
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'gauges': [[name, labels, value] for (name, labels), value in gauges.items()],
+    }
+
+
+def _write(path, data):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def flush(force=False):
+    """Write this process's totals to the shared directory, at most every FLUSH_INTERVAL seconds"""
+    global _last_flush
+    directory = settings.LISTING_METRICS_DIR
+    now = time.monotonic()
+    if not directory or (not force and now - _last_flush < FLUSH_INTERVAL):
+        return
+    _last_flush = now
+    os.makedirs(directory, exist_ok=True)
+    _write(os.path.join(directory, f'worker-{os.getpid()}.json'), _snapshot())
+
+
+def retire(pid):
+    """Fold the file of an exited worker into the retired totals"""
+    directory = settings.LISTING_METRICS_DIR
+    path = os.path.join(directory or '', f'worker-{pid}.json')
+    if not directory or not os.path.exists(path):
+        return
+    with open(os.path.join(directory, 'retire.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired = os.path.join(directory, RETIRED)
+        totals = _merge(filter(None, [_read(retired), _read(path)]))
+        # The worker's pool closed with it
+        totals['gauges'] = []
+        _write(retired, totals)
+        os.remove(path)
+
+
+def clear_directory():
+    """Remove the files of a previous server run"""
+    directory = settings.LISTING_METRICS_DIR
+    if directory:
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)
+
+
+def collect():
+    """Metrics of every worker when they share a directory, else of this process"""
+    if not settings.LISTING_METRICS_DIR:
+        return _merge([_snapshot()])
+    flush(force=True)
+    paths = glob.glob(os.path.join(settings.LISTING_METRICS_DIR, '*.json'))
+    return _merge(filter(None, map(_read, paths)))
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(data):
+    """Prometheus text exposition format (0.0.4) of ``collect()`` output"""
+    lines = []
+    by_name = {}
+    for name, labels, counts, total in data['histograms']:
+        by_name.setdefault(name, []).append((labels, counts, total))
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        if name not in by_name:
+            continue
+        lines += [f'# HELP {PREFIX}{name} {help_text}', f'# TYPE {PREFIX}{name} histogram']
+        for labels, counts, total in sorted(by_name[name]):
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(f'{PREFIX}{name}_bucket{_label_text(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{_label_text(labels)} {total}')
+            lines.append(f'{PREFIX}{name}_count{_label_text(labels)} {cumulative}')
+
+    by_name = {}
+    for name, labels, value in data['counters']:
+        by_name.setdefault(name, []).append((labels, value))
+    for name, help_text in COUNTERS.items():
+        if name not in by_name:
+            continue
+        lines += [f'# HELP {PREFIX}{name} {help_text}', f'# TYPE {PREFIX}{name} counter']
+        lines += [f'{PREFIX}{name}{_label_text(labels)} {value}' for labels, value in sorted(by_name[name])]
+
+    by_name = {}
+    for name, labels, value in data.get('gauges', []):
+        by_name.setdefault(name, []).append((labels, value))
+    for name, help_text in GAUGES.items():
+        if name not in by_name:
+            continue
+        lines += [f'# HELP {PREFIX}{name} {help_text}', f'# TYPE {PREFIX}{name} gauge']
+        lines += [f'{PREFIX}{name}{_label_text(labels)} {value}' for labels, value in sorted(by_name[name])]
+    return '\n'.join(lines) + '\n'
+
+
+def current_view():
+    """URL name of the view the current request resolved to, if any"""
+    metrics = _current.get()
+    if metrics is None:
+        return None
+    match = getattr(metrics.request, 'resolver_match', None)
+    return match.view_name if match else '<unmatched>'
+
+
+class _RequestMetrics:
+    __slots__ = ('request', 'queries', 'query_time', 'render_time', 'render_depth')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = 0.0
+        self.render_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - started
+            self.queries += 1
+
+
+_render = Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    metrics = _current.get()
+    if metrics is None:
+        return _render(self, context, request)
+    # Templates rendered from inside another one (listing_cards) are already being timed
+    metrics.render_depth += 1
+    started = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        metrics.render_depth -= 1
+        if not metrics.render_depth:
+            metrics.render_time += time.perf_counter() - started
+
+
+def install():
+    """Time template rendering and flush the totals on exit; called once per process by the middleware"""
+    if Template.render is not _timed_render:
+        Template.render = _timed_render
+        atexit.register(flush, force=True)
+
+
+class MetricsMiddleware:
+    """Record duration, SQL, template time and response size per resolved URL name"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Under ASGI the chain stays async, so async views are not pushed into a thread by this middleware
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = _RequestMetrics(request)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with self.wrapped_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        metrics = _RequestMetrics(request)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with self.wrapped_connections(metrics):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def wrapped_connections(self, metrics):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        return stack
+
+    def record(self, request, response, metrics, duration):
+        match = request.resolver_match
+        labels = (('view', match.view_name if match else '<unmatched>'),)
+        observe('http_request_duration_seconds', labels, duration)
+        observe('db_queries_per_request', labels, metrics.queries)
+        observe('db_query_duration_seconds', labels, metrics.query_time)
+        observe('template_render_seconds', labels, metrics.render_time)
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        observe('http_response_size_bytes', labels, size)
+        increment('http_requests_total', labels + (('method', request.method), ('status', str(response.status_code))))
+        flush()
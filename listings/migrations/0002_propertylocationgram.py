@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_location_index(apps, schema_editor):
+    Property = apps.get_model('listings', 'Property')
+    PropertyLocationGram = apps.get_model('listings', 'PropertyLocationGram')
+    rows = []
+    for property_obj in Property.objects.only('city', 'state', 'zip_code').iterator(chunk_size=1000):
+        grams = set()
+        for value in (property_obj.city, property_obj.state, property_obj.zip_code):
+            value = (value or '').lower()
+            grams.update(value[i:i + 3] for i in range(len(value) - 2))
+        rows.extend(PropertyLocationGram(property_id=property_obj.pk, gram=gram) for gram in grams)
+        if len(rows) >= 5000:
+            PropertyLocationGram.objects.bulk_create(rows)
+            rows = []
+    PropertyLocationGram.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyLocationGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_grams', to='listings.property')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('gram', 'property'), name='listings_location_gram_unique')],
+            },
+        ),
+        migrations.RunPython(build_location_index, migrations.RunPython.noop),
+    ]
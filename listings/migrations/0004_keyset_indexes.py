@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_property_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='property',
+            name='listing_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='property',
+            name='listing_status_type_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='property',
+            name='listing_featured_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='property',
+            name='listing_new_idx',
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['status', '-created_at', '-id', 'price'], name='listing_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['status', 'property_type', '-created_at', '-id', 'price'], name='listing_status_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('is_featured', True)), fields=['status', '-created_at', '-id'], name='listing_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(condition=models.Q(('is_new_listing', True)), fields=['status', '-created_at', '-id'], name='listing_new_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+TABLE = 'listings_property_fts'
+
+
+def create_fulltext_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE "{TABLE}" USING fts5('
+        f"title, description, features, amenities, tokenize = 'porter unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO "{TABLE}" (rowid, title, description, features, amenities) '
+        f"SELECT id, title, description, COALESCE(features, ''), COALESCE(amenities, '') FROM listings_property"
+    )
+
+
+def drop_fulltext_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{TABLE}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_table, drop_fulltext_table),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_property_external_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NeighborUpdate',
+            fields=[
+                ('property_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_location_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # Prefix searches are ranges of the token index, which only holds
+        # under byte order, not the database's language collation
+        schema_editor.execute(
+            'ALTER TABLE listings_propertylocationtoken ALTER COLUMN token TYPE varchar(100) COLLATE "C"'
+        )
+    Property = apps.get_model('listings', 'Property')
+    PropertyLocationToken = apps.get_model('listings', 'PropertyLocationToken')
+    rows = []
+    for property_obj in Property.objects.only('city', 'state', 'zip_code').iterator(chunk_size=1000):
+        tokens = set()
+        for value in (property_obj.city, property_obj.state, property_obj.zip_code):
+            value = (value or '').lower()
+            tokens.update(value[i:] for i in range(len(value)))
+        rows.extend(PropertyLocationToken(property_id=property_obj.pk, token=token) for token in tokens)
+        if len(rows) >= 5000:
+            PropertyLocationToken.objects.bulk_create(rows)
+            rows = []
+    PropertyLocationToken.objects.bulk_create(rows)
+    if schema_editor.connection.vendor == 'sqlite':
+        # Planner statistics, so short id lists are looked up rather than scanned for
+        schema_editor.execute('ANALYZE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_neighbor_updates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyLocationToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('property', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='location_tokens', to='listings.property')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='propertylocationtoken',
+            index=models.Index(fields=['property', 'token'], name='listings_location_token_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='propertylocationtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'property'), name='listings_location_token_unique'),
+        ),
+        migrations.RunPython(build_location_index, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='PropertyLocationGram',
+        ),
+    ]
@@ -1,7 +1,25 @@
+from django.core.files.storage import default_storage
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+# Placeholder images for variety - more luxurious and welcoming
+PLACEHOLDER_IMAGES = [
+    'https://images.unsplash.com/photo-1600596542815-ffad4c1539a9?w=400&h=300&fit=crop',  # Luxury modern home
+    'https://images.unsplash.com/photo-1564013799919-ab600027ffc6?w=400&h=300&fit=crop',  # Cozy family home
+    'https://images.unsplash.com/photo-1570129477492-45c003edd2be?w=400&h=300&fit=crop',  # Elegant interior
+    'https://images.unsplash.com/photo-1600607687939-ce8a6c25118c?w=400&h=300&fit=crop',  # Beautiful exterior
+    'https://images.unsplash.com/photo-1600566753190-17f0baa2a6c3?w=400&h=300&fit=crop',  # Modern architecture
+    'https://images.unsplash.com/photo-1560518883-ce09059eeffa?w=400&h=300&fit=crop',  # Contemporary home
+]
+
+def listing_image_url(image, property_id):
+    """URL of a listing's main image (a field file or stored name), or its placeholder"""
+    if image:
+        return image.url if hasattr(image, 'url') else default_storage.url(image)
+    # Use property ID to consistently assign the same image to each property
+    return PLACEHOLDER_IMAGES[property_id % len(PLACEHOLDER_IMAGES)] if property_id else PLACEHOLDER_IMAGES[0]
+
 class Property(models.Model):
     PROPERTY_TYPES = [
         ('house', 'House'),
@@ -25,6 +43,10 @@ class Property(models.Model):
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
     zip_code = models.CharField(max_length=20)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Grid cell of the coordinates (see listings.geo), kept in sync on save
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False)
     price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
     property_type = models.CharField(max_length=20, choices=PROPERTY_TYPES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='for_sale')
@@ -43,6 +65,11 @@ class Property(models.Model):
     # Images and media
     main_image = models.ImageField(upload_to='properties/main/', null=True, blank=True)
     
+    # Bulk imports (see listings.importer): the feed's listing id and a hash
+    # of the imported values, used to skip rows that have not changed
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    content_hash = models.CharField(max_length=32, blank=True, editable=False)
+    
     # Meta information
     is_featured = models.BooleanField(default=False)
     is_new_listing = models.BooleanField(default=True)
@@ -52,6 +79,30 @@ class Property(models.Model):
     class Meta:
         verbose_name_plural = 'Properties'
         ordering = ['-created_at']
+        # Every listing view filters on status and orders by -created_at; these
+        # match the extra filters the individual views add on top of that.
+        # Price is a trailing column rather than its own (status, price) index:
+        # price ranges are then checked inside the index while rows still come
+        # out in created_at order, so paging never needs a sort and COUNTs
+        # stay covering. The id column matches the (created_at, id) keyset
+        # used by cursor pagination.
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id', 'price'], name='listing_status_created_idx'),
+            models.Index(fields=['status', 'property_type', '-created_at', '-id', 'price'], name='listing_status_type_idx'),
+            models.Index(
+                fields=['status', '-created_at', '-id'],
+                name='listing_featured_idx',
+                condition=models.Q(is_featured=True),
+            ),
+            models.Index(
+                fields=['status', '-created_at', '-id'],
+                name='listing_new_idx',
+                condition=models.Q(is_new_listing=True),
+            ),
+            # Covering index for map searches: cell ranges narrow the rows and
+            # the coordinates are read from the index for the exact distance check
+            models.Index(fields=['status', 'geo_cell', 'latitude', 'longitude'], name='listing_geo_cell_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.address}"
@@ -63,19 +114,7 @@ class Property(models.Model):
     @property
     def main_image_url(self):
         """Return main image URL or placeholder"""
-        if self.main_image:
-            return self.main_image.url
-        # Return different placeholder images for variety - more luxurious and welcoming
-        placeholders = [
-            'https://images.unsplash.com/photo-1600596542815-ffad4c1539a9?w=400&h=300&fit=crop',  # Luxury modern home
-            'https://images.unsplash.com/photo-1564013799919-ab600027ffc6?w=400&h=300&fit=crop',  # Cozy family home
-            'https://images.unsplash.com/photo-1570129477492-45c003edd2be?w=400&h=300&fit=crop',  # Elegant interior
-            'https://images.unsplash.com/photo-1600607687939-ce8a6c25118c?w=400&h=300&fit=crop',  # Beautiful exterior
-            'https://images.unsplash.com/photo-1600566753190-17f0baa2a6c3?w=400&h=300&fit=crop',  # Modern architecture
-            'https://images.unsplash.com/photo-1560518883-ce09059eeffa?w=400&h=300&fit=crop',  # Contemporary home
-        ]
-        # Use property ID to consistently assign the same image to each property
-        return placeholders[self.id % len(placeholders)] if self.id else placeholders[0]
+        return listing_image_url(self.main_image, self.id)
 
 class PropertyImage(models.Model):
     property = models.ForeignKey(Property, related_name='images', on_delete=models.CASCADE)
@@ -100,3 +139,61 @@ class PropertyVideo(models.Model):
     
     def __str__(self):
         return f"{self.property.title} - {self.title}"
+
+class PropertyLocationToken(models.Model):
+    """Suffix of a property's lowercased city, state or ZIP code; location searches match them by prefix"""
+    property = models.ForeignKey(Property, related_name='location_tokens', on_delete=models.CASCADE, db_index=False)
+    token = models.CharField(max_length=100)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'property'], name='listings_location_token_unique'),
+        ]
+        indexes = [
+            # Checks one property's tokens, and replaces them when it is saved
+            models.Index(fields=['property', 'token'], name='listings_location_token_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.property_id} - {self.token}"
+
+
+class PropertyNeighbor(models.Model):
+    """A precomputed similar listing for a property, ranked from 0 (most similar)"""
+    property = models.ForeignKey(Property, related_name='neighbors', on_delete=models.CASCADE)
+    neighbor = models.ForeignKey(Property, related_name='+', on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'rank'], name='listings_neighbor_rank_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.property_id} -> {self.neighbor_id} ({self.rank})"
+
+
+class NeighborUpdate(models.Model):
+    """A listing saved or deleted since its similar listings were last recomputed"""
+    # Not a foreign key: deleted listings stay queued so their neighbors get updated
+    property_id = models.BigIntegerField(primary_key=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.property_id} (queued {self.queued_at})"
+
+
+class ProcessedImage(models.Model):
+    """Resized WebP/JPEG copies and a blurred placeholder of an uploaded image, by its storage name"""
+    source = models.CharField(max_length=255, unique=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    # [width, extension, storage name] of each derivative
+    variants = models.JSONField(default=list)
+    placeholder = models.TextField(blank=True)
+    processed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.source
@@ -0,0 +1,325 @@
+"""
+Precomputed "similar listings" for the property detail page.
+
+Every for-sale listing is scored against a block of likely matches: the
+listings of its city and type within one price band of its own, widened
+to its whole city and type, its city, and so on when that holds fewer
+than ``NEIGHBOR_COUNT`` others (see ``LEVELS``). The score adds up how
+close they are in city, type, price, bedrooms and size. The best
+``NEIGHBOR_COUNT`` are stored as ``PropertyNeighbor`` rows, so the detail
+page reads them with one indexed lookup.
+
+``compute_all`` rebuilds the table (``manage.py compute_property_neighbors``).
+``update_neighbors`` only recomputes the properties whose neighbors can
+have changed. Saves and deletes do not call it themselves: it loads every
+listing, which is too slow for a request, so they ``queue`` the
+listing in the same transaction. ``process_pending`` then updates all the
+queued listings at once (``manage.py compute_property_neighbors --pending``).
+"""
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import NeighborUpdate, Property, PropertyNeighbor
+
+NEIGHBOR_COUNT = 6
+WEIGHTS = {'city': 3.0, 'type': 2.0, 'price': 2.0, 'bedrooms': 1.0, 'size': 1.0}
+FIELDS = ['id', 'city', 'state', 'property_type', 'price', 'bedrooms', 'square_feet']
+
+# Score matrix cells computed at a time; bounds memory to a few tens of MB
+CHUNK_CELLS = 2000000
+# Ratio between the prices at the edges of a band
+PRICE_BAND = 1.25
+# Candidate blocks, narrowest first; a listing uses the first holding NEIGHBOR_COUNT others
+LEVELS = ('city, type and price band', 'city and type', 'city', 'type and price band', 'type', 'all')
+ID_BATCH = 500
+# Queued listings updated together by one process_pending round
+PENDING_BATCH = 5000
+# Added per neighbor id so exact ties break towards newer listings, whatever the partition order
+TIE_BREAK = 1e-12
+
+
+def _ratio(a, b):
+    """Similarity of two non-negative quantities, 1.0 when equal"""
+    return np.minimum(a, b) / np.maximum(np.maximum(a, b), 1)
+
+
+class NeighborIndex:
+    """Columns of the for-sale listings, sorted by id, used to score candidates.
+
+    A listing is only scored against its block: the listings of its city
+    and type within one price band of it. When that block holds fewer than
+    ``NEIGHBOR_COUNT`` others, the next of ``LEVELS`` widens it. Each level
+    is a range of one sort order, found with ``searchsorted``.
+    """
+
+    def __init__(self, ids, city, property_type, price, bedrooms, size):
+        self.ids = ids
+        self.city = city
+        self.property_type = property_type
+        self.price = price
+        self.bedrooms = bedrooms
+        self.size = size
+        self._build_blocks()
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        rows = list(
+            Property.objects.filter(status='for_sale').order_by('pk')
+            .values_list(*FIELDS).iterator(chunk_size=chunk_size)
+        )
+        columns = list(zip(*rows)) or [()] * len(FIELDS)
+        ids, city, state, property_type, price, bedrooms, size = columns
+        locations = [f'{c.lower()}|{s.lower()}' for c, s in zip(city, state)]
+        return cls(
+            ids=np.array(ids, dtype=np.int64),
+            city=np.unique(np.array(locations, dtype=object), return_inverse=True)[1].astype(np.int64),
+            property_type=np.unique(np.array(property_type, dtype=object), return_inverse=True)[1].astype(np.int64),
+            price=np.array(price, dtype=np.float64),
+            bedrooms=np.array(bedrooms, dtype=np.float64),
+            size=np.array(size, dtype=np.float64),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _build_blocks(self):
+        n = len(self)
+        band = np.floor(np.log(np.maximum(self.price, 1)) / np.log(PRICE_BAND)).astype(np.int64)
+        bands = int(band.max()) + 1 if n else 1
+        types = int(self.property_type.max()) + 1 if n else 1
+        by_city = (self.city * types + self.property_type) * bands + band
+        by_type = self.property_type * bands + band
+        lower, upper = np.maximum(band - 1, 0), np.minimum(band + 1, bands - 1)
+        city_type = (self.city * types + self.property_type) * bands
+        type_only = self.property_type * bands
+        bounds = {
+            'city, type and price band': (by_city, city_type + lower, city_type + upper),
+            'city and type': (by_city, city_type, city_type + bands - 1),
+            'city': (by_city, self.city * types * bands, (self.city + 1) * types * bands - 1),
+            'type and price band': (by_type, type_only + lower, type_only + upper),
+            'type': (by_type, type_only, type_only + bands - 1),
+            'all': (np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)),
+        }
+        self.orders, self.lo, self.hi = [], np.empty((len(LEVELS), n), np.int64), np.empty((len(LEVELS), n), np.int64)
+        for level, name in enumerate(LEVELS):
+            keys, first, last = bounds[name]
+            order = np.argsort(keys, kind='stable')
+            self.orders.append(order)
+            self.lo[level] = np.searchsorted(keys[order], first, 'left')
+            self.hi[level] = np.searchsorted(keys[order], last, 'right')
+        # The first level whose block holds the listing and NEIGHBOR_COUNT others
+        enough = (self.hi - self.lo) > NEIGHBOR_COUNT
+        enough[-1] = True
+        self.level = np.argmax(enough, axis=0)
+
+    def locate(self, ids):
+        """(positions, found) for ``ids``; positions are only meaningful where found"""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == ids[found]
+        return positions, found
+
+    def rows(self, ids):
+        """Positions of the given ids that are in the index"""
+        positions, found = self.locate(list(ids))
+        return positions[found]
+
+    def block(self, row, level=None):
+        """Positions of the listings scored for ``row``, at its own level by default"""
+        level = self.level[row] if level is None else level
+        return self.orders[level][self.lo[level, row]:self.hi[level, row]]
+
+    def referrers(self, row):
+        """Positions of the listings whose block contains ``row``.
+
+        Every level's block is symmetric (same keys, or price bands at most
+        one apart), so those are the listings of ``row``'s block at each
+        level that use that level.
+        """
+        blocks = [self.block(row, level) for level in range(len(LEVELS))]
+        return np.concatenate([
+            columns[self.level[columns] == level] for level, columns in enumerate(blocks)
+        ])
+
+    def narrowed(self, rows):
+        """Positions whose block may have narrowed because ``rows`` moved into it.
+
+        Changed listings joining a listing's block at a lower level can lift
+        it to ``NEIGHBOR_COUNT`` others, so the listing now uses that level.
+        (A block that shrinks below it lost one of the listing's stored
+        neighbors, so that listing is updated as one of their referrers.)
+        """
+        found = [np.empty(0, dtype=np.int64)]
+        for level, order in enumerate(self.orders[:-1]):
+            rank = np.empty(len(self), dtype=np.int64)
+            rank[order] = np.arange(len(self))
+            changed = np.sort(rank[rows])
+            columns = np.flatnonzero(self.level == level)
+            inside = (np.searchsorted(changed, self.hi[level, columns])
+                      - np.searchsorted(changed, self.lo[level, columns]))
+            size = self.hi[level, columns] - self.lo[level, columns]
+            found.append(columns[(inside > 0) & (size - inside <= NEIGHBOR_COUNT)])
+        return np.concatenate(found)
+
+    def scores(self, rows, columns):
+        """Similarity of each listing in ``rows`` to each in ``columns``; -inf for unrelated ones and itself"""
+        same_city = self.city[rows, None] == self.city[columns]
+        same_type = self.property_type[rows, None] == self.property_type[columns]
+        score = WEIGHTS['city'] * same_city + WEIGHTS['type'] * same_type
+        score += WEIGHTS['price'] * _ratio(self.price[rows, None], self.price[columns])
+        score += WEIGHTS['size'] * _ratio(self.size[rows, None], self.size[columns])
+        score += WEIGHTS['bedrooms'] / (1 + np.abs(self.bedrooms[rows, None] - self.bedrooms[columns]))
+        score += self.ids[columns] * TIE_BREAK
+        score[~(same_city | same_type)] = -np.inf
+        score[rows[:, None] == columns] = -np.inf
+        return score
+
+    def _best(self, rows, columns):
+        k = min(NEIGHBOR_COUNT, len(columns) - 1)
+        if k <= 0:
+            return [(int(self.ids[row]), []) for row in rows]
+        score = self.scores(rows, columns)
+        best = np.argpartition(-score, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(score, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = columns[np.take_along_axis(best, order, axis=1)]
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return [
+            (int(self.ids[row]), [
+                (int(self.ids[column]), float(value))
+                for column, value in zip(best_columns, values) if value != -np.inf
+            ])
+            for row, best_columns, values in zip(rows, best, best_scores)
+        ]
+
+    def top(self, rows):
+        """Yield (property id, [(neighbor id, score), ...]) for each row, best first"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        level = self.level[rows]
+        lo, hi = self.lo[level, rows], self.hi[level, rows]
+        # Rows with the same block are scored together, CHUNK_CELLS at a time
+        order = np.lexsort((hi, lo, level))
+        rows, level, lo, hi = rows[order], level[order], lo[order], hi[order]
+        starts = np.flatnonzero(np.r_[True, (level[1:] != level[:-1]) | (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])])
+        for start, end in zip(starts, np.r_[starts[1:], len(rows)]):
+            columns = self.orders[level[start]][lo[start]:hi[start]]
+            size = max(1, CHUNK_CELLS // len(columns))
+            for chunk in range(start, end, size):
+                yield from self._best(rows[chunk:min(chunk + size, end)], columns)
+
+    def thresholds(self, columns):
+        """Score a listing needs to enter the stored neighbors of each of ``columns`` (-inf where there is room)"""
+        thresholds = np.full(len(columns), -np.inf)
+        ids = self.ids[columns].tolist()
+        for start in range(0, len(ids), ID_BATCH):
+            stored = list(PropertyNeighbor.objects.filter(
+                rank=NEIGHBOR_COUNT - 1, property_id__in=ids[start:start + ID_BATCH],
+            ).values_list('property_id', 'score'))
+            if stored:
+                stored_ids, scores = zip(*stored)
+                # columns is sorted, like the index
+                thresholds[np.searchsorted(ids, stored_ids)] = scores
+        return thresholds
+
+
+def _store(results, batch_size=1000):
+    """Insert the neighbor rows of ``(property id, neighbors)`` results; returns how many"""
+    # Six rows per listing; plain tuples spare building a model instance for each
+    sql = (f'INSERT INTO "{PropertyNeighbor._meta.db_table}" (property_id, neighbor_id, rank, score) '
+           'VALUES (%s, %s, %s, %s)')
+    total = 0
+    batch = []
+    with connection.cursor() as cursor:
+        for property_id, neighbors in results:
+            batch.extend((property_id, neighbor_id, rank, score) for rank, (neighbor_id, score) in enumerate(neighbors))
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                total += len(batch)
+                batch = []
+        cursor.executemany(sql, batch)
+    return total + len(batch)
+
+
+def compute_all(batch_size=1000):
+    """Recompute the neighbors of every listing; returns the number of rows stored"""
+    # Changes committed from here on are queued again and reach the next round
+    NeighborUpdate.objects.all().delete()
+    index = NeighborIndex.load()
+    with transaction.atomic():
+        PropertyNeighbor.objects.all().delete()
+        return _store(index.top(np.arange(len(index))), batch_size)
+
+
+def update_neighbors(changed_ids, referencing_ids=()):
+    """Recompute the neighbors affected by changes to ``changed_ids``.
+
+    That is the changed listings themselves, the properties that list one
+    of them as a neighbor (``referencing_ids`` carries those of deleted
+    listings, whose rows are gone by now), the properties whose block a
+    changed listing narrowed, and those a changed listing now scores high
+    enough to join. Only the blocks of the changed listings are scored.
+    """
+    index = NeighborIndex.load()
+    changed_ids = list(changed_ids)
+    affected = set(changed_ids) | set(referencing_ids)
+    affected.update(PropertyNeighbor.objects.filter(neighbor_id__in=changed_ids).values_list('property_id', flat=True))
+
+    rows = index.rows(changed_ids)
+    if len(rows):
+        affected.update(index.ids[index.narrowed(rows)].tolist())
+        referrers = [index.referrers(row) for row in rows]
+        columns = np.unique(np.concatenate(referrers))
+        thresholds = index.thresholds(columns)
+        for row, others in zip(rows, referrers):
+            # Scores are symmetric apart from the tie break, so a changed listing's
+            # row, with the tie break swapped, is how it scores for its referrers
+            scores = index.scores(row[None], others)[0] - index.ids[others] * TIE_BREAK + index.ids[row] * TIE_BREAK
+            joins = scores > thresholds[np.searchsorted(columns, others)]
+            affected.update(index.ids[others[joins]].tolist())
+
+    affected = sorted(affected)
+    with transaction.atomic():
+        for start in range(0, len(affected), ID_BATCH):
+            PropertyNeighbor.objects.filter(property_id__in=affected[start:start + ID_BATCH]).delete()
+        _store(index.top(index.rows(affected)))
+    return len(affected)
+
+
+def queue(ids):
+    """Have the next ``process_pending`` round update the neighbors affected by changes to ``ids``"""
+    NeighborUpdate.objects.bulk_create([NeighborUpdate(property_id=pk) for pk in ids], ignore_conflicts=True)
+
+
+def process_pending(limit=PENDING_BATCH):
+    """Update the neighbors of up to ``limit`` queued listings; returns how many were dequeued"""
+    with transaction.atomic():
+        ids = list(NeighborUpdate.objects.order_by('queued_at').values_list('property_id', flat=True)[:limit])
+        NeighborUpdate.objects.filter(property_id__in=ids).delete()
+    if not ids:
+        return 0
+    try:
+        update_neighbors(ids)
+    except Exception:
+        queue(ids)
+        raise
+    return len(ids)
+
+
+def related_properties(property_obj, limit=3):
+    """Most similar for-sale listings, from the neighbors table when it has been computed"""
+    related = [
+        row.neighbor for row in
+        PropertyNeighbor.objects.filter(property=property_obj, neighbor__status='for_sale')
+        .select_related('neighbor')[:limit]
+    ]
+    if related:
+        return related
+    # Listings the batch job has not seen yet fall back to the old rule
+    return list(Property.objects.filter(
+        Q(city=property_obj.city) | Q(property_type=property_obj.property_type),
+        status='for_sale'
+    ).exclude(id=property_obj.id)[:limit])
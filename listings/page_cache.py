@@ -0,0 +1,145 @@
+"""
+Full-page cache for anonymous listing pages, purged by surrogate key.
+
+Views wrapped in ``cache_page`` name what they depend on with
+``add_keys(request, 'property:42', 'listings:featured', ...)``. A stored
+page records the version of each of its keys; ``purge(*keys)`` gives those
+keys new versions, so only the pages tagged with them miss on their next
+request. The keys are also sent as a ``Surrogate-Key`` header for a CDN in
+front of the site.
+
+Pages are cached per process, but the key versions live in the shared
+``listing-versions`` cache, so a purge in one worker reaches the pages
+every worker has stored.
+
+Only anonymous GET/HEAD requests without pending flash messages use the
+cache, and responses that set cookies or use a CSRF token are never stored.
+"""
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+
+from .replicas import primary
+from .versioning import version_cache
+
+PAGE_PREFIX = 'page-cache:page:'
+KEY_PREFIX = 'page-cache:key:'
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'bypasses': 0}
+
+
+def stats():
+    """Hits, misses and bypassed requests of this process since start or the last ``reset_stats()``"""
+    with _lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _lock:
+        _stats.update(hits=0, misses=0, bypasses=0)
+
+
+def hit_ratio():
+    counts = stats()
+    looked_up = counts['hits'] + counts['misses']
+    return counts['hits'] / looked_up if looked_up else 0.0
+
+
+def _count(outcome):
+    with _lock:
+        _stats[outcome] += 1
+
+
+def add_keys(request, *keys):
+    """Tag the page being rendered for ``request`` with surrogate keys"""
+    request.surrogate_keys = getattr(request, 'surrogate_keys', set()) | set(keys)
+
+
+def property_keys(property_obj):
+    """Surrogate keys of the pages that show ``property_obj``"""
+    keys = {f'property:{property_obj.pk}', f'listings:type:{property_obj.property_type}'}
+    if property_obj.is_featured:
+        keys.add('listings:featured')
+    if property_obj.is_new_listing:
+        keys.add('listings:new')
+    return keys
+
+
+def purge(*keys):
+    """Invalidate every cached page tagged with any of ``keys``"""
+    if keys:
+        version = time.time_ns()
+        version_cache().set_many({KEY_PREFIX + key: version for key in keys}, None)
+
+
+def _versions(keys, create=False):
+    versions = version_cache()
+    cache_keys = {KEY_PREFIX + key: key for key in keys}
+    found = versions.get_many(cache_keys)
+    if create:
+        for cache_key in cache_keys.keys() - found.keys():
+            versions.add(cache_key, time.time_ns(), None)
+            found[cache_key] = versions.get(cache_key)
+    return {cache_keys[cache_key]: version for cache_key, version in found.items()}
+
+
+def _page_key(request):
+    return PAGE_PREFIX + hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def _cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD') and
+        not request.user.is_authenticated and
+        not len(messages.get_messages(request))
+    )
+
+
+def _cacheable_response(request, response):
+    return (
+        request.method == 'GET' and
+        response.status_code == 200 and
+        not response.streaming and
+        not response.cookies and
+        not request.META.get('CSRF_COOKIE_NEEDS_UPDATE') and
+        getattr(request, 'surrogate_keys', None)
+    )
+
+
+def cache_page(view):
+    """Serve anonymous requests for ``view`` from the page cache while its surrogate keys are unchanged"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable_request(request):
+            _count('bypasses')
+            return view(request, *args, **kwargs)
+
+        page_key = _page_key(request)
+        entry = cache.get(page_key)
+        if entry is not None:
+            versions, response = entry
+            if _versions(versions) == versions:
+                _count('hits')
+                response['X-Page-Cache'] = 'HIT'
+                return response
+
+        # The page may be cached, so it must not show what a lagging replica has
+        with primary():
+            response = view(request, *args, **kwargs)
+        if not _cacheable_response(request, response):
+            _count('bypasses')
+            return response
+
+        response['Surrogate-Key'] = ' '.join(sorted(request.surrogate_keys))
+        cache.set(page_key, (_versions(request.surrogate_keys, create=True), response),
+                  settings.LISTING_PAGE_CACHE_TIMEOUT)
+        _count('misses')
+        response['X-Page-Cache'] = 'MISS'
+        return response
+    return wrapper
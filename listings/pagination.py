@@ -0,0 +1,254 @@
+"""
+Pagination for the listing and blog list views.
+
+``paginate`` serves two modes from the same URL:
+
+* Numbered pages (``?page=N``) use ``EstimatedCountPaginator``, which caches
+  the row count instead of running ``COUNT(*)`` on every request, and expose
+  an elided page window so templates render a handful of links instead of
+  one per page.
+* Cursor pages (``?cursor=...``) seek on the ordering key, e.g.
+  ``(created_at, id)``, instead of using ``OFFSET``, so any page costs the
+  same as the first one. The Previous/Next links of both modes use cursors.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+PAGE_WINDOW = {'on_each_side': 2, 'on_ends': 1}
+
+
+def _split(field):
+    return (field[1:], True) if field.startswith('-') else (field, False)
+
+
+def encode_cursor(values, direction):
+    payload = [direction] + [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (direction, (key, pk)) for a cursor, or None if it is malformed.
+
+    Cursors come from the query string, so anything but an aware datetime
+    key and an integer pk is rejected rather than passed to the database.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction, key, pk = payload
+        key = parse_datetime(key) if isinstance(key, str) else None
+    except (ValueError, TypeError):
+        return None
+    if direction not in ('after', 'before') or key is None or timezone.is_naive(key):
+        return None
+    if not isinstance(pk, int) or isinstance(pk, bool):
+        return None
+    return direction, (key, pk)
+
+
+class CursorMixin:
+    """Previous/next cursors for a page, built from its first and last rows"""
+    ordering = DEFAULT_ORDERING
+
+    def _key(self, obj):
+        return tuple(getattr(obj, _split(field)[0]) for field in self.ordering)
+
+    @property
+    def next_cursor(self):
+        rows = list(self.object_list)
+        if self.has_next() and rows:
+            return encode_cursor(self._key(rows[-1]), 'after')
+
+    @property
+    def previous_cursor(self):
+        rows = list(self.object_list)
+        if self.has_previous() and rows:
+            return encode_cursor(self._key(rows[0]), 'before')
+
+
+class NumberedPage(CursorMixin, Page):
+    is_cursor_page = False
+
+    @cached_property
+    def page_window(self):
+        return list(self.paginator.get_elided_page_range(self.number, **PAGE_WINDOW))
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids an exact ``COUNT(*)`` on every request.
+
+    PostgreSQL uses the planner's row estimate once it exceeds
+    ``exact_below``; every other backend caches the exact count for
+    ``count_timeout`` seconds.
+    """
+
+    def __init__(self, object_list, per_page, ordering=DEFAULT_ORDERING, count_timeout=300,
+                 exact_below=10000, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.ordering = ordering
+        self.count_timeout = count_timeout
+        self.exact_below = exact_below
+
+    def _planner_estimate(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = self._planner_estimate(queryset)
+            if estimate >= self.exact_below:
+                return estimate
+
+        sql, params = queryset.query.sql_with_params()
+        key = 'paginator-count:' + hashlib.md5(f'{sql}{params!r}'.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.count_timeout)
+        return count
+
+    def _get_page(self, *args, **kwargs):
+        page = NumberedPage(*args, **kwargs)
+        page.ordering = self.ordering
+        return page
+
+
+class CursorPage(CursorMixin):
+    """A page fetched by seeking past a cursor; it has no page number"""
+    is_cursor_page = True
+    number = None
+
+    def __init__(self, object_list, has_next, has_previous, ordering):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.ordering = ordering
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """Keyset paginator over a queryset ordered by a (datetime, pk) pair"""
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = ordering
+
+    def _seek(self, key, pk, forward):
+        (key_field, key_desc), (pk_field, pk_desc) = (_split(field) for field in self.ordering)
+        key_lookup = 'lt' if key_desc == forward else 'gt'
+        pk_lookup = 'lt' if pk_desc == forward else 'gt'
+        # The inclusive bound on the key gives the database an index range to
+        # start from; the OR then resolves rows that share the same key.
+        return (
+            Q(**{f'{key_field}__{key_lookup}e': key}) &
+            (Q(**{f'{key_field}__{key_lookup}': key}) | Q(**{f'{pk_field}__{pk_lookup}': pk}))
+        )
+
+    def get_page(self, cursor):
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            rows = list(self.queryset[:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], len(rows) > self.per_page, False, self.ordering)
+
+        direction, (key, pk) = decoded
+        if direction == 'after':
+            rows = list(self.queryset.filter(self._seek(key, pk, True))[:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], len(rows) > self.per_page, True, self.ordering)
+
+        reverse = self.queryset.filter(self._seek(key, pk, False)).reverse()
+        rows = list(reverse[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page][::-1], True, has_previous, self.ordering)
+
+
+def load_in_order(model, ids, fields=None):
+    """Fetch the rows for ``ids`` with one ``pk__in`` query, keeping the order of ``ids``"""
+    ids = [int(pk) for pk in ids]
+    queryset = model._default_manager.order_by()
+    if fields:
+        queryset = queryset.only(*fields)
+    rows = queryset.in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
+
+
+def paginate_ids(request, ids, per_page, load, locate, count=None, ordering=DEFAULT_ORDERING):
+    """Paginate an ordered sequence of primary keys, loading only the rows of the page.
+
+    ``load(ids)`` fetches the rows. ``locate(key, pk, forward)`` returns the
+    position just past the cursor row when paging forward, or the position
+    of the cursor row when paging backward, or None if it is not in ``ids``.
+    When ``ids`` is only a prefix of the ``count`` matching rows, pages past
+    the prefix return None so the caller can fall back to the database.
+    """
+    total = len(ids) if count is None else count
+    decoded = decode_cursor(request.GET.get('cursor') or '')
+    if decoded is None:
+        paginator = EstimatedCountPaginator(ids, per_page, ordering=ordering)
+        paginator.count = total
+        page = paginator.get_page(request.GET.get('page'))
+        if len(page.object_list) < per_page and page.end_index() > len(ids):
+            return None
+        page.object_list = load(page.object_list)
+        return page
+
+    direction, (key, pk) = decoded
+    position = locate(key, pk, direction == 'after')
+    if position is None:
+        return None
+    if direction == 'after':
+        end = position + per_page
+        if end > len(ids) and len(ids) < total:
+            return None
+        return CursorPage(load(ids[position:end]), end < total, True, ordering)
+
+    start = max(position - per_page, 0)
+    return CursorPage(load(ids[start:position]), True, start > 0, ordering)
+
+
+def paginate(request, queryset, per_page, ordering=DEFAULT_ORDERING):
+    """Return the requested page of ``queryset``, by cursor if one is given, else by number"""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return CursorPaginator(queryset, per_page, ordering).get_page(cursor)
+    paginator = EstimatedCountPaginator(queryset.order_by(*ordering), per_page, ordering=ordering)
+    return paginator.get_page(request.GET.get('page'))
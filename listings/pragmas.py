@@ -0,0 +1,71 @@
+"""
+Per-connection SQLite settings.
+
+SQLite keeps most of its tuning in PRAGMAs that only last as long as the
+connection, so ``apply(connection)`` runs ``LISTING_SQLITE_PRAGMAS`` on
+every new SQLite connection. The production set:
+
+- ``journal_mode=wal`` lets readers carry on while a writer commits.
+  It is stored in the database file, so setting it again is a no-op.
+- ``synchronous=normal`` syncs at checkpoints instead of every commit.
+  In WAL mode that is still safe against corruption.
+- ``busy_timeout`` makes a writer wait for the lock instead of failing
+  with "database is locked".
+- ``cache_size`` (negative values are KiB), ``mmap_size`` and
+  ``temp_store`` keep more of the database and sort space in memory.
+
+A busy timeout cannot help a transaction that started as a reader and
+then tries to write while another process commits. SQLite fails those
+at once, so the databases also set ``transaction_mode='IMMEDIATE'``,
+which takes the write lock when ``atomic()`` starts.
+
+``analyze(connection)`` refreshes the planner statistics after bulk
+writes. Without them SQLite guesses that ``status = ?`` matches about ten
+rows, and walks the status index of every listing rather than looking up
+a short list of ids, as the location search does.
+"""
+import re
+
+from django.conf import settings
+
+# Applied first: changing the journal mode needs a lock the timeout should wait for
+ORDER = ['busy_timeout', 'journal_mode']
+NAME_RE = re.compile(r'^[a-z_]+$')
+VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def statements(pragmas):
+    """The PRAGMA statements for a {name: value} mapping, in a safe order"""
+    names = sorted(pragmas, key=lambda name: (ORDER.index(name) if name in ORDER else len(ORDER), name))
+    result = []
+    for name in names:
+        value = str(pragmas[name]).lower()
+        if not NAME_RE.match(name) or not VALUE_RE.match(value):
+            raise ValueError(f'Invalid SQLite pragma {name}={pragmas[name]!r}')
+        result.append(f'PRAGMA {name} = {value}')
+    return result
+
+
+def apply(connection):
+    """Run LISTING_SQLITE_PRAGMAS on a new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS', settings.LISTING_SQLITE_PRAGMAS)
+    # The raw DB-API connection, so the statements stay out of the query log and the slow-query wrapper
+    for statement in statements(pragmas):
+        connection.connection.execute(statement).fetchall()
+
+
+def analyze(connection):
+    """Refresh the planner statistics of a SQLite database (sqlite_stat1)"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def current(connection, names=None):
+    """{name: value} the connection is running with, for checks and benchmarks"""
+    connection.ensure_connection()
+    names = names or list(settings.LISTING_SQLITE_PRAGMAS)
+    return {name: connection.connection.execute(f'PRAGMA {name}').fetchone()[0] for name in names}
@@ -0,0 +1,206 @@
+"""
+Read replicas for listing and blog traffic.
+
+``ReplicaRouter`` sends reads of ``LISTING_REPLICA_APPS`` models to one of
+the ``LISTING_READ_REPLICAS`` databases. Everything else goes to
+``default``: writes, the other apps, code running outside a request and
+reads inside a transaction. A request stays on the primary when any of
+these hold:
+
+- its method is unsafe (not GET, HEAD or OPTIONS)
+- it has written through the ORM
+- it arrives with the ``LISTING_REPLICA_PIN_COOKIE`` cookie
+
+Results kept past the request read the primary too, inside ``primary()``:
+the listing snapshot, cached facet counts, search ids and pages. A lagging
+replica would otherwise put rows older than the cache's version into
+the cache, and they would stay there until the next change.
+
+An unsafe request that writes sets that cookie for
+``LISTING_REPLICA_PIN_SECONDS``. The cookie keeps a visitor on the
+primary right after their own write, for example on the listing page an
+inquiry redirects to, until the replicas have caught up.
+
+A replica is either of these:
+
+- a PostgreSQL standby
+- a SQLite snapshot. ``manage.py refresh_replicas`` copies the
+  ``SNAPSHOT_OF`` database into a new file with the backup API, then
+  renames it over the old one. The replica's NAME opens the file with
+  ``immutable=1``, so readers skip locking altogether. Connections that
+  are already open keep reading the previous copy until they close.
+
+``lag(alias)`` reports how far a replica is behind, in seconds. It is
+checked at most every ``LAG_CHECK_INTERVAL`` seconds per process.
+Replicas more than ``LISTING_REPLICA_MAX_LAG`` seconds behind, or whose
+lag is unknown, get no reads.
+"""
+import contextlib
+import contextvars
+import os
+import random
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+LAG_CHECK_INTERVAL = 5
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+SNAPSHOT_TABLE = 'replica_snapshot'
+POSTGRES_LAG = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+# [pinned, wrote] for the current request; None outside requests, which always use the primary
+_request = contextvars.ContextVar('replica_request', default=None)
+# {alias: (checked at, lag)}
+_lags = {}
+
+
+def lag(alias):
+    """Seconds the replica is behind its primary, or None when that cannot be told"""
+    checked_at, value = _lags.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < LAG_CHECK_INTERVAL:
+        return value
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'SELECT taken_at FROM {SNAPSHOT_TABLE}')
+                value = max(0.0, time.time() - cursor.fetchone()[0])
+            else:
+                cursor.execute(POSTGRES_LAG)
+                value = float(cursor.fetchone()[0] or 0)
+    except (DatabaseError, TypeError):
+        value = None
+    _lags[alias] = (now, value)
+    return value
+
+
+def lags():
+    return {alias: lag(alias) for alias in settings.LISTING_READ_REPLICAS}
+
+
+def healthy_replicas():
+    limit = settings.LISTING_REPLICA_MAX_LAG
+    return [alias for alias in settings.LISTING_READ_REPLICAS
+            if (value := lag(alias)) is not None and value <= limit]
+
+
+def snapshot_path(alias):
+    """File a SQLite snapshot replica reads, from its NAME (a plain path or a file: URI)"""
+    name = str(connections[alias].settings_dict['NAME'])
+    return urlsplit(name).path if name.startswith('file:') else name
+
+
+def refresh(alias):
+    """Replace a SQLite snapshot replica with a fresh copy of its primary"""
+    settings_dict = connections[alias].settings_dict
+    primary = connections[settings_dict['SNAPSHOT_OF']]
+    path = snapshot_path(alias)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    primary.ensure_connection()
+    taken_at = time.time()
+    target = sqlite3.connect(temporary)
+    try:
+        primary.connection.backup(target)
+        # An immutable database is read without its -wal file, so the copy must not need one
+        target.execute('PRAGMA journal_mode = delete')
+        target.execute(f'CREATE TABLE {SNAPSHOT_TABLE} (taken_at REAL NOT NULL)')
+        target.execute(f'INSERT INTO {SNAPSHOT_TABLE} VALUES (?)', (taken_at,))
+        target.commit()
+    finally:
+        target.close()
+    os.replace(temporary, path)
+    # A connection that is open keeps reading the replaced file
+    connections[alias].close()
+    _lags.pop(alias, None)
+    return taken_at
+
+
+@contextlib.contextmanager
+def primary():
+    """Read from the primary inside the block, e.g. while filling a cache other requests read"""
+    state = _request.get()
+    pinned = [True, False]
+    token = _request.set(pinned if state is not None else None)
+    try:
+        yield
+    finally:
+        _request.reset(token)
+        if state is not None and pinned[1]:
+            state[1] = True
+
+
+class ReplicaRouter:
+    """Reads of the replicated apps go to a healthy replica unless the request is pinned to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        if (state is None or state[0] or not settings.LISTING_READ_REPLICAS
+                or model._meta.app_label not in settings.LISTING_REPLICA_APPS
+                or connections['default'].in_atomic_block):
+            return None
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            state[0] = state[1] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.LISTING_READ_REPLICAS
+
+
+class ReplicaMiddleware:
+    """Track whether the request may read from replicas and pin the visitor after a write"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        cookie = settings.LISTING_REPLICA_PIN_COOKIE
+        state = [request.method not in SAFE_METHODS or cookie in request.COOKIES, False]
+        return state, _request.set(state)
+
+    def finish(self, request, response, state):
+        # Only a visitor's own changes need reading back; a GET that writes (a view counter) pins just itself
+        if state[1] and request.method not in SAFE_METHODS and settings.LISTING_READ_REPLICAS:
+            response.set_cookie(settings.LISTING_REPLICA_PIN_COOKIE, '1', max_age=settings.LISTING_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,167 @@
+"""
+Declarative listing searches.
+
+``SearchSpec`` parses the GET parameters of the search views into a
+canonical, hashable value and compiles it to a queryset. Equivalent
+requests (different parameter order, empty values, ASCII case in the
+location, ``100000`` vs ``100000.00``) produce equal specs and the same
+cache key.
+
+The ordered ids matching a spec are cached under that key and the listings
+version, so repeat searches render a page with a single ``pk__in`` query
+until any property changes. A keyword query (``q``) goes through the
+full-text backend and orders the results by relevance instead of date.
+"""
+import copy
+import hashlib
+from dataclasses import asdict, dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+from django.core.cache import cache
+from django.http import QueryDict
+
+from .cards import cards, load_cards
+from .fulltext import MAX_RESULTS, get_backend, search_terms
+from .facets import PRICE_RANGES, get_facets, price_range_q
+from .models import Property
+from .pagination import load_in_order, paginate, paginate_ids
+from .replicas import primary
+from .search_index import filter_by_location
+from .versioning import versioned_key
+
+SEARCH_FIELDS = ('property_type', 'location', 'price_range')
+KEYWORD_SEARCH_FIELDS = SEARCH_FIELDS + ('q',)
+FILTER_FIELDS = ('property_type', 'min_price', 'max_price', 'bedrooms', 'bathrooms')
+ALL_FIELDS = KEYWORD_SEARCH_FIELDS + FILTER_FIELDS[1:]
+PRICE_RANGE_VALUES = {value for value, label, low, high in PRICE_RANGES}
+
+# Ids cached per search; pages past this many results are read from the database
+MAX_CACHED_IDS = 1200
+SEARCH_CACHE_TIMEOUT = 300
+
+
+def _decimal(value):
+    number = Decimal(value)
+    if not number.is_finite():
+        raise ValueError(value)
+    return number.normalize()
+
+
+PARSERS = {
+    'property_type': str,
+    'location': lambda value: value.lower() if value.isascii() else value,
+    'price_range': lambda value: value if value in PRICE_RANGE_VALUES else '',
+    'min_price': _decimal,
+    'max_price': _decimal,
+    'bedrooms': int,
+    'bathrooms': int,
+    'q': lambda value: ' '.join(search_terms(value.lower())),
+}
+
+
+@dataclass(frozen=True)
+class SearchSpec:
+    property_type: str = ''
+    location: str = ''
+    price_range: str = ''
+    min_price: Optional[Decimal] = None
+    max_price: Optional[Decimal] = None
+    bedrooms: Optional[int] = None
+    bathrooms: Optional[int] = None
+    q: str = ''
+
+    @classmethod
+    def from_params(cls, params, fields=SEARCH_FIELDS):
+        """Build a spec from GET parameters, ignoring empty and unparseable values"""
+        values = {}
+        for field in fields:
+            raw = params.get(field)
+            if not raw:
+                continue
+            try:
+                values[field] = PARSERS[field](raw)
+            except (ValueError, InvalidOperation):
+                continue
+        return cls(**values)
+
+    @property
+    def key(self):
+        canonical = '&'.join(f'{name}={value}' for name, value in asdict(self).items() if value not in ('', None))
+        return hashlib.md5(canonical.encode()).hexdigest()
+
+    def queryset(self):
+        properties = Property.objects.filter(status='for_sale')
+        if self.property_type:
+            properties = properties.filter(property_type=self.property_type)
+        if self.location:
+            properties = filter_by_location(properties, self.location)
+        if self.price_range:
+            properties = properties.filter(price_range_q(self.price_range))
+        if self.min_price is not None:
+            properties = properties.filter(price__gte=self.min_price)
+        if self.max_price is not None:
+            properties = properties.filter(price__lte=self.max_price)
+        if self.bedrooms is not None:
+            properties = properties.filter(bedrooms__gte=self.bedrooms)
+        if self.bathrooms is not None:
+            properties = properties.filter(bathrooms__gte=self.bathrooms)
+        return properties.order_by('-created_at', '-id')
+
+    def matching_ids(self):
+        """(total count, first MAX_CACHED_IDS ids in result order, snippets by id), cached until listings change"""
+        key = versioned_key('search', self.key)
+        result = cache.get(key)
+        if result is None:
+            with primary():
+                result = self._keyword_matches() if self.q else self._listing_matches()
+            cache.set(key, result, SEARCH_CACHE_TIMEOUT)
+        return result
+
+    def _listing_matches(self):
+        ids = list(self.queryset().values_list('pk', flat=True)[:MAX_CACHED_IDS + 1])
+        count = len(ids) if len(ids) <= MAX_CACHED_IDS else self.queryset().count()
+        return count, ids[:MAX_CACHED_IDS], {}
+
+    def _keyword_matches(self):
+        # The best MAX_RESULTS text matches among the listings passing the other filters, in rank order
+        hits = get_backend().search(self.q, MAX_RESULTS, queryset=self.queryset())
+        return len(hits), [hit.id for hit in hits], {hit.id: hit.snippet for hit in hits if hit.snippet}
+
+    def paginate(self, request, per_page, fields=None, as_cards=False):
+        """A page of results as ``ListingCard``s, or as properties with ``fields`` loaded, as with ``.only()``"""
+        count, ids, snippets = self.matching_ids()
+        positions = {pk: index for index, pk in enumerate(ids)}
+
+        def load(page_ids):
+            return self._load(page_ids, snippets, fields, as_cards)
+
+        def locate(created_at, pk, forward):
+            position = positions.get(pk)
+            if position is None:
+                return None
+            return position + 1 if forward else position
+
+        page = paginate_ids(request, ids, per_page, count=count, load=load, locate=locate)
+        if page is None and self.q:
+            # Relevance order has no database fallback, so a stale cursor restarts at the first page
+            first = copy.copy(request)
+            first.GET = QueryDict()
+            page = paginate_ids(first, ids, per_page, count=count, load=load, locate=locate)
+        elif page is None:
+            properties = self.queryset()
+            if as_cards:
+                properties = cards(properties)
+            elif fields:
+                properties = properties.only(*fields)
+            page = paginate(request, properties, per_page)
+        return page
+
+    def _load(self, ids, snippets, fields=None, as_cards=False):
+        properties = load_cards(ids) if as_cards else load_in_order(Property, ids, fields)
+        for property_obj in properties:
+            property_obj.search_snippet = snippets.get(property_obj.pk, '')
+        return properties
+
+    def facets(self):
+        return get_facets(self.property_type, self.location, self.price_range, self.q)
@@ -0,0 +1,129 @@
+"""
+Prefix index over property locations.
+
+The listing views used to search locations with
+``city__icontains | state__icontains | zip_code__icontains``, which scans
+the whole ``Property`` table. Every property now keeps each suffix of its
+lowercased city, state and ZIP code in ``PropertyLocationToken``. A string
+contained in a location is a prefix of one of its suffixes, so the
+properties matching a search are one range of the token index, whatever
+the length of the search string: "IL" is looked up like "Springfield".
+
+A lookup capped at ``SPARSE_LIMIT`` properties tells rare locations from
+common ones. Rare ones filter on the ids it found, so a page sorts at most
+that many rows, however many listings there are. Common ones match so
+many rows that walking the listing index in page order fills a page
+within a few rows; checking those rows' three short columns is cheaper
+than probing the token index for each. Both run the original
+``icontains`` filter, so the results are exactly the same as before.
+"""
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Property, PropertyLocationToken
+
+LOCATION_FIELDS = ('city', 'state', 'zip_code')
+# Matching properties beyond which a search no longer collects their ids;
+# below the 999 query parameters older SQLite versions allow
+SPARSE_LIMIT = 500
+
+
+def normalize(value):
+    """Normalize a location value the way the index stores it"""
+    return (value or '').lower()
+
+
+def suffixes(value):
+    """Return the set of suffixes of a normalized value"""
+    value = normalize(value)
+    return {value[i:] for i in range(len(value))}
+
+
+def property_tokens(property_obj):
+    """Return every suffix of a property's city, state and ZIP code"""
+    tokens = set()
+    for field in LOCATION_FIELDS:
+        tokens |= suffixes(getattr(property_obj, field))
+    return tokens
+
+
+def index_property(property_obj):
+    """Bring the index rows of a single property in line with its current location"""
+    wanted = property_tokens(property_obj)
+    existing = set(
+        PropertyLocationToken.objects.filter(property=property_obj).values_list('token', flat=True)
+    )
+    if wanted == existing:
+        return
+
+    with transaction.atomic():
+        stale = existing - wanted
+        if stale:
+            PropertyLocationToken.objects.filter(property=property_obj, token__in=stale).delete()
+        PropertyLocationToken.objects.bulk_create(
+            [PropertyLocationToken(property=property_obj, token=token) for token in wanted - existing]
+        )
+
+
+def index_properties(properties, batch_size=1000):
+    """Rebuild the index rows of many properties at once (used for backfills and bulk loads)"""
+    rows = []
+    ids = []
+    for property_obj in properties:
+        ids.append(property_obj.pk)
+        rows.extend((property_obj.pk, token) for token in property_tokens(property_obj))
+
+    # A listing has a dozen or more tokens; plain tuples spare building a model instance for each
+    table = PropertyLocationToken._meta.db_table
+    with transaction.atomic():
+        PropertyLocationToken.objects.filter(property_id__in=ids).delete()
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                cursor.executemany(
+                    f'INSERT INTO "{table}" (property_id, token) VALUES (%s, %s)', rows[start:start + batch_size]
+                )
+    return len(rows)
+
+
+def rebuild_index(batch_size=1000):
+    """Rebuild the whole location index, streaming properties in batches"""
+    PropertyLocationToken.objects.all().delete()
+    properties = Property.objects.only(*LOCATION_FIELDS).order_by('pk')
+    batch = []
+    total = 0
+    for property_obj in properties.iterator(chunk_size=batch_size):
+        batch.append(property_obj)
+        if len(batch) >= batch_size:
+            total += index_properties(batch, batch_size)
+            batch = []
+    if batch:
+        total += index_properties(batch, batch_size)
+    return total
+
+
+def location_q(location):
+    """The original location filter, matching city, state or ZIP code as a substring"""
+    return (
+        Q(city__icontains=location) |
+        Q(state__icontains=location) |
+        Q(zip_code__icontains=location)
+    )
+
+
+def matching_tokens(location):
+    """Index rows whose token starts with ``location``, as a range of the (token, property) index"""
+    value = normalize(location)
+    # The smallest string sorting after every one that starts with value
+    upper = value[:-1] + chr(min(ord(value[-1]) + 1, 0x10ffff))
+    return PropertyLocationToken.objects.filter(token__gte=value, token__lt=upper)
+
+
+def filter_by_location(queryset, location):
+    """Filter a Property queryset by location using the prefix index"""
+    if not normalize(location):
+        return queryset.filter(location_q(location))
+    tokens = matching_tokens(location).using(queryset.db)
+    ids = list(tokens.values_list('property_id', flat=True).distinct()[:SPARSE_LIMIT])
+    if len(ids) < SPARSE_LIMIT:
+        queryset = queryset.filter(pk__in=ids)
+    return queryset.filter(location_q(location))
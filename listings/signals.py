@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from blog_posts.models import BlogPost
+
+from .models import Property, PropertyImage, PropertyNeighbor, PropertyVideo
+from . import (
+    fulltext, geo, images, neighbors, page_cache, pragmas, search_index, slow_queries, snapshot, versioning,
+)
+
+
+@receiver(pre_save, sender=Property)
+def assign_coordinates(sender, instance, **kwargs):
+    """Geocode from the ZIP code when there are no coordinates or the ZIP code moved, and keep the grid cell current"""
+    previous_zip_code = None
+    if instance.pk:
+        previous_zip_code = Property.objects.filter(pk=instance.pk).values_list('zip_code', flat=True).first()
+    geo.assign_coordinates(instance, previous_zip_code=previous_zip_code)
+
+
+@receiver(post_save, sender=Property)
+def update_location_index(sender, instance, **kwargs):
+    """Keep the location index in sync with the property"""
+    search_index.index_property(instance)
+
+
+@receiver(post_save, sender=Property)
+def update_fulltext_index(sender, instance, **kwargs):
+    """Re-index the property's text in the same transaction as the save"""
+    fulltext.get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_fulltext_index(sender, instance, **kwargs):
+    fulltext.get_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Property)
+def update_property_neighbors(sender, instance, **kwargs):
+    """Queue the listing for the batch job that recomputes similar listings"""
+    neighbors.queue([instance.pk])
+
+
+@receiver(pre_delete, sender=Property)
+def update_neighbors_after_delete(sender, instance, **kwargs):
+    # The rows naming this listing cascade away with it, so queue their owners now
+    referencing = list(PropertyNeighbor.objects.filter(neighbor=instance).values_list('property_id', flat=True))
+    neighbors.queue([instance.pk] + referencing)
+
+
+@receiver(post_save, sender=Property)
+def update_listing_snapshot(sender, instance, **kwargs):
+    """Patch this process's listing snapshot, if it has one"""
+    snapshot.property_saved(instance)
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_listing_snapshot(sender, instance, **kwargs):
+    snapshot.property_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def bump_listings_version(sender, **kwargs):
+    """Invalidate cached results derived from listings"""
+    transaction.on_commit(versioning.bump_version)
+
+
+@receiver(pre_save, sender=Property)
+def note_cached_pages(sender, instance, **kwargs):
+    """Remember the pages that showed the listing before this save, e.g. before it stopped being featured"""
+    instance._page_cache_keys = set()
+    if instance.pk:
+        previous = Property.objects.filter(pk=instance.pk).only(
+            'property_type', 'is_featured', 'is_new_listing'
+        ).first()
+        if previous is not None:
+            instance._page_cache_keys = page_cache.property_keys(previous)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def purge_cached_pages(sender, instance, **kwargs):
+    """Purge the cached pages that show the listing, before or after the change, once it is committed"""
+    keys = page_cache.property_keys(instance) | getattr(instance, '_page_cache_keys', set())
+    transaction.on_commit(lambda: page_cache.purge(*keys))
+
+
+@receiver(post_save, sender=PropertyVideo)
+@receiver(post_delete, sender=PropertyVideo)
+def purge_video_pages(sender, instance, **kwargs):
+    """The detail page lists the property's videos"""
+    transaction.on_commit(lambda: page_cache.purge(f'property:{instance.property_id}'))
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def purge_blog_pages(sender, **kwargs):
+    transaction.on_commit(lambda: page_cache.purge('blog:home'))
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_save, sender=BlogPost)
+def process_uploaded_image(sender, instance, **kwargs):
+    """Generate the responsive derivatives of a new upload once it is committed"""
+    field = {Property: 'main_image', PropertyImage: 'image', BlogPost: 'featured_image'}[sender]
+    name = getattr(instance, field).name
+    if name:
+        transaction.on_commit(lambda: images.schedule(name))
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    pragmas.apply(connection)
+    slow_queries.install(connection)
@@ -0,0 +1,223 @@
+"""
+Slow-query log with the query plan of every logged statement.
+
+``install(connection)`` adds an execute wrapper to each database
+connection as it opens. Any statement that takes longer than
+``LISTING_SLOW_QUERY_MS`` is logged with the following:
+- its SQL and parameters
+- the view that ran it
+- the project frames of the call stack
+
+The plan is fetched by a background thread with ``EXPLAIN QUERY PLAN``
+on SQLite and ``EXPLAIN`` elsewhere. That thread also writes the record,
+so the request only pays for grabbing the stack, and closes its database
+connection after each plan. Records are JSON lines. Each process writes
+its own file next to ``LISTING_SLOW_QUERY_LOG``, e.g. ``slow.<pid>.jsonl``
+for ``slow.jsonl``, because several gunicorn workers rotating one file
+lose records. Each file is rotated by size. ``manage.py slow_queries``
+reads every file and groups the records by ``fingerprint()``, which is the
+statement with its literals and ``IN`` lists folded away.
+"""
+import datetime
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+logger.propagate = False
+
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+STACK_DEPTH = 8
+EXPLAINABLE = ('select', 'with')
+
+_executor = None
+_executor_lock = threading.Lock()
+# (configured path, pid) the handler writes for; a forked worker opens its own file
+_handler_key = None
+# Set in the explaining thread, whose own EXPLAIN statements must not be logged
+_local = threading.local()
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+VALUES_RE = re.compile(r'\bVALUES\s*(\((?:[^()]|\([^()]*\))*\))(?:\s*,\s*\((?:[^()]|\([^()]*\))*\))*', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """The statement with literals, ``IN`` lists and repeated ``VALUES`` rows folded, and its hash"""
+    normalized = LITERAL_RE.sub('?', sql)
+    normalized = IN_LIST_RE.sub('IN (...)', normalized)
+    normalized = VALUES_RE.sub(r'VALUES \1, ...', normalized)
+    normalized = SPACE_RE.sub(' ', normalized).strip()
+    return hashlib.md5(normalized.encode()).hexdigest()[:16], normalized
+
+
+def process_log(path, pid):
+    """The file process ``pid`` writes for the configured ``path``"""
+    root, extension = os.path.splitext(str(path))
+    return f'{root}.{pid}{extension}'
+
+
+def _handler():
+    """The rotating file handler of this process, (re)attached when the setting or the process changes"""
+    global _handler_key
+    path = settings.LISTING_SLOW_QUERY_LOG
+    key = (path, os.getpid())
+    if key != _handler_key:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = RotatingFileHandler(
+                process_log(path, os.getpid()), maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding='utf-8',
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+        else:
+            logger.addHandler(logging.NullHandler())
+        _handler_key = key
+    return path
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+        return _executor
+
+
+def _stack():
+    """Where the statement came from, leaving out Django and the standard library"""
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+    return [f'{os.path.relpath(frame.filename, base)}:{frame.lineno} in {frame.name}' for frame in frames[-STACK_DEPTH:]]
+
+
+def _jsonable(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _jsonable(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_jsonable(value) for value in params]
+    if isinstance(params, (str, int, float, bool)):
+        return params
+    return str(params)
+
+
+def explain(alias, sql, params):
+    """The query plan of a SELECT, one line per plan step; [] for other statements"""
+    if not sql.lstrip().lower().startswith(EXPLAINABLE):
+        return []
+    connection = connections[alias]
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            # SQLite returns (id, parent, notused, detail) rows, PostgreSQL one line of text per row
+            return [str(row[-1]) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        _local.explaining = False
+
+
+def _write(record, alias, sql, params):
+    try:
+        record['plan'] = explain(alias, sql, params)
+    finally:
+        # This thread only wakes up for slow statements; an idle connection
+        # would hold one of the database's connection slots in between
+        connections[alias].close()
+    logger.warning(json.dumps(record, default=str))
+
+
+def _log(alias, sql, params, many, duration):
+    if not _handler():
+        return
+    key, normalized = fingerprint(sql)
+    record = {
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds'),
+        'duration_ms': round(duration * 1000, 3),
+        'alias': alias,
+        'fingerprint': key,
+        'normalized': normalized,
+        'sql': sql,
+        'params': None if many else _jsonable(params),
+        'view': metrics.current_view(),
+        'stack': _stack(),
+        'pid': os.getpid(),
+    }
+    _get_executor().submit(_write, record, alias, sql, None if many else params)
+
+
+class SlowQueryWrapper:
+    """Execute wrapper timing each statement on ``alias``"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold = settings.LISTING_SLOW_QUERY_MS
+        if threshold is None or getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration * 1000 >= threshold:
+                _log(self.alias, sql, params, many, duration)
+
+
+def install(connection):
+    """Add the slow-query wrapper to a connection, once"""
+    if not any(isinstance(wrapper, SlowQueryWrapper) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryWrapper(connection.alias))
+
+
+def wait():
+    """Block until every pending record has been written"""
+    _get_executor().submit(lambda: None).result()
+
+
+def log_files(path=None):
+    """The slow-query logs of every process and their rotated copies, oldest first"""
+    path = path or settings.LISTING_SLOW_QUERY_LOG
+    if not path:
+        return []
+    pattern = glob.escape(process_log(path, '*')).replace('[*]', '[0-9]*')
+    names = [str(path)] + glob.glob(pattern) + glob.glob(f'{pattern}.[0-9]*')
+    # Rotated copies are older the higher their suffix; each copy was last written when it rotated
+    return sorted((name for name in names if os.path.exists(name)), key=os.path.getmtime)
+
+
+def read_records(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
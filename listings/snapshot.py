@@ -0,0 +1,242 @@
+"""
+In-memory columnar snapshot of the active for-sale listings.
+
+``property_filter`` combines a property type with price, bedroom and
+bathroom ranges, which no single index serves well. Each process keeps the
+few numeric columns those filters need as NumPy arrays, evaluates the
+filters as vectorized boolean masks, and only loads the full ``Property``
+rows of the page being shown.
+
+Rows are kept in the listing order (``-created_at, -id``). Saves and
+deletes made in this process patch the arrays through signals; changes
+made by other processes are picked up when the snapshot is reloaded after
+``LISTING_SNAPSHOT_TTL`` seconds. Bulk writes, such as imports, call
+``invalidate()``, which bumps a generation number in the shared
+``listing-versions`` cache so every process reloads on its next request.
+"""
+import datetime
+import threading
+import time
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import Property
+from .pagination import load_in_order, paginate_ids
+from .replicas import primary
+from .versioning import version_cache
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+INT64_MIN, INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+TYPE_CODES = {value: code for code, (value, label) in enumerate(Property.PROPERTY_TYPES)}
+COLUMNS = {
+    'id': np.int64,
+    'price': np.int64,  # in cents, so comparisons are exact
+    'bedrooms': np.int32,
+    'bathrooms': np.int32,
+    'square_feet': np.int32,
+    'type_code': np.int8,
+    'created_at': np.int64,  # microseconds since the epoch
+}
+FIELDS = ['id', 'price', 'bedrooms', 'bathrooms', 'square_feet', 'property_type', 'created_at']
+GENERATION_KEY = 'listings:snapshot'
+
+
+def to_micros(value):
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def to_row(values):
+    """Convert a ``FIELDS`` tuple to a snapshot row"""
+    pk, price, bedrooms, bathrooms, square_feet, property_type, created_at = values
+    return (pk, int(Decimal(str(price)) * 100), bedrooms, bathrooms, square_feet,
+            TYPE_CODES.get(property_type, -1), to_micros(created_at))
+
+
+def _clamp(value):
+    return min(max(value, INT64_MIN), INT64_MAX)
+
+
+def _cents(value, rounding):
+    return _clamp(int((value * 100).to_integral_value(rounding)))
+
+
+def generation():
+    """Shared count of ``invalidate()`` calls, across all processes"""
+    return version_cache().get(GENERATION_KEY, 0)
+
+
+def spec_filters(spec):
+    """Snapshot filter arguments for the numeric part of a ``SearchSpec``"""
+    filters = {}
+    if spec.property_type:
+        filters['type_code'] = TYPE_CODES.get(spec.property_type, -1)
+    if spec.min_price is not None:
+        filters['min_price'] = _cents(spec.min_price, ROUND_CEILING)
+    if spec.max_price is not None:
+        filters['max_price'] = _cents(spec.max_price, ROUND_FLOOR)
+    if spec.bedrooms is not None:
+        filters['min_bedrooms'] = _clamp(spec.bedrooms)
+    if spec.bathrooms is not None:
+        filters['min_bathrooms'] = _clamp(spec.bathrooms)
+    return filters
+
+
+class SnapshotResult:
+    """Ids (and their sort keys) matching a filter, in listing order"""
+
+    def __init__(self, ids, created_at):
+        self.ids = ids
+        self.created_at = created_at
+
+    def __len__(self):
+        return len(self.ids)
+
+    def seek(self, created_at, pk, forward):
+        """Position of the first row after the cursor row (forward) or not before it (backward)"""
+        if forward:
+            after = (self.created_at < created_at) | ((self.created_at == created_at) & (self.ids < pk))
+        else:
+            after = (self.created_at < created_at) | ((self.created_at == created_at) & (self.ids <= pk))
+        return int(np.argmax(after)) if after.any() else len(self.ids)
+
+
+class ListingSnapshot:
+
+    def __init__(self, columns=None, generation=0):
+        self.columns = columns or {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        # Read before the rows, so an invalidation during the load causes another one
+        loaded_generation = generation()
+        with primary():
+            rows = (
+                Property.objects.filter(status='for_sale')
+                .order_by('-created_at', '-id')
+                .values_list(*FIELDS)
+                .iterator(chunk_size=chunk_size)
+            )
+            data = [to_row(values) for values in rows]
+        columns = {
+            name: np.fromiter((row[i] for row in data), dtype, count=len(data))
+            for i, (name, dtype) in enumerate(COLUMNS.items())
+        }
+        return cls(columns, loaded_generation)
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def filter(self, type_code=None, min_price=None, max_price=None, min_bedrooms=None, min_bathrooms=None):
+        columns = self.columns
+        mask = np.ones(len(columns['id']), dtype=bool)
+        if type_code is not None:
+            mask &= columns['type_code'] == type_code
+        if min_price is not None:
+            mask &= columns['price'] >= min_price
+        if max_price is not None:
+            mask &= columns['price'] <= max_price
+        if min_bedrooms is not None:
+            mask &= columns['bedrooms'] >= min_bedrooms
+        if min_bathrooms is not None:
+            mask &= columns['bathrooms'] >= min_bathrooms
+        return SnapshotResult(columns['id'][mask], columns['created_at'][mask])
+
+    def remove(self, pk):
+        with self.lock:
+            keep = self.columns['id'] != pk
+            if not keep.all():
+                self.columns = {name: column[keep] for name, column in self.columns.items()}
+
+    def upsert(self, property_obj):
+        if property_obj.status != 'for_sale':
+            self.remove(property_obj.pk)
+            return
+
+        row = to_row([getattr(property_obj, field) for field in FIELDS])
+        with self.lock:
+            columns = self.columns
+            keep = columns['id'] != property_obj.pk
+            columns = {name: column[keep] for name, column in columns.items()}
+            created_at, ids = columns['created_at'], columns['id']
+            position = int(np.count_nonzero((created_at > row[-1]) | ((created_at == row[-1]) & (ids > row[0]))))
+            self.columns = {
+                name: np.insert(column, position, row[i])
+                for i, (name, column) in enumerate(columns.items())
+            }
+
+
+_snapshot = None
+_reloading = threading.Lock()
+
+
+def _reload():
+    global _snapshot
+    try:
+        _snapshot = ListingSnapshot.load()
+    finally:
+        connections.close_all()
+        _reloading.release()
+
+
+def get_snapshot():
+    """The process-wide snapshot; loaded on first use and refreshed in the background once stale or invalidated"""
+    global _snapshot
+    if _snapshot is None:
+        with _reloading:
+            if _snapshot is None:
+                _snapshot = ListingSnapshot.load()
+    elif (time.monotonic() - _snapshot.loaded_at > settings.LISTING_SNAPSHOT_TTL
+          or _snapshot.generation != generation()):
+        if _reloading.acquire(blocking=False):
+            threading.Thread(target=_reload, daemon=True).start()
+    return _snapshot
+
+
+def _apply(method, *args):
+    if _snapshot is not None:
+        getattr(_snapshot, method)(*args)
+
+
+def property_saved(property_obj):
+    if _snapshot is not None:
+        transaction.on_commit(lambda: _apply('upsert', property_obj))
+
+
+def property_deleted(pk):
+    if _snapshot is not None:
+        transaction.on_commit(lambda: _apply('remove', pk))
+
+
+def invalidate():
+    """Drop the snapshot so the next request reloads it (after bulk writes that bypass signals)
+
+    Other processes reload theirs in the background on their next request.
+    """
+    global _snapshot
+    _snapshot = None
+    cache = version_cache()
+    cache.add(GENERATION_KEY, 0, None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Evicted between the two calls; any value other than the loaded one will do
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def paginate_result(request, result, per_page, load=None):
+    """Paginate a snapshot result like ``pagination.paginate``, loading only the page's rows with ``load(ids)``
+
+    The snapshot may be stale, so ``load`` should leave out rows that no
+    longer match; by default listings no longer for sale are left out.
+    """
+    return paginate_ids(
+        request, result.ids, per_page,
+        load=load or (lambda ids: [row for row in load_in_order(Property, ids) if row.status == 'for_sale']),
+        locate=lambda created_at, pk, forward: result.seek(to_micros(created_at), pk, forward),
+    )
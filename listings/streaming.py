@@ -0,0 +1,124 @@
+"""
+Serving large media files with HTTP byte ranges.
+
+``serve_file`` answers ``Range: bytes=...`` requests with a 206 and only
+the requested bytes, read in ``BLOCK_SIZE`` chunks, so memory stays flat
+however large the file is and seeking in a video never re-downloads it
+from the start. Requests for several ranges get the whole file, which
+RFC 9110 allows.
+
+With ``LISTING_MEDIA_ACCEL`` set, the file is handed to the front proxy
+instead (``X-Accel-Redirect`` for nginx, ``X-Sendfile`` for Apache and
+lighttpd), which then serves the ranges itself and frees the worker.
+"""
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header, size):
+    """(start, end) inclusive byte positions for a single-range header, or None to send the whole file"""
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # A suffix: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        # Syntactically invalid, so RFC 9110 has the header ignored
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+class FileRange:
+    """Read-only view of ``length`` bytes of an open file from ``start``.
+
+    It has no ``fileno``, so servers stream it through ``read()`` rather
+    than ``sendfile``-ing the whole file.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _etag(size, modified):
+    return f'"{size:x}-{int(modified):x}"'
+
+
+def _accel_response(storage, name, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.LISTING_MEDIA_ACCEL == 'nginx':
+        # nginx URL-decodes the header before looking up the file
+        response['X-Accel-Redirect'] = settings.LISTING_MEDIA_ACCEL_PREFIX + quote(name)
+    else:
+        response['X-Sendfile'] = storage.path(name)
+    return response
+
+
+def serve_file(request, storage, name, content_type):
+    """Stream the stored file ``name``, honouring ``Range`` and ``If-Range``"""
+    if settings.LISTING_MEDIA_ACCEL:
+        return _accel_response(storage, name, content_type)
+
+    size = storage.size(name)
+    modified = storage.get_modified_time(name).timestamp()
+    etag = _etag(size, modified)
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    # A client holding an older copy must not have new bytes spliced into it
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(modified):
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = storage.open(name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.block_size = BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    return response
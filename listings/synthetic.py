@@ -0,0 +1,373 @@
+"""
+Deterministic synthetic data at production scale, for load testing.
+
+``create_sample_data --scale N`` uses this to write N listings with their
+gallery images, and inquiries, mortgage calculations, home value
+estimates and blog posts in proportion. Values follow rough real
+distributions: listings cluster in a few dozen metros weighted by size,
+prices follow each metro's median scaled by type and floor area, and
+bedroom counts depend on the property type.
+
+Listings are generated in blocks of ``BLOCK_SIZE`` from a random stream
+seeded by ``(seed, block)``, so the same seed always yields the same rows
+however the run is split up. Each block is written with ``bulk_create``
+in one transaction, and a rerun continues after the listings already
+written for that seed.
+"""
+import datetime
+import functools
+import io
+import math
+import random
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from PIL import Image, ImageDraw, ImageOps
+
+from blog_posts.models import BlogPost
+from inquiries.models import Inquiry
+from mortgage_calc.models import MortgageCalculation
+from property_value.models import PropertyValue
+
+from . import fulltext, geo, images, search_index
+from .models import ProcessedImage, Property, PropertyImage
+
+BLOCK_SIZE = 1000
+PHOTO_COUNT = 24
+PHOTO_SIZE = (1600, 1067)
+# One blog post for this many listings
+LISTINGS_PER_POST = 500
+
+# (city, state, ZIP prefix, median home price, relative number of listings)
+MARKETS = [
+    ('New York', 'NY', '100', 750000, 30),
+    ('Los Angeles', 'CA', '900', 950000, 25),
+    ('Chicago', 'IL', '606', 330000, 18),
+    ('Houston', 'TX', '770', 310000, 16),
+    ('Phoenix', 'AZ', '850', 430000, 12),
+    ('Philadelphia', 'PA', '191', 270000, 10),
+    ('San Antonio', 'TX', '782', 280000, 9),
+    ('San Diego', 'CA', '921', 900000, 9),
+    ('Dallas', 'TX', '752', 380000, 10),
+    ('Austin', 'TX', '787', 540000, 8),
+    ('Jacksonville', 'FL', '322', 330000, 6),
+    ('Columbus', 'OH', '432', 260000, 6),
+    ('Charlotte', 'NC', '282', 390000, 7),
+    ('Indianapolis', 'IN', '462', 240000, 6),
+    ('San Francisco', 'CA', '941', 1300000, 6),
+    ('Seattle', 'WA', '981', 850000, 8),
+    ('Denver', 'CO', '802', 570000, 8),
+    ('Boston', 'MA', '021', 780000, 7),
+    ('Nashville', 'TN', '372', 450000, 6),
+    ('Detroit', 'MI', '482', 90000, 5),
+    ('Portland', 'OR', '972', 520000, 5),
+    ('Las Vegas', 'NV', '891', 420000, 7),
+    ('Memphis', 'TN', '381', 180000, 4),
+    ('Baltimore', 'MD', '212', 220000, 4),
+    ('Milwaukee', 'WI', '532', 200000, 4),
+    ('Albuquerque', 'NM', '871', 320000, 3),
+    ('Atlanta', 'GA', '303', 400000, 10),
+    ('Miami', 'FL', '331', 580000, 10),
+    ('Minneapolis', 'MN', '554', 330000, 6),
+    ('Springfield', 'IL', '627', 160000, 2),
+]
+TYPE_WEIGHTS = {'house': 55, 'condo': 15, 'apartment': 12, 'townhouse': 10, 'land': 4, 'commercial': 4}
+# Price relative to a house of the same floor area in the same market
+TYPE_PRICE_FACTORS = {'house': 1.0, 'condo': 0.75, 'apartment': 0.65, 'townhouse': 0.85, 'land': 0.25,
+                      'commercial': 1.6}
+# Weights of 0 to 6 bedrooms
+BEDROOM_WEIGHTS = {
+    'house': [0, 2, 10, 40, 33, 11, 4],
+    'townhouse': [0, 5, 35, 45, 15, 0, 0],
+    'condo': [8, 35, 42, 13, 2, 0, 0],
+    'apartment': [15, 40, 35, 10, 0, 0, 0],
+    'land': [1, 0, 0, 0, 0, 0, 0],
+    'commercial': [1, 0, 0, 0, 0, 0, 0],
+}
+STATUSES = ['for_sale', 'sold', 'for_rent', 'rented']
+STATUS_WEIGHTS = {'apartment': [35, 5, 50, 10], 'default': [80, 10, 8, 2]}
+# Monthly rent as a share of the sale price
+RENT_RATIO = 0.0055
+NEWEST_YEAR_BUILT = 2024
+
+ADJECTIVES = ['Charming', 'Spacious', 'Modern', 'Renovated', 'Sunny', 'Elegant', 'Cozy', 'Updated', 'Classic',
+              'Bright', 'Stunning', 'Quiet', 'Stylish', 'Private']
+STREETS = ['Oak', 'Maple', 'Cedar', 'Pine', 'Elm', 'Washington', 'Lake', 'Hill', 'Park', 'Main', 'Sunset',
+           'River', 'Highland', 'Meadow', 'Willow', 'Church', 'Spring', 'Forest', 'Ridge', 'Jackson']
+STREET_SUFFIXES = ['St', 'Ave', 'Blvd', 'Dr', 'Ln', 'Ct', 'Way', 'Pl', 'Rd', 'Ter']
+FEATURES = ['Hardwood floors', 'Central air', 'Walk-in closets', 'Fireplace', 'Granite countertops',
+            'Stainless steel appliances', 'Vaulted ceilings', 'Finished basement', 'Two-car garage',
+            'Open floor plan', 'Smart thermostat', 'Solar panels', 'Home office', 'Laundry room',
+            'Covered patio', 'Fenced yard', 'Kitchen island', 'Wine cellar']
+AMENITIES = ['Pool', 'Gym', 'Playground', 'Dog park', 'Clubhouse', 'Tennis courts', 'Concierge',
+             'Rooftop deck', 'Bike storage', 'EV charging', 'Walking trails', 'Gated entry']
+DESCRIPTIONS = [
+    'This {adjective} {type} sits on a quiet street in {city}, close to schools, parks and shopping.',
+    'Natural light fills the open living spaces, and the kitchen has plenty of storage and counter space.',
+    'The primary bedroom has its own bath and generous closets.',
+    'Recent updates include new windows, fresh paint and a replaced roof.',
+    'Commuters will appreciate the easy access to transit and major highways.',
+    'Outside, a private yard is ready for gardening and summer evenings.',
+    'A rare chance to own in one of the most sought-after neighborhoods of {city}.',
+    'Zoned for flexible use, with utilities available at the lot line.',
+]
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'Maria', 'Wei', 'Aisha', 'Carlos', 'Priya', 'Noah', 'Sofia', 'Liam', 'Emma', 'Omar']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Nguyen', 'Kim', 'Patel', 'Chen', 'Lopez', 'Wilson', 'Anderson', 'Thomas']
+INQUIRY_MESSAGES = [
+    'Is this property still available? I would like to schedule a showing.',
+    'Could you send more details about the HOA fees and property taxes?',
+    'We are relocating next month and are very interested. When can we see it?',
+    'Is the price negotiable? We are pre-approved and ready to move quickly.',
+    'Are pets allowed? We have a small dog.',
+]
+INQUIRY_STATUS_WEIGHTS = {'new': 50, 'contacted': 30, 'follow_up': 10, 'closed': 10}
+POST_TITLES = [
+    '{city} Housing Market Update', 'What {price} Buys You in {city}', 'First-Time Buyer Guide to {city}',
+    'Best Neighborhoods in {city} for Families', 'Is Now the Time to Sell in {city}?',
+    'Renting vs. Buying in {city}',
+]
+POST_PARAGRAPHS = [
+    'Inventory in {city} has grown over the last quarter, giving buyers more choice than they have had in years.',
+    'Median prices held steady, while homes priced correctly still sold within a few weeks of listing.',
+    'Mortgage rates remain the biggest factor in affordability, so getting pre-approved early pays off.',
+    'Sellers who invest in small repairs and professional photos consistently see stronger offers.',
+    'Neighborhoods close to transit and good schools continue to outperform the wider market.',
+    'Investors are returning to multi-family properties as rental demand stays high.',
+]
+
+
+def _weighted(weights):
+    """(values, cumulative weights) for ``random.choices``"""
+    values = list(weights)
+    cumulative, total = [], 0
+    for value in values:
+        total += weights[value]
+        cumulative.append(total)
+    return values, cumulative
+
+
+MARKET_CHOICES = _weighted({i: market[4] for i, market in enumerate(MARKETS)})
+TYPE_CHOICES = _weighted(TYPE_WEIGHTS)
+INQUIRY_STATUS_CHOICES = _weighted(INQUIRY_STATUS_WEIGHTS)
+
+
+@functools.lru_cache(maxsize=None)
+def market_zip_codes():
+    """ZIP codes of each market, in the order of MARKETS"""
+    zip_codes = sorted(geo.zip_centroids())
+    return [[zip_code for zip_code in zip_codes if zip_code.startswith(prefix)] or [zip_codes[0]]
+            for city, state, prefix, median, weight in MARKETS]
+
+
+def photo_name(number):
+    return f'synthetic/photo-{number:02d}.jpg'
+
+
+def ensure_photos(seed=0):
+    """Write the shared pool of listing photos and their derivatives, unless they exist"""
+    rng = random.Random(f'photos:{seed}')
+    for number in range(PHOTO_COUNT):
+        name = photo_name(number)
+        # Drawn even for existing photos, so every photo keeps its colours
+        sky, ground, wall = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(3)]
+        if not default_storage.exists(name):
+            image = ImageOps.colorize(Image.linear_gradient('L').resize(PHOTO_SIZE), sky, ground)
+            draw = ImageDraw.Draw(image)
+            width, height = PHOTO_SIZE
+            draw.rectangle([width // 4, height // 2, width * 3 // 4, height * 7 // 8], fill=wall)
+            draw.polygon([(width // 5, height // 2), (width // 2, height // 4), (width * 4 // 5, height // 2)],
+                         fill=ground)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+        if not ProcessedImage.objects.filter(source=name).exists():
+            images.record(images.render_derivatives(name))
+
+
+def _money(value, step=1000):
+    return Decimal(max(step, round(value / step) * step))
+
+
+def _listing(rng, seed, number):
+    market = rng.choices(MARKET_CHOICES[0], cum_weights=MARKET_CHOICES[1])[0]
+    city, state, prefix, median, weight = MARKETS[market]
+    zip_code = rng.choice(market_zip_codes()[market])
+    latitude, longitude = geo.zip_centroids()[zip_code]
+    latitude += rng.uniform(-0.03, 0.03)
+    longitude += rng.uniform(-0.03, 0.03)
+
+    property_type = rng.choices(TYPE_CHOICES[0], cum_weights=TYPE_CHOICES[1])[0]
+    bedrooms = rng.choices(range(7), BEDROOM_WEIGHTS[property_type])[0]
+    status = rng.choices(STATUSES, STATUS_WEIGHTS.get(property_type, STATUS_WEIGHTS['default']))[0]
+    lot_size = year_built = None
+    if property_type == 'land':
+        square_feet = bathrooms = 0
+        lot_size = rng.lognormvariate(math.log(2), 1)
+        value = median * TYPE_PRICE_FACTORS['land'] * rng.lognormvariate(0, 0.6) * min(lot_size, 20) ** 0.5
+    else:
+        if property_type == 'commercial':
+            square_feet = int(round(rng.lognormvariate(math.log(5000), 0.6), -1))
+            bathrooms = max(1, square_feet // 2500)
+        else:
+            square_feet = int(round((450 + 420 * bedrooms) * rng.lognormvariate(0, 0.2), -1))
+            bathrooms = max(1, bedrooms - rng.choice([0, 0, 1]))
+        if property_type in ('house', 'townhouse', 'commercial'):
+            lot_size = rng.lognormvariate(math.log(0.2), 0.6)
+        year_built = int(rng.triangular(1900, NEWEST_YEAR_BUILT, 1995))
+        value = median * TYPE_PRICE_FACTORS[property_type] * (square_feet / 1800) ** 0.7 * rng.lognormvariate(0, 0.3)
+    price = _money(value * RENT_RATIO, 25) if status in ('for_rent', 'rented') else _money(value)
+
+    label = dict(Property.PROPERTY_TYPES)[property_type]
+    adjective = rng.choice(ADJECTIVES)
+    sentences = [DESCRIPTIONS[0]] + rng.sample(DESCRIPTIONS[1:], 3)
+    listing = Property(
+        external_id=f'SYN-{seed}-{number}',
+        title=f'{adjective} {bedrooms}-Bedroom {label} in {city}' if bedrooms else f'{adjective} {label} in {city}',
+        description=' '.join(sentences).format(adjective=adjective.lower(), type=label.lower(), city=city),
+        address=f'{rng.randint(1, 9999)} {rng.choice(STREETS)} {rng.choice(STREET_SUFFIXES)}',
+        city=city,
+        state=state,
+        zip_code=zip_code,
+        latitude=latitude,
+        longitude=longitude,
+        geo_cell=geo.cell_for(latitude, longitude),
+        price=price,
+        property_type=property_type,
+        status=status,
+        bedrooms=bedrooms,
+        bathrooms=bathrooms,
+        square_feet=square_feet,
+        lot_size=Decimal(f'{max(lot_size, 0.02):.2f}') if lot_size else None,
+        year_built=year_built,
+        features=', '.join(rng.sample(FEATURES, rng.randint(3, 6))),
+        amenities=', '.join(rng.sample(AMENITIES, rng.randint(0, 4))),
+        main_image=photo_name(rng.randrange(PHOTO_COUNT)) if rng.random() < 0.9 else None,
+        is_featured=rng.random() < 0.03,
+        is_new_listing=rng.random() < 0.15,
+    )
+    return listing, value
+
+
+def _person(rng):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return (f'{first} {last}', f'{first}.{last}{rng.randrange(1000)}@example.com'.lower(),
+            f'555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}')
+
+
+def _inquiry(rng, listing):
+    name, email, phone = _person(rng)
+    first_name, last_name = name.split(' ')
+    return Inquiry(
+        first_name=first_name,
+        last_name=last_name,
+        email=email,
+        phone=phone,
+        property_obj=listing,
+        inquiry_type={'for_sale': 'buy', 'for_rent': 'rent'}.get(listing.status, 'general'),
+        message=rng.choice(INQUIRY_MESSAGES),
+        status=rng.choices(INQUIRY_STATUS_CHOICES[0], cum_weights=INQUIRY_STATUS_CHOICES[1])[0],
+        is_urgent=rng.random() < 0.05,
+    )
+
+
+def _mortgage(rng, price):
+    """A calculation as the mortgage calculator would have saved it"""
+    down_percentage = rng.choices([0, 3.5, 5, 10, 20, 25], [5, 15, 15, 20, 35, 10])[0]
+    loan_type = {0: 'va', 3.5: 'fha'}.get(down_percentage, 'conventional')
+    rate = round(min(max(rng.gauss(6.8, 0.5), 2), 12), 3)
+    years = rng.choices([15, 30], [20, 80])[0]
+    down_payment = price * down_percentage / 100
+    loan_amount = price - down_payment
+    monthly_rate = rate / 100 / 12
+    payments = years * 12
+    monthly = loan_amount * monthly_rate * (1 + monthly_rate) ** payments / ((1 + monthly_rate) ** payments - 1)
+    tax, insurance = price * 0.012 / 12, price * 0.005 / 12
+    pmi = loan_amount * 0.005 / 12 if down_percentage < 20 else 0
+    name, email, phone = _person(rng) if rng.random() < 0.5 else ('', '', '')
+    return MortgageCalculation(
+        property_price=_money(price, 1), down_payment=_money(down_payment, 1) if down_payment else 0,
+        down_payment_percentage=down_percentage, loan_amount=_money(loan_amount, 1), interest_rate=rate,
+        loan_term_years=years, loan_type=loan_type, monthly_principal_interest=round(monthly, 2),
+        monthly_property_tax=round(tax, 2), monthly_insurance=round(insurance, 2), monthly_pmi=round(pmi, 2),
+        total_monthly_payment=round(monthly + tax + insurance + pmi, 2),
+        total_interest_paid=round(monthly * payments - loan_amount, 2), total_payment=round(monthly * payments, 2),
+        contact_name=name, contact_email=email, contact_phone=phone,
+    )
+
+
+def _valuation(rng, listing, value):
+    estimate = value * rng.lognormvariate(0, 0.08)
+    name, email, phone = _person(rng) if rng.random() < 0.3 else ('', '', '')
+    sold = rng.random() < 0.6
+    return PropertyValue(
+        address=listing.address, city=listing.city, state=listing.state, zip_code=listing.zip_code,
+        estimated_value=_money(estimate, 1), value_range_low=_money(estimate * 0.9, 1),
+        value_range_high=_money(estimate * 1.1, 1), bedrooms=listing.bedrooms, bathrooms=listing.bathrooms,
+        square_feet=listing.square_feet, year_built=listing.year_built,
+        last_sold_price=_money(estimate * rng.uniform(0.6, 0.95)) if sold else None,
+        last_sold_date=datetime.date.today() - datetime.timedelta(days=rng.randrange(30, 5500)) if sold else None,
+        contact_name=name, contact_email=email, contact_phone=phone,
+    )
+
+
+def _post(rng, seed, number, listing, author, categories):
+    title = rng.choice(POST_TITLES).format(city=listing.city, price=f'${listing.price:,.0f}')
+    published = rng.random() < 0.9
+    return BlogPost(
+        title=title,
+        slug=f'{slugify(title)[:30].strip("-")}-{seed}-{number}',
+        author=author,
+        category=rng.choice(categories),
+        content='\n\n'.join(rng.sample(POST_PARAGRAPHS, 4)).format(city=listing.city),
+        excerpt=POST_PARAGRAPHS[0].format(city=listing.city),
+        featured_image=photo_name(rng.randrange(PHOTO_COUNT)),
+        status='published' if published else 'draft',
+        published_at=timezone.now() - datetime.timedelta(days=rng.uniform(0, 730)) if published else None,
+        views=int(rng.paretovariate(1.2) * 20),
+    )
+
+
+def generate_block(seed, block, start, stop, author, categories):
+    """Write listings ``start`` to ``stop`` of ``block`` and their related rows; returns the listings"""
+    rng = random.Random(f'{seed}:{block}')
+    listings, gallery, inquiries, mortgages, valuations, posts = [], [], [], [], [], []
+    for number in range(block * BLOCK_SIZE, stop):
+        # Every listing draws from the stream, written or not, so later ones come out the same
+        listing, value = _listing(rng, seed, number)
+        photo_count = rng.choices(range(7), [10, 10, 15, 20, 20, 15, 10])[0]
+        photos = [photo_name(rng.randrange(PHOTO_COUNT)) for _ in range(photo_count)]
+        related = [_inquiry(rng, listing) for _ in range(rng.choices(range(4), [70, 20, 7, 3])[0])]
+        mortgage = _mortgage(rng, value) if rng.random() < 0.5 else None
+        valuation = _valuation(rng, listing, value) if rng.random() < 0.2 else None
+        post = _post(rng, seed, number, listing, author, categories) if number % LISTINGS_PER_POST == 0 else None
+        if number < start:
+            continue
+        listings.append(listing)
+        gallery.extend(PropertyImage(property=listing, image=photo, is_primary=i == 0) for i, photo in enumerate(photos))
+        inquiries.extend(related)
+        mortgages.extend([mortgage] if mortgage else [])
+        valuations.extend([valuation] if valuation else [])
+        posts.extend([post] if post else [])
+
+    with transaction.atomic():
+        # The images and inquiries pick up their listing's primary key from here
+        listings = Property.objects.bulk_create(listings)
+        PropertyImage.objects.bulk_create(gallery)
+        Inquiry.objects.bulk_create(inquiries)
+        MortgageCalculation.objects.bulk_create(mortgages)
+        PropertyValue.objects.bulk_create(valuations)
+        BlogPost.objects.bulk_create(posts)
+        search_index.index_properties(listings)
+        fulltext.get_backend().index(listings)
+    return listings
+
+
+def written(seed):
+    """How many listings of ``seed`` exist already"""
+    return Property.objects.filter(external_id__startswith=f'SYN-{seed}-').count()
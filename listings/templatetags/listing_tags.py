@@ -0,0 +1,45 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from .. import images
+from ..fragments import CARD_TEMPLATE, render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def query_replace(context, **kwargs):
+    """Current query string with the given parameters replaced; a value of None drops the parameter"""
+    query = context['request'].GET.copy()
+    for key, value in kwargs.items():
+        query.pop(key, None)
+        if value is not None:
+            query[key] = value
+    return query.urlencode()
+
+
+@register.simple_tag
+def listing_cards(properties, template=CARD_TEMPLATE, **options):
+    """Cached card markup for each listing, fetched from the cache in one round trip"""
+    return render_cards(properties, template, **options)
+
+
+@register.simple_tag
+def responsive_image(image, fallback_url='', alt='', sizes='100vw', **attrs):
+    """WebP/JPEG ``srcset``s of a processed upload over its blurred placeholder, else a plain ``<img>``"""
+    name = getattr(image, 'name', image) or ''
+    attrs.setdefault('loading', 'lazy')
+    processed = images.get_processed(name)
+    if processed is None:
+        src = fallback_url or (default_storage.url(name) if name else '')
+        return format_html('<img src="{}" alt="{}"{}>', src, alt, flatatt(attrs))
+
+    attrs['style'] = f"background: url('{processed.placeholder}') center / cover no-repeat; {attrs.get('style', '')}"
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" decoding="async"{}></picture>',
+        images.srcset(processed, 'webp'), sizes, images.largest(processed, 'jpg'), images.srcset(processed, 'jpg'),
+        sizes, processed.width, processed.height, alt, flatatt(attrs),
+    )
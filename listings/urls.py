@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'listings'
 
@@ -13,14 +13,23 @@ urlpatterns = [
     
     # Property details
     path('property/<int:property_id>/', views.property_detail, name='property_detail'),
+    path('property/<int:property_id>/videos/<int:video_id>/', views.property_video, name='property_video'),
     
     # Search and filters
     path('search/', views.property_search, name='property_search'),
     path('filter/', views.property_filter, name='property_filter'),
+    path('search/geo/', views.property_geo_search, name='property_geo_search'),
     
     # Property types
     path('type/<str:property_type>/', views.property_by_type, name='property_by_type'),
     
     # Location based
-    path('location/<str:city>/', views.property_by_location, name='property_by_location'),
+    path('location/<str:location>/', views.property_by_location, name='property_by_location'),
+    
+    # JSON API
+    path('api/listings/', api.listing_list, name='api_listing_list'),
+    path('api/listings/<int:property_id>/', api.listing_detail, name='api_listing_detail'),
+    
+    # Prometheus metrics
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
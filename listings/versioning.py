@@ -0,0 +1,41 @@
+"""
+A single version number for all listing data, kept in a shared cache.
+
+Cached results derived from listings include the current version in their
+key. Saving or deleting a property bumps the version, which makes every
+older entry unreachable; they then simply expire. The results may be
+cached per process, but the version lives in the ``listing-versions``
+cache, which every process must share so one worker's save reaches all.
+"""
+import time
+
+from django.core.cache import caches
+
+VERSION_CACHE = 'listing-versions'
+VERSION_KEY = 'listings:version'
+
+
+def version_cache():
+    return caches[VERSION_CACHE]
+
+
+def get_version():
+    cache = version_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1 so that a version evicted from the
+        # cache can never line up with entries cached under an older value.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        return version_cache().incr(VERSION_KEY)
+    except ValueError:
+        return get_version()
+
+
+def versioned_key(*parts):
+    return ':'.join(['listings', str(get_version())] + [str(part) for part in parts])
@@ -1,14 +1,25 @@
+import hmac
+import mimetypes
+
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
-from django.db.models import Q
 from django.contrib import messages
-from .models import Property
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from . import geo, metrics, neighbors, page_cache, replicas, snapshot, streaming
+from .cards import cards, load_cards
+from .models import Property, PropertyVideo
+from .pagination import paginate
+from .search import FILTER_FIELDS, KEYWORD_SEARCH_FIELDS, SearchSpec
+from .search_index import filter_by_location
 from inquiries.forms import InquiryForm
 from blog_posts.models import BlogPost
 
+@page_cache.cache_page
 def home(request):
     """Home page view"""
-    featured_properties = Property.objects.filter(is_featured=True, status='for_sale')[:8]
+    page_cache.add_keys(request, 'listings:featured', 'blog:home')
+    featured_properties = cards(Property.objects.filter(is_featured=True, status='for_sale'))[:8]
     blog_posts = BlogPost.objects.filter(status='published').order_by('-published_at')[:3]
     
     context = {
@@ -19,46 +30,15 @@ def home(request):
 
 def buy_home(request):
     """Buy a home page"""
-    properties = Property.objects.filter(status='for_sale').order_by('-created_at')
-    
-    # Filter by property type
-    property_type = request.GET.get('property_type')
-    if property_type:
-        properties = properties.filter(property_type=property_type)
-    
-    # Filter by location
-    location = request.GET.get('location')
-    if location:
-        properties = properties.filter(
-            Q(city__icontains=location) | 
-            Q(state__icontains=location) | 
-            Q(zip_code__icontains=location)
-        )
-    
-    # Filter by price range
-    price_range = request.GET.get('price_range')
-    if price_range:
-        if price_range == '0-200000':
-            properties = properties.filter(price__lte=200000)
-        elif price_range == '200000-400000':
-            properties = properties.filter(price__gte=200000, price__lte=400000)
-        elif price_range == '400000-600000':
-            properties = properties.filter(price__gte=400000, price__lte=600000)
-        elif price_range == '600000-800000':
-            properties = properties.filter(price__gte=600000, price__lte=800000)
-        elif price_range == '800000-1000000':
-            properties = properties.filter(price__gte=800000, price__lte=1000000)
-        elif price_range == '1000000+':
-            properties = properties.filter(price__gte=1000000)
+    spec = SearchSpec.from_params(request.GET)
     
     # Pagination
-    paginator = Paginator(properties, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = spec.paginate(request, 12, as_cards=True)
     
     context = {
         'properties': page_obj,
         'property_types': Property.PROPERTY_TYPES,
+        'facets': spec.facets(),
     }
     return render(request, 'listings/buy_home.html', context)
 
@@ -80,34 +60,35 @@ def sell_home(request):
     }
     return render(request, 'listings/sell_home.html', context)
 
+@page_cache.cache_page
 def featured_listings(request):
     """Featured listings page"""
-    properties = Property.objects.filter(is_featured=True, status='for_sale').order_by('-created_at')
+    page_cache.add_keys(request, 'listings:featured')
+    properties = cards(Property.objects.filter(is_featured=True, status='for_sale')).order_by('-created_at')
     
     # Pagination
-    paginator = Paginator(properties, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, properties, 12)
     
     context = {
         'properties': page_obj,
     }
     return render(request, 'listings/featured_listings.html', context)
 
+@page_cache.cache_page
 def new_listings(request):
     """New listings page"""
-    properties = Property.objects.filter(is_new_listing=True, status='for_sale').order_by('-created_at')
+    page_cache.add_keys(request, 'listings:new')
+    properties = cards(Property.objects.filter(is_new_listing=True, status='for_sale')).order_by('-created_at')
     
     # Pagination
-    paginator = Paginator(properties, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, properties, 12)
     
     context = {
         'properties': page_obj,
     }
     return render(request, 'listings/new_listings.html', context)
 
+@page_cache.cache_page
 def property_detail(request, property_id):
     """Property detail page"""
     property_obj = get_object_or_404(Property, id=property_id)
@@ -125,105 +106,56 @@ def property_detail(request, property_id):
         form = InquiryForm()
     
     # Get related properties
-    related_properties = Property.objects.filter(
-        Q(city=property_obj.city) | Q(property_type=property_obj.property_type),
-        status='for_sale'
-    ).exclude(id=property_obj.id)[:3]
+    related_properties = neighbors.related_properties(property_obj, 3)
+    page_cache.add_keys(request, *(f'property:{obj.pk}' for obj in [property_obj, *related_properties]))
     
     context = {
         'property': property_obj,
         'form': form,
         'related_properties': related_properties,
+        'videos': property_obj.videos.all(),
     }
     return render(request, 'listings/property_detail.html', context)
 
+def property_video(request, property_id, video_id):
+    """Stream a property's video file, with byte ranges for seeking"""
+    video = get_object_or_404(PropertyVideo, id=video_id, property_id=property_id)
+    video_file = video.video_file
+    if not video_file or not video_file.storage.exists(video_file.name):
+        raise Http404('Video file not found')
+    
+    content_type = mimetypes.guess_type(video_file.name)[0] or 'application/octet-stream'
+    return streaming.serve_file(request, video_file.storage, video_file.name, content_type)
+
 def property_search(request):
     """Property search page"""
-    properties = Property.objects.filter(status='for_sale')
-    
-    # Get search parameters
-    property_type = request.GET.get('property_type')
-    location = request.GET.get('location')
-    price_range = request.GET.get('price_range')
-    
-    # Apply filters
-    if property_type:
-        properties = properties.filter(property_type=property_type)
-    
-    if location:
-        properties = properties.filter(
-            Q(city__icontains=location) | 
-            Q(state__icontains=location) | 
-            Q(zip_code__icontains=location)
-        )
-    
-    if price_range:
-        if price_range == '0-200000':
-            properties = properties.filter(price__lte=200000)
-        elif price_range == '200000-400000':
-            properties = properties.filter(price__gte=200000, price__lte=400000)
-        elif price_range == '400000-600000':
-            properties = properties.filter(price__gte=400000, price__lte=600000)
-        elif price_range == '600000-800000':
-            properties = properties.filter(price__gte=600000, price__lte=800000)
-        elif price_range == '800000-1000000':
-            properties = properties.filter(price__gte=800000, price__lte=1000000)
-        elif price_range == '1000000+':
-            properties = properties.filter(price__gte=1000000)
-    
-    # Sort by created date
-    properties = properties.order_by('-created_at')
+    spec = SearchSpec.from_params(request.GET, KEYWORD_SEARCH_FIELDS)
     
     # Pagination
-    paginator = Paginator(properties, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = spec.paginate(request, 12, as_cards=True)
     
     context = {
         'properties': page_obj,
         'property_types': Property.PROPERTY_TYPES,
+        'facets': spec.facets(),
         'search_params': {
-            'property_type': property_type,
-            'location': location,
-            'price_range': price_range,
+            'property_type': request.GET.get('property_type'),
+            'location': request.GET.get('location'),
+            'price_range': request.GET.get('price_range'),
+            'q': request.GET.get('q'),
         }
     }
     return render(request, 'listings/property_search.html', context)
 
 def property_filter(request):
     """Property filter page"""
-    properties = Property.objects.filter(status='for_sale')
-    
-    # Get filter parameters
-    property_type = request.GET.get('property_type')
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    bedrooms = request.GET.get('bedrooms')
-    bathrooms = request.GET.get('bathrooms')
+    spec = SearchSpec.from_params(request.GET, FILTER_FIELDS)
     
-    # Apply filters
-    if property_type:
-        properties = properties.filter(property_type=property_type)
-    
-    if min_price:
-        properties = properties.filter(price__gte=min_price)
-    
-    if max_price:
-        properties = properties.filter(price__lte=max_price)
-    
-    if bedrooms:
-        properties = properties.filter(bedrooms__gte=bedrooms)
-    
-    if bathrooms:
-        properties = properties.filter(bathrooms__gte=bathrooms)
-    
-    # Sort by created date
-    properties = properties.order_by('-created_at')
-    
-    # Pagination
-    paginator = Paginator(properties, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Filter the in-memory snapshot and only load the rows on this page. The
+    # snapshot can lag behind the database, so the rows are loaded through the
+    # spec's own queryset and listings that stopped matching drop out
+    result = snapshot.get_snapshot().filter(**snapshot.spec_filters(spec))
+    page_obj = snapshot.paginate_result(request, result, 12, load=lambda ids: load_cards(ids, spec.queryset()))
     
     context = {
         'properties': page_obj,
@@ -231,17 +163,17 @@ def property_filter(request):
     }
     return render(request, 'listings/property_filter.html', context)
 
+@page_cache.cache_page
 def property_by_type(request, property_type):
     """Properties by type"""
-    properties = Property.objects.filter(
+    page_cache.add_keys(request, f'listings:type:{property_type}')
+    properties = cards(Property.objects.filter(
         property_type=property_type, 
         status='for_sale'
-    ).order_by('-created_at')
+    )).order_by('-created_at')
     
     # Pagination
-    paginator = Paginator(properties, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, properties, 12)
     
     context = {
         'properties': page_obj,
@@ -252,20 +184,80 @@ def property_by_type(request, property_type):
 
 def property_by_location(request, location):
     """Properties by location"""
-    properties = Property.objects.filter(
-        Q(city__icontains=location) | 
-        Q(state__icontains=location) | 
-        Q(zip_code__icontains=location),
-        status='for_sale'
-    ).order_by('-created_at')
+    properties = cards(filter_by_location(
+        Property.objects.filter(status='for_sale'),
+        location
+    )).order_by('-created_at')
     
     # Pagination
-    paginator = Paginator(properties, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, properties, 12)
     
     context = {
         'properties': page_obj,
         'location': location,
     }
     return render(request, 'listings/property_by_location.html', context)
+
+
+def property_geo_search(request):
+    """Listings inside a map viewport (bbox=south,west,north,east) or near a point (lat, lng, radius in miles)"""
+    try:
+        if 'bbox' in request.GET:
+            south, west, north, east = (float(value) for value in request.GET['bbox'].split(','))
+            if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+                raise ValueError('bbox out of range')
+            ids, distances = geo.in_box(south, west, north, east), None
+        else:
+            latitude = float(request.GET['lat'])
+            longitude = float(request.GET['lng'])
+            radius = float(request.GET.get('radius', 5))
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius <= geo.MAX_RADIUS_MILES):
+                raise ValueError('point or radius out of range')
+            ids, distances = geo.within_radius(latitude, longitude, radius)
+    except (KeyError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'error': 'Provide bbox=south,west,north,east or lat, lng and radius (miles)'
+        }, status=400)
+    
+    page_ids = ids[:geo.MAX_RESULTS].tolist()
+    rows = Property.objects.order_by().in_bulk(page_ids)
+    results = []
+    for index, pk in enumerate(page_ids):
+        property_obj = rows.get(pk)
+        if property_obj is None:
+            continue
+        result = {
+            'id': pk,
+            'title': property_obj.title,
+            'price': str(property_obj.price),
+            'property_type': property_obj.property_type,
+            'latitude': property_obj.latitude,
+            'longitude': property_obj.longitude,
+            'url': reverse('listings:property_detail', args=[pk]),
+        }
+        if distances is not None:
+            result['distance_miles'] = round(float(distances[index]), 2)
+        results.append(result)
+    
+    return JsonResponse({
+        'success': True,
+        'count': len(ids),
+        'results': results,
+    })
+
+def metrics_view(request):
+    """Prometheus metrics of every worker, for scrapers with the metrics token and staff users"""
+    token = settings.LISTING_METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    allowed = request.user.is_staff or (
+        token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    )
+    if not allowed:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    
+    data = metrics.collect()
+    # Replicas whose lag cannot be read are left out rather than reported as current
+    data['gauges'] += [['db_replica_lag_seconds', [['database', alias]], lag]
+                       for alias, lag in replicas.lags().items() if lag is not None]
+    return HttpResponse(metrics.render(data), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,3 +1,33 @@
+import json
+
 from django.test import TestCase
+from django.urls import reverse
+
+from listings import metrics
+
+from .models import MortgageCalculation
+
+
+class CalculateMortgageTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    async def test_calculation_runs_on_the_async_path(self):
+        response = await self.async_client.post(
+            reverse('mortgage:calculate_mortgage'),
+            json.dumps({'property_price': 400000, 'down_payment': 80000, 'interest_rate': 6, 'loan_term': 30,
+                        'contact_name': 'Ann', 'contact_email': 'ann@example.com'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()['results']['monthly_payment'], 1918.56, places=2)
+        self.assertEqual(await MortgageCalculation.objects.acount(), 1)
+
+        response = await self.async_client.get(reverse('mortgage:calculate_mortgage'))
+        self.assertEqual(response.status_code, 405)
 
-# Create your tests here.
+        # The async middleware path measured it
+        text = metrics.render(metrics.collect())
+        self.assertIn('realtypro_http_requests_total{view="mortgage:calculate_mortgage",method="POST",status="200"} 1',
+                      text)
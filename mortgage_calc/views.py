@@ -9,7 +9,7 @@ def mortgage_calculator(request):
     return render(request, 'mortgage_calc/mortgage_calculator.html')
 
 @csrf_exempt
-def calculate_mortgage(request):
+async def calculate_mortgage(request):
     """API endpoint for mortgage calculation"""
     if request.method == 'POST':
         try:
@@ -53,7 +53,7 @@ def calculate_mortgage(request):
             contact_phone = data.get('contact_phone', '')
             
             if contact_name and contact_email:
-                MortgageCalculation.objects.create(
+                await MortgageCalculation.objects.acreate(
                     property_price=property_price,
                     down_payment=down_payment,
                     down_payment_percentage=down_payment_percentage,
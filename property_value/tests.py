@@ -1,3 +1,29 @@
+import json
+
 from django.test import TestCase
+from django.urls import reverse
+
+from listings import metrics
+
+from .models import PropertyValue
+
+
+class EstimateValueTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    async def test_estimate_runs_on_the_async_path(self):
+        response = await self.async_client.post(
+            reverse('property_value:estimate_value'),
+            json.dumps({'address': '1 Elm St', 'city': 'Springfield', 'state': 'IL', 'zip_code': '62701',
+                        'square_feet': 1800, 'contact_name': 'Bo', 'contact_email': 'bo@example.com'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(await PropertyValue.objects.acount(), 1)
 
-# Create your tests here.
+        # The async middleware path measured it, queries included
+        text = metrics.render(metrics.collect())
+        self.assertIn('realtypro_db_queries_per_request_count{view="property_value:estimate_value"} 1', text)
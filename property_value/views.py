@@ -9,7 +9,7 @@ def home_value(request):
     return render(request, 'property_value/home_value.html')
 
 @csrf_exempt
-def estimate_value(request):
+async def estimate_value(request):
     """API endpoint for home value estimation"""
     if request.method == 'POST':
         try:
@@ -83,7 +83,7 @@ def estimate_value(request):
             value_range_high = estimated_value * 1.1
             
             # Save the estimation
-            property_value = PropertyValue.objects.create(
+            property_value = await PropertyValue.objects.acreate(
                 address=address,
                 city=city,
                 state=state,
@@ -0,0 +1,102 @@
+"""
+Gunicorn worker profile.
+
+gunicorn.conf.py starts the workers with these numbers. The settings use
+the same numbers to size each worker's share of resources, such as its
+database connection pool. Both read them from the environment:
+
+    SERVER_PROFILE    wsgi (default): sync workers, or gthread ones with threads
+                      asgi: uvicorn workers running realestate_project.asgi
+    WEB_CONCURRENCY   worker processes (default: 2 x CPUs + 1, as many as fit in memory)
+    GUNICORN_THREADS  threads per wsgi worker (default: 1, or enough to make up
+                      for the workers the memory limit left out)
+    ASGI_THREADS      requests of one asgi worker that use the database at once
+                      (default: 4); with a pool, further ones wait for a connection
+    WORKER_MEMORY_MB  memory one worker needs, listing snapshot included (default: 120)
+    IMAGE_WORKERS     processes of each worker's pool resizing uploaded images
+                      (default: 2; 0 resizes them in the request's worker)
+    IMAGE_WORKER_MEMORY_MB  memory of one of those processes (default: 60)
+    MEMORY_LIMIT_MB   memory of the whole server (default: the container's cgroup
+                      limit, else the machine's)
+
+Each worker is counted with its image processes, which are spawned on the
+first upload and then stay. For example, 4 CPUs call for 9 workers; under
+a 1 GiB limit only 3 fit next to the master at 120 + 2 x 60 MB each, so
+each gets 3 threads and the worker class becomes gthread.
+"""
+import math
+import multiprocessing
+import os
+
+PROFILES = ('wsgi', 'asgi')
+CGROUP_MEMORY_LIMITS = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+
+
+def profile():
+    name = os.environ.get('SERVER_PROFILE') or 'wsgi'
+    if name not in PROFILES:
+        raise ValueError(f'SERVER_PROFILE must be one of {", ".join(PROFILES)}, not {name!r}')
+    return name
+
+
+def memory_limit():
+    """Bytes of memory available to the server, or None if unknown"""
+    if os.environ.get('MEMORY_LIMIT_MB'):
+        return int(os.environ['MEMORY_LIMIT_MB']) * 2 ** 20
+    for path in CGROUP_MEMORY_LIMITS:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "no limit" as a huge number rather than "max"
+        if value.isdigit() and int(value) < 2 ** 60:
+            return int(value)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError):
+        return None
+
+
+def concurrency():
+    """Requests the CPUs can keep busy: the classic 2 x CPUs + 1"""
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def image_workers():
+    """Processes in each worker's pool for resizing uploaded images"""
+    return int(os.environ.get('IMAGE_WORKERS') or 2)
+
+
+def workers():
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    limit = memory_limit()
+    if limit is None:
+        return concurrency()
+    worker_memory = int(os.environ.get('WORKER_MEMORY_MB') or 120) * 2 ** 20
+    image_memory = image_workers() * int(os.environ.get('IMAGE_WORKER_MEMORY_MB') or 60) * 2 ** 20
+    # The master process is about as large as a worker, without image processes
+    return max(1, min(concurrency(), (limit - worker_memory) // (worker_memory + image_memory)))
+
+
+def threads():
+    """Threads of one worker that can use the database at the same time"""
+    if profile() == 'asgi':
+        # Django runs the ORM calls of each request in a thread of its own, so a
+        # worker needs as many connections as it has requests in flight
+        return int(os.environ.get('ASGI_THREADS') or 4)
+    if os.environ.get('GUNICORN_THREADS'):
+        return int(os.environ['GUNICORN_THREADS'])
+    return math.ceil(concurrency() / workers())
+
+
+def worker_class():
+    if profile() == 'asgi':
+        return 'uvicorn.workers.UvicornWorker'
+    return 'gthread' if threads() > 1 else 'sync'
+
+
+def application():
+    """Dotted path of the application gunicorn serves"""
+    return f'realestate_project.{profile()}:application'
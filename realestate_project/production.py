@@ -4,6 +4,7 @@ Production settings for RealtyPro Real Estate Project
 import os
 from decouple import config
 from .settings import *
+from . import concurrency, databases
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
@@ -14,13 +15,62 @@ SECRET_KEY = config('SECRET_KEY', default='your-secret-key-here-change-in-produc
 # Allowed hosts for production (including Render)
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1,.onrender.com').split(',')
 
-# Database configuration for production
+# Database configuration for production: DATABASE_URL picks SQLite or
+# PostgreSQL. Each worker's PostgreSQL pool holds one connection per thread
+# plus two for background threads, capped to DB_MAX_CONNECTIONS across workers
+DATABASE_URL = config('DATABASE_URL', default='sqlite:///db.sqlite3')
+DATABASE_POOL = databases.pool_size(concurrency.workers(), concurrency.threads(),
+                                    config('DB_MAX_CONNECTIONS', default=0, cast=int))
+DATABASE_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=float)
 DATABASES = {
-    'default': {
+    'default': databases.from_url(DATABASE_URL, conn_max_age=60, pool=DATABASE_POOL,
+                                  pool_timeout=DATABASE_POOL_TIMEOUT),
+}
+
+# SQLite tuning for several gunicorn workers sharing the database file
+LISTING_SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='wal'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='normal'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=10000, cast=int),
+    'cache_size': -config('SQLITE_CACHE_KIB', default=64000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_BYTES', default=256 * 1024 * 1024, cast=int),
+    'temp_store': 'memory',
+}
+
+# Optional read replica for listing and blog pages: a snapshot of db.sqlite3
+# that `manage.py refresh_replicas --every 60` keeps replacing
+SQLITE_REPLICA = config('SQLITE_REPLICA', default='')
+if SQLITE_REPLICA:
+    DATABASES['replica'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': f'file:{SQLITE_REPLICA}?immutable=1',
+        'SNAPSHOT_OF': 'default',
+        # The snapshot is never written, so only the read-side pragmas apply
+        'PRAGMAS': {key: LISTING_SQLITE_PRAGMAS[key] for key in ('cache_size', 'mmap_size', 'temp_store')},
+        'TEST': {'MIRROR': 'default'},
     }
-}
+    LISTING_READ_REPLICAS = ['replica']
+
+# PostgreSQL standbys for the same reads, comma separated URLs
+for index, url in enumerate(filter(None, config('REPLICA_DATABASE_URLS', default='').split(','))):
+    DATABASES[f'standby_{index}'] = {
+        **databases.from_url(url.strip(), conn_max_age=60, pool=DATABASE_POOL, pool_timeout=DATABASE_POOL_TIMEOUT),
+        'TEST': {'MIRROR': 'default'},
+    }
+    LISTING_READ_REPLICAS = LISTING_READ_REPLICAS + [f'standby_{index}']
+LISTING_REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=300, cast=int)
+LISTING_REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=120, cast=int)
+
+# Request metrics shared by the gunicorn workers and scraped at /metrics/
+LISTING_METRICS_DIR = config('METRICS_DIR', default=str(BASE_DIR / 'logs' / 'metrics'))
+LISTING_METRICS_TOKEN = config('METRICS_TOKEN', default=None)
+
+# Slow SQL statements with their query plans; `manage.py slow_queries` reports the worst
+LISTING_SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=250, cast=float)
+LISTING_SLOW_QUERY_LOG = config('SLOW_QUERY_LOG', default=str(BASE_DIR / 'logs' / 'slow_queries.jsonl'))
+
+# Image resizing processes of each worker; the adaptive worker count budgets their memory
+LISTING_IMAGE_WORKERS = concurrency.image_workers()
 
 # Static files configuration
 STATIC_URL = '/static/'
@@ -87,12 +137,25 @@ LOGGING = {
 LOGS_DIR = BASE_DIR / 'logs'
 LOGS_DIR.mkdir(exist_ok=True)
 
-# Cache configuration (optional - for better performance)
+# Cache configuration. Cached pages and results stay in each worker, but the
+# versions that invalidate them go to a store all workers share: Redis when
+# REDIS_URL is set (needs the redis package), otherwise files on this host.
+REDIS_URL = config('REDIS_URL', default='')
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    'listing-versions': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'realtypro',
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('VERSION_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'listing-versions')),
+        # One entry per surrogate key (a few per listing); culling would only cost cache misses
+        'OPTIONS': {'MAX_ENTRIES': 200000},
+    },
 }
 
 # Email configuration (configure for your email provider)
@@ -110,7 +173,6 @@ MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Performance optimizations
-CONN_MAX_AGE = 60
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 
@@ -118,15 +180,3 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 if 'RENDER' in os.environ:
     # Render environment variables
     ALLOWED_HOSTS = ['.onrender.com', 'localhost', '127.0.0.1']
-    
-    # Use environment variables for database (if using external database)
-    # DATABASES = {
-    #     'default': {
-    #         'ENGINE': 'django.db.backends.postgresql',
-    #         'NAME': config('DB_NAME'),
-    #         'USER': config('DB_USER'),
-    #         'PASSWORD': config('DB_PASSWORD'),
-    #         'HOST': config('DB_HOST'),
-    #         'PORT': config('DB_PORT', default='5432'),
-    #     }
-    # }
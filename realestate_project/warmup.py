@@ -0,0 +1,112 @@
+"""
+Cache warm-up for gunicorn workers.
+
+Several caches fill on first use, so a fresh worker (at start, and each
+time ``max_requests`` recycles one) answers its first requests slowly:
+compiled templates, the URL resolver, the ZIP centroid table, the
+full-text backend and the listing snapshot. ``warm()`` fills them before
+the worker accepts connections.
+
+The SHARED steps do not touch the database. When gunicorn preloads the
+application, its master runs them once before forking, and every worker
+inherits the result. The post_fork hook then runs the FOREGROUND steps,
+which is nearly free for those already done.
+
+The BACKGROUND steps grow with the number of listings; loading the
+snapshot of a million of them can outlast gunicorn's worker timeout. The
+post_worker_init hook runs them in a thread with ``warm_in_background()``.
+The worker serves requests meanwhile, and the requests that need the
+snapshot wait for that load instead of starting another one.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def templates():
+    """Compile every project template into the cached loader"""
+    from django.template import engines
+    from django.template.loader import get_template
+
+    for directory in engines['django'].engine.dirs:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith('.html'):
+                    get_template(os.path.relpath(os.path.join(root, name), directory))
+
+
+def urls():
+    """Build the reverse lookups of the root resolver and every namespace"""
+    from django.urls import get_resolver
+
+    pending = [get_resolver()]
+    while pending:
+        resolver = pending.pop()
+        resolver.reverse_dict
+        pending.extend(namespace_resolver for _, namespace_resolver in resolver.namespace_dict.values())
+
+
+def geo():
+    from listings import geo
+
+    geo.zip_centroids()
+
+
+def search():
+    from listings import fulltext
+
+    fulltext.get_backend()
+
+
+def listings():
+    from django.db import connections
+
+    from listings import snapshot
+
+    try:
+        snapshot.get_snapshot()
+    finally:
+        # Requests run in other threads; this one's connection would sit idle
+        connections.close_all()
+
+
+STEPS = {'templates': templates, 'urls': urls, 'geo': geo, 'search': search, 'listings': listings}
+SHARED = ('templates', 'urls', 'geo')
+FOREGROUND = SHARED + ('search',)
+BACKGROUND = ('listings',)
+
+
+def warm(names=tuple(STEPS)):
+    """Run the named steps; returns {step: seconds}. A failing step is logged and skipped"""
+    import django
+    from django.apps import apps
+
+    # Gunicorn preloads the application, but warming must also work without it
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'realestate_project.settings')
+        django.setup()
+    timings = {}
+    for name in names:
+        started = time.perf_counter()
+        try:
+            STEPS[name]()
+        except Exception:
+            logger.exception('Warming %s failed', name)
+            continue
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def warm_in_background(names=BACKGROUND, done=None):
+    """Run ``warm(names)`` in a daemon thread, then ``done(timings)``; returns the thread"""
+    def run():
+        timings = warm(names)
+        if done is not None:
+            done(timings)
+
+    thread = threading.Thread(target=run, name='warmup', daemon=True)
+    thread.start()
+    return thread
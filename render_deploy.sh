@@ -11,6 +11,10 @@ pip install -r requirements.txt
 echo "🗄️ Running database migrations..."
 python manage.py migrate
 
+# Geocode listings added without coordinates
+echo "🗺️ Geocoding listings..."
+python manage.py geocode_listings
+
 # Collect static files
 echo "📁 Collecting static files..."
 python manage.py collectstatic --noinput
@@ -23,4 +27,4 @@ echo "✅ Deployment setup completed!"
 echo "🌐 Starting Gunicorn server..."
 
 # Start Gunicorn
-exec gunicorn realestate_project.wsgi:application
+exec gunicorn --config gunicorn.conf.py